@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_CACHE_DIR = "./analysis_cache"
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_MAX_AGE_DAYS = 30
+
+_FORMAT_VERSION = 1
+_SUFFIX = ".json"
+
+
+def analysis_key(code: str, model_name: str, num_ctx, prompt_version, chunk_ids) -> str:
+    """Return the cache key of one file analysis.
+
+    Everything that can change the LLM's answer is part of the key: the file
+    content, the model and its context window, the prompt template version, and
+    the ids of the retrieved reference chunks (in retrieval order).
+    """
+    payload = json.dumps(
+        {
+            "code": hashlib.sha256(code.encode("utf-8")).hexdigest(),
+            "model": model_name,
+            "num_ctx": num_ctx,
+            "prompt_version": prompt_version,
+            "chunks": list(chunk_ids),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """Persistent cache of per-file analysis results.
+
+    Each entry is a small JSON file named after its key, written atomically, so
+    concurrent analyses and interrupted runs never leave a half-written entry.
+    The file mtime records the last use (it is refreshed on every hit): entries
+    unused for max_age_days are ignored and pruned, and beyond max_entries the
+    least recently used ones are evicted first.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+    ):
+        self.path = cache_dir
+        self.max_entries = max(1, max_entries)
+        self.max_age_seconds = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + _SUFFIX)
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> dict | None:
+        """Return the stored {"analysis", "sources"} for key, or None on a miss."""
+        path = self._file(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                raise OSError("expired")
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._count(False)
+            return None
+
+        if entry.get("version") != _FORMAT_VERSION or "analysis" not in entry:
+            self._count(False)
+            return None
+
+        try:
+            # Refresh the mtime so size eviction drops least recently used entries first.
+            os.utime(path)
+        except OSError:
+            pass
+        self._count(True)
+        return {"analysis": entry["analysis"], "sources": entry.get("sources", [])}
+
+    def put(self, key: str, analysis: str, sources: list[str]) -> None:
+        entry = {
+            "version": _FORMAT_VERSION,
+            "created": time.time(),
+            "analysis": analysis,
+            "sources": list(sources),
+        }
+        tmp_path = f"{self._file(key)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._file(key))
+
+    def prune(self) -> int:
+        """Delete expired entries, then the least recently used ones beyond max_entries.
+
+        Returns:
+            The number of entries removed.
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(_SUFFIX):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+
+        now = time.time()
+        entries.sort(reverse=True)
+        doomed = [path for mtime, path in entries if now - mtime > self.max_age_seconds]
+        live = [path for mtime, path in entries if now - mtime <= self.max_age_seconds]
+        doomed.extend(live[self.max_entries :])
+
+        removed = 0
+        for path in doomed:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                continue
+        self.evictions += removed
+        return removed
+
+    def __len__(self) -> int:
+        return sum(1 for name in os.listdir(self.path) if name.endswith(_SUFFIX))
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return (
+            f"Analysis cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), "
+            f"{self.evictions} evicted, {len(self)} entries"
+        )
@@ -0,0 +1,475 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import chromadb
+import fitz
+from colorama import Fore, Style, init
+from sentence_transformers import SentenceTransformer
+
+from .ingest import (
+    DEFAULT_MAX_WRITE_BATCH,
+    NLP_PROFILES,
+    PIPE_BATCH_SIZE,
+    build_chunks_from_sentences,
+    clean_text,
+    find_source_files,
+    is_relevant_sentence,
+    load_nlp,
+    strip_markdown,
+)
+
+# Initialize colorama
+init(autoreset=True)
+
+RESULTS_VERSION = 1
+# Stages in pipeline order; every results file reports all of them.
+STAGES = (
+    "pdf_extract",
+    "clean_text",
+    "strip_markdown",
+    "spacy_segmentation",
+    "is_relevant_sentence",
+    "build_chunks",
+    "encode",
+    "chroma_write",
+)
+# A stage regresses when it is this much slower than the baseline...
+DEFAULT_THRESHOLD = 0.25
+# ...and slower by at least this many seconds, so sub-millisecond noise never fails a run.
+DEFAULT_MIN_DELTA_SECONDS = 0.05
+# Settings a baseline must share with a run for their timings to be comparable. repeat only
+# changes how many samples are taken, not the work timed, so it may differ.
+COMPARED_SETTINGS = {
+    "config": ("model", "nlp_profile", "chunk_size_chars", "overlap_sents", "embed_batch_size"),
+    "corpus": ("pdf_files", "pdf_pages", "markdown_files", "bytes"),
+}
+
+_SUBJECTS = [
+    "The application",
+    "An attacker",
+    "The session token",
+    "Each API endpoint",
+    "The password reset flow",
+    "Server-side validation",
+    "The access control layer",
+    "A stored procedure",
+]
+_VERBS = ["validates", "exposes", "encrypts", "rejects", "logs", "bypasses", "sanitizes", "authorizes"]
+_OBJECTS = [
+    "untrusted input before it reaches the database",
+    "sensitive data in transit with TLS",
+    "requests that lack a valid CSRF token",
+    "direct object references to other tenants",
+    "failed login attempts for later review",
+    "serialized objects received from the client",
+    "file paths supplied in query parameters",
+    "privileged functions behind role checks",
+]
+_TITLES = [
+    "Broken Access Control",
+    "Cryptographic Failures",
+    "Injection",
+    "Insecure Design",
+    "Security Misconfiguration",
+    "Vulnerable and Outdated Components",
+    "Identification and Authentication Failures",
+    "Server-Side Request Forgery",
+]
+
+
+def _sentence(rng: random.Random) -> str:
+    return f"{rng.choice(_SUBJECTS)} {rng.choice(_VERBS)} {rng.choice(_OBJECTS)}."
+
+
+def _paragraph(rng: random.Random, sentences: int = 6) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def _markdown_document(rng: random.Random, sections: int) -> str:
+    parts = [f"# {rng.choice(_TITLES)} Cheat Sheet"]
+    for i in range(sections):
+        parts.append(f"## {i + 1}. {rng.choice(_TITLES)}")
+        parts.append(_paragraph(rng))
+        parts.append(f"- **{rng.choice(_TITLES)}**: {_sentence(rng)} See [the guide](https://owasp.org/{i}).")
+        parts.append(f'```python\nquery = f"SELECT * FROM users WHERE id = {{user_id}}"  # {i}\n```')
+        parts.append(f"> Use `{rng.choice(_VERBS)}()` only on trusted data. {_sentence(rng)}")
+    return "\n\n".join(parts) + "\n"
+
+
+def generate_corpus(
+    output_dir: str,
+    pdf_files: int = 4,
+    pages_per_pdf: int = 50,
+    markdown_files: int = 20,
+    sections_per_markdown: int = 12,
+    seed: int = 0,
+) -> list[str]:
+    """Write a deterministic synthetic corpus of PDF and Markdown files.
+
+    The text mimics the reference material ingest sees (security prose,
+    vulnerability titles, Markdown links, lists and code fences), so every stage
+    does representative work. The same arguments always produce the same files.
+
+    Returns:
+        The paths of the generated files.
+    """
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+
+    for i in range(pdf_files):
+        path = os.path.join(output_dir, f"synthetic_{i:03d}.pdf")
+        doc = fitz.open()
+        for page_number in range(pages_per_pdf):
+            text = f"{rng.choice(_TITLES)}\n\n" + "\n\n".join(_paragraph(rng) for _ in range(4))
+            text += f"\n\nPage {page_number + 1} of {pages_per_pdf}"
+            doc.new_page().insert_textbox(fitz.Rect(50, 50, 545, 790), text, fontsize=9)
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+
+    for i in range(markdown_files):
+        path = os.path.join(output_dir, f"synthetic_{i:03d}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(_markdown_document(rng, sections_per_markdown))
+        paths.append(path)
+
+    return paths
+
+
+def _time_stage(func, repeat: int):
+    """Run func repeat times; return (best wall time in seconds, result of the last run)."""
+    best = float("inf")
+    result = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def _extract_pdf_pages(pdf_paths: list[str]) -> list[list[str]]:
+    pages = []
+    for path in pdf_paths:
+        doc = fitz.open(path)
+        try:
+            pages.append([page.get_text() for page in doc])
+        finally:
+            doc.close()
+    return pages
+
+
+def _write_to_chroma(chunks: list[str], embeddings, max_batch: int | None = None) -> int:
+    """Add chunks to a fresh collection in a throwaway Chroma database, like ingest does."""
+    with tempfile.TemporaryDirectory() as chroma_dir:
+        client = chromadb.PersistentClient(path=chroma_dir)
+        collection = client.create_collection("benchmark")
+        limit = max_batch or client.get_max_batch_size() or DEFAULT_MAX_WRITE_BATCH
+        for start in range(0, len(chunks), limit):
+            end = min(start + limit, len(chunks))
+            collection.add(
+                ids=[f"chunk_{i}" for i in range(start, end)],
+                embeddings=[list(map(float, e)) for e in embeddings[start:end]],
+                documents=chunks[start:end],
+                metadatas=[{"source": "benchmark", "chunk": i} for i in range(start, end)],
+            )
+        count = collection.count()
+        del collection, client
+    return count
+
+
+def run_benchmark(
+    file_paths: list[str],
+    model_name: str = "all-MiniLM-L6-v2",
+    nlp_profile: str = "full",
+    chunk_size_chars: int = 1800,
+    overlap_sents: int = 2,
+    embed_batch_size: int = 32,
+    repeat: int = 3,
+) -> dict:
+    """Time every ingest stage in isolation over file_paths.
+
+    Each stage consumes the previous stage's output, so the work matches a real
+    ingest, but it is timed on its own. CPU stages report the best of repeat
+    runs to damp scheduler noise. Model and pipeline loading are excluded.
+
+    Returns:
+        A JSON-serializable dict with per-stage seconds, item counts and rates.
+    """
+    pdf_paths = [p for p in file_paths if p.lower().endswith(".pdf")]
+    md_paths = [p for p in file_paths if p.lower().endswith(".md")]
+    nlp = load_nlp(nlp_profile)
+    model = SentenceTransformer(model_name)
+
+    stages: dict[str, dict] = {}
+
+    def record(name: str, seconds: float, items: int) -> None:
+        stages[name] = {
+            "seconds": round(seconds, 6),
+            "items": items,
+            "items_per_second": round(items / seconds, 3) if seconds > 0 else None,
+        }
+
+    seconds, raw_pages = _time_stage(lambda: _extract_pdf_pages(pdf_paths), repeat)
+    record("pdf_extract", seconds, sum(len(pages) for pages in raw_pages))
+
+    seconds, pdf_pages = _time_stage(lambda: [[clean_text(p) for p in pages] for pages in raw_pages], repeat)
+    record("clean_text", seconds, sum(len(pages) for pages in pdf_pages))
+
+    markdown = []
+    for path in md_paths:
+        with open(path, encoding="utf-8") as f:
+            markdown.append(f.read())
+    seconds, md_texts = _time_stage(lambda: [strip_markdown(text) for text in markdown], repeat)
+    record("strip_markdown", seconds, len(md_texts))
+
+    # One text list per document: PDF pages, or the whole stripped Markdown file.
+    documents = [[p for p in pages if p] for pages in pdf_pages] + [[text] for text in md_texts]
+    texts = [text for doc in documents for text in doc]
+
+    seconds, spacy_docs = _time_stage(lambda: list(nlp.pipe(texts, batch_size=PIPE_BATCH_SIZE)), repeat)
+    record("spacy_segmentation", seconds, len(texts))
+
+    sents = [[sent for sent in spacy_doc.sents] for spacy_doc in spacy_docs]
+    seconds, kept = _time_stage(
+        lambda: [[s.text.strip() for s in doc_sents if is_relevant_sentence(s)] for doc_sents in sents], repeat
+    )
+    record("is_relevant_sentence", seconds, sum(len(doc_sents) for doc_sents in sents))
+
+    # Regroup the per-text sentence lists by document before chunking.
+    sentences_by_doc, position = [], 0
+    for doc in documents:
+        sentences_by_doc.append([s for page in kept[position : position + len(doc)] for s in page])
+        position += len(doc)
+    seconds, chunk_lists = _time_stage(
+        lambda: [build_chunks_from_sentences(s, chunk_size_chars, overlap_sents) for s in sentences_by_doc], repeat
+    )
+    chunks = [chunk for doc_chunks in chunk_lists for chunk in doc_chunks]
+    record("build_chunks", seconds, len(chunks))
+
+    seconds, embeddings = _time_stage(
+        lambda: model.encode(chunks, batch_size=embed_batch_size, show_progress_bar=False) if chunks else [], repeat
+    )
+    record("encode", seconds, len(chunks))
+
+    seconds, _ = _time_stage(lambda: _write_to_chroma(chunks, embeddings), repeat)
+    record("chroma_write", seconds, len(chunks))
+
+    return {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            "model": model_name,
+            "nlp_profile": nlp_profile,
+            "chunk_size_chars": chunk_size_chars,
+            "overlap_sents": overlap_sents,
+            "embed_batch_size": embed_batch_size,
+            "repeat": repeat,
+        },
+        "corpus": {
+            "pdf_files": len(pdf_paths),
+            "pdf_pages": sum(len(pages) for pages in raw_pages),
+            "markdown_files": len(md_paths),
+            "bytes": sum(os.path.getsize(p) for p in file_paths),
+        },
+        "stages": stages,
+        "total_seconds": round(sum(stage["seconds"] for stage in stages.values()), 6),
+    }
+
+
+def baseline_mismatches(results: dict, baseline: dict) -> list[str]:
+    """Return the COMPARED_SETTINGS that differ between results and baseline, one line each.
+
+    A setting the baseline does not record counts as different, since it cannot
+    be checked.
+    """
+    mismatches = []
+    for section, keys in COMPARED_SETTINGS.items():
+        for key in keys:
+            before = baseline.get(section, {}).get(key)
+            now = results.get(section, {}).get(key)
+            if before is None or before != now:
+                recorded = "not recorded" if before is None else before
+                mismatches.append(f"{section}.{key}: {recorded} in the baseline, {now} now")
+    return mismatches
+
+
+def compare_to_baseline(
+    results: dict,
+    baseline: dict,
+    threshold: float = DEFAULT_THRESHOLD,
+    min_delta_seconds: float = DEFAULT_MIN_DELTA_SECONDS,
+) -> list[dict]:
+    """Return the stages that got slower than baseline by more than threshold.
+
+    A stage counts as a regression only when it is both threshold (a fraction,
+    0.25 = 25%) slower and at least min_delta_seconds slower. Stages missing
+    from either side are ignored. Raises ValueError when the baseline was
+    recorded with other settings or another corpus (see baseline_mismatches).
+    """
+    mismatches = baseline_mismatches(results, baseline)
+    if mismatches:
+        raise ValueError(f"The baseline was recorded with other settings: {'; '.join(mismatches)}")
+    regressions = []
+    for name, stage in results.get("stages", {}).items():
+        before = baseline.get("stages", {}).get(name)
+        if not before:
+            continue
+        old, new = before["seconds"], stage["seconds"]
+        if new > old * (1 + threshold) and new - old >= min_delta_seconds:
+            regressions.append(
+                {"stage": name, "baseline_seconds": old, "seconds": new, "ratio": round(new / old, 3) if old else None}
+            )
+    return regressions
+
+
+def print_results(results: dict, baseline: dict | None = None) -> None:
+    print(f"{Fore.CYAN}{Style.BRIGHT}Ingest benchmark")
+    for name in STAGES:
+        stage = results["stages"].get(name)
+        if stage is None:
+            continue
+        rate = f"{stage['items_per_second']:.1f}/s" if stage["items_per_second"] else "-"
+        line = f"  {name:<22}{stage['seconds']:>10.4f}s {stage['items']:>8} items {rate:>14}"
+        before = (baseline or {}).get("stages", {}).get(name)
+        if before and before["seconds"]:
+            line += f"  ({stage['seconds'] / before['seconds']:.2f}x baseline)"
+        print(line)
+    print(f"  {'total':<22}{results['total_seconds']:>10.4f}s")
+
+
+def _corpus_files(args) -> tuple[list[str], tempfile.TemporaryDirectory | None]:
+    """Return the files to benchmark, generating a synthetic corpus when needed."""
+    if args.corpus_dir and os.path.isdir(args.corpus_dir) and find_source_files(args.corpus_dir):
+        return find_source_files(args.corpus_dir), None
+
+    tmp = None
+    output_dir = args.corpus_dir
+    if not output_dir:
+        tmp = tempfile.TemporaryDirectory()
+        output_dir = tmp.name
+    print(f"{Fore.CYAN}Generating synthetic corpus in {output_dir}")
+    paths = generate_corpus(
+        output_dir,
+        pdf_files=args.pdfs,
+        pages_per_pdf=args.pages,
+        markdown_files=args.markdown,
+        seed=args.seed,
+    )
+    return paths, tmp
+
+
+def main():
+    """Command line interface for the ingest benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark each ingest stage on a synthetic or real corpus")
+    parser.add_argument(
+        "--corpus-dir",
+        type=str,
+        default=None,
+        help="Benchmark the .pdf/.md files in this directory; if it is missing or empty a synthetic corpus "
+        "is generated there (default: a temporary directory)",
+    )
+    parser.add_argument("--pdfs", type=int, default=4, help="Synthetic PDF files to generate (default: 4)")
+    parser.add_argument("--pages", type=int, default=50, help="Pages per synthetic PDF (default: 50)")
+    parser.add_argument("--markdown", type=int, default=20, help="Synthetic Markdown files to generate (default: 20)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic corpus (default: 0)")
+    parser.add_argument(
+        "--model",
+        type=str,
+        default="all-MiniLM-L6-v2",
+        help="Sentence transformer model to use (default: all-MiniLM-L6-v2)",
+    )
+    parser.add_argument(
+        "--nlp-profile",
+        choices=NLP_PROFILES,
+        default="full",
+        help="spaCy pipeline profile to benchmark (default: full)",
+    )
+    parser.add_argument(
+        "--chunk-size-chars",
+        type=int,
+        default=1800,
+        help="Target chunk size in characters (default: 1800)",
+    )
+    parser.add_argument(
+        "--overlap-sents",
+        type=int,
+        default=2,
+        help="Number of sentences to overlap between chunks (default: 2)",
+    )
+    parser.add_argument(
+        "--embed-batch-size",
+        type=int,
+        default=32,
+        help="Batch size for embedding encoding (default: 32)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest is kept (default: 3)")
+    parser.add_argument("--output", type=str, default=None, help="Write the results as JSON to this file")
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Results file to compare against; exits with status 1 if any stage regressed, 2 if it was "
+        "recorded with other settings or another corpus",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"Allowed slowdown per stage as a fraction of the baseline (default: {DEFAULT_THRESHOLD})",
+    )
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    file_paths, tmp = _corpus_files(args)
+    try:
+        results = run_benchmark(
+            file_paths,
+            model_name=args.model,
+            nlp_profile=args.nlp_profile,
+            chunk_size_chars=args.chunk_size_chars,
+            overlap_sents=args.overlap_sents,
+            embed_batch_size=args.embed_batch_size,
+            repeat=args.repeat,
+        )
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    mismatches = baseline_mismatches(results, baseline) if baseline is not None else []
+    print_results(results, None if mismatches else baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"{Fore.GREEN}Results written to {args.output}")
+
+    if mismatches:
+        print(f"{Fore.RED}{Style.BRIGHT}Not comparing against {args.baseline}: it was recorded with other settings")
+        for mismatch in mismatches:
+            print(f"{Fore.RED}  {mismatch}")
+        sys.exit(2)
+    if baseline is not None:
+        regressions = compare_to_baseline(results, baseline, threshold=args.threshold)
+        for r in regressions:
+            print(
+                f"{Fore.RED}Regression in {r['stage']}: {r['seconds']:.4f}s vs {r['baseline_seconds']:.4f}s "
+                f"baseline ({r['ratio']}x)"
+            )
+        if regressions:
+            sys.exit(1)
+        print(f"{Fore.GREEN}No stage regressed more than {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ import sys
 
 from colorama import Fore, Style, init
 
+from .prompt_budget import parse_num_ctx
+
 # Initialize colorama
 init(autoreset=True)
 
@@ -52,6 +54,43 @@ def main():
         default=32,
         help="Batch size for embedding encoding (default: 32)",
     )
+    ingest_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to parse documents; 0 uses one per CPU (default: 1)",
+    )
+    ingest_parser.add_argument(
+        "--nlp-profile",
+        choices=["full", "trimmed"],
+        default="full",
+        help="spaCy pipeline to load: 'full' en_core_web_sm, or 'trimmed' (senter + tagger only) for faster, "
+        "leaner parsing (default: full)",
+    )
+    ingest_parser.add_argument(
+        "--embedding-cache-dir",
+        type=str,
+        default="./embedding_cache",
+        help="Directory of the persistent embedding cache (default: ./embedding_cache)",
+    )
+    ingest_parser.add_argument(
+        "--embedding-cache-max-entries",
+        type=int,
+        default=200_000,
+        help="Maximum cached embeddings before LRU eviction (default: 200000)",
+    )
+    ingest_parser.add_argument(
+        "--no-embedding-cache",
+        action="store_true",
+        help="Always re-encode chunks instead of reusing cached embeddings",
+    )
+    ingest_parser.add_argument(
+        "--chunking",
+        choices=["chars", "tokens"],
+        default="chars",
+        help="Chunk size unit: 'chars' uses --chunk-size-chars; 'tokens' packs chunks up to the embedding "
+        "model's max sequence length (default: chars)",
+    )
 
     # Create the query command parser
     query_parser = subparsers.add_parser("query", help="Analyze code for security vulnerabilities")
@@ -79,15 +118,17 @@ def main():
         "--ollama-url",
         type=str,
         default="http://localhost:11434",
-        help="Ollama API URL",
+        help="Ollama API URL; several comma-separated URLs of servers with the same models are load-balanced, "
+        "and files that fail on one are retried on another",
     )
     query_parser.add_argument(
         "--num-ctx",
-        type=int,
+        type=parse_num_ctx,
         default=None,
         help=(
-            "Ollama context window size (e.g. 4096, 8192). Lower values use less VRAM so the model fits on "
-            "the GPU; omit to use the model default."
+            "Ollama context window size (e.g. 4096, 8192), or 'auto' for the smallest window that fits the "
+            "largest prompt. Lower values use less VRAM so the model fits on the GPU; prompts are split and "
+            "their context trimmed to fit. Omit to use the model default."
         ),
     )
     query_parser.add_argument(
@@ -105,6 +146,112 @@ def main():
         action="store_true",
         help="Only analyze staged files. Intended for pre-commit hooks.",
     )
+    query_parser.add_argument(
+        "--hunks",
+        action="store_true",
+        help="With --changed-only or --staged, analyze only the changed hunks, widened to their enclosing "
+        "function or class, instead of whole files",
+    )
+    query_parser.add_argument(
+        "--hunk-context",
+        type=int,
+        default=3,
+        help="Unchanged lines around each hunk that also widen it, like git diff -U<n> (default: 3)",
+    )
+    query_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of files analyzed at the same time; match the server's OLLAMA_NUM_PARALLEL (default: 1)",
+    )
+    query_parser.add_argument(
+        "--backend",
+        choices=["lean", "llama_index"],
+        default="lean",
+        help="Retrieval/LLM stack: 'lean' queries Chroma with SentenceTransformer and calls Ollama directly; "
+        "'llama_index' uses the llama_index stack (default: lean)",
+    )
+    query_parser.add_argument(
+        "--max-segment-chars",
+        type=int,
+        default=6000,
+        help="Split files larger than this many characters into function/class-sized segments that are "
+        "retrieved and analyzed separately; 0 analyzes whole files (default: 6000)",
+    )
+    query_parser.add_argument(
+        "--prompt-layout",
+        choices=["system", "inline"],
+        default="system",
+        help="'system' sends the fixed instructions first as a stable system message so Ollama reuses their "
+        "cached prefix across files; 'inline' is the original single prompt (default: system)",
+    )
+    query_parser.add_argument(
+        "--keep-alive",
+        type=str,
+        default="30m",
+        help="How long Ollama keeps the model loaded between requests (default: 30m)",
+    )
+    query_parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Report Ollama prompt-eval and generation time per file, e.g. to confirm prompt prefix reuse",
+    )
+    query_parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="Wait for each whole answer instead of streaming it; the request timeout then covers the whole answer",
+    )
+    query_parser.add_argument(
+        "--screen-model",
+        type=str,
+        help="Small, fast Ollama model that first classifies each file as clean or suspicious; only "
+        "suspicious files are analyzed by --model (default: off)",
+    )
+    query_parser.add_argument(
+        "--pack-tokens",
+        type=int,
+        default=0,
+        help="Analyze files of up to 50 lines from the same directory together, in prompts of up to this many "
+        "tokens of code and context; 0 gives every file its own prompt (default: 0)",
+    )
+    query_parser.add_argument(
+        "--triage-threshold",
+        type=int,
+        default=1,
+        help="Skip files whose static triage score (I/O, subprocess, SQL, memory, XML, crypto, deserialization, "
+        "HTTP, redirect... signals) is below this; 0 analyzes every file, as does a --path naming a single file "
+        "(default: 1)",
+    )
+    query_parser.add_argument(
+        "--resume",
+        type=str,
+        metavar="RUN_DIR",
+        help="Continue an interrupted run in its output directory (e.g. output/2024-01-01_12-00-00): files it "
+        "already analyzed are skipped and the report is rebuilt from its checkpoints",
+    )
+    query_parser.add_argument(
+        "--analysis-cache-dir",
+        type=str,
+        default="./analysis_cache",
+        help="Directory of the persistent analysis cache (default: ./analysis_cache)",
+    )
+    query_parser.add_argument(
+        "--analysis-cache-max-entries",
+        type=int,
+        default=10_000,
+        help="Maximum cached analyses before LRU eviction (default: 10000)",
+    )
+    query_parser.add_argument(
+        "--analysis-cache-max-age-days",
+        type=float,
+        default=30,
+        help="Evict cached analyses unused for this many days (default: 30)",
+    )
+    query_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always run the LLM instead of reusing cached analyses",
+    )
 
     # Parse arguments
     args = parser.parse_args()
@@ -125,6 +272,11 @@ def main():
             chunk_size_chars=args.chunk_size_chars,
             overlap_sents=args.overlap_sents,
             embed_batch_size=args.embed_batch_size,
+            workers=args.workers,
+            nlp_profile=args.nlp_profile,
+            embedding_cache_dir=None if args.no_embedding_cache else args.embedding_cache_dir,
+            embedding_cache_max_entries=args.embedding_cache_max_entries,
+            chunking=args.chunking,
         )
     elif args.command == "query":
         from .query import run_query
@@ -143,6 +295,22 @@ def main():
             changed_only=args.changed_only,
             changed_base=args.changed_base,
             staged=args.staged,
+            concurrency=args.concurrency,
+            backend=args.backend,
+            max_segment_chars=args.max_segment_chars,
+            prompt_layout=args.prompt_layout,
+            keep_alive=args.keep_alive,
+            measure_timings=args.timings,
+            stream=not args.no_stream,
+            resume_dir=args.resume,
+            triage_threshold=args.triage_threshold,
+            screen_model=args.screen_model,
+            pack_tokens=args.pack_tokens,
+            hunks=args.hunks,
+            hunk_context=args.hunk_context,
+            analysis_cache_dir=None if args.no_cache else args.analysis_cache_dir,
+            analysis_cache_max_entries=args.analysis_cache_max_entries,
+            analysis_cache_max_age_days=args.analysis_cache_max_age_days,
         )
 
 
@@ -0,0 +1,295 @@
+import ast
+import re
+from dataclasses import dataclass, field
+
+# Files up to this many characters are analyzed whole; larger ones are split
+# into function/class-sized segments of at most this size.
+DEFAULT_SEGMENT_CHARS = 6000
+
+PYTHON_EXTENSIONS = (".py", ".pyw", ".pyi")
+
+# Deepest brace/indent level the heuristic splitter descends into.
+_MAX_NESTING = 3
+# Names listed in the label of a segment merged from several units.
+_MAX_LABEL_NAMES = 4
+
+_STRINGS_AND_COMMENTS = re.compile(r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|`[^`]*`|//.*$|#.*$")
+# Lines that close an indented block (Ruby/Lua/shell keywords, brackets) rather than start one.
+_BLOCK_CLOSER = re.compile(r"^\s*(?:(?:end|endif|endfunction|endwhile|endfor|fi|done|esac)\b|[)\]}])")
+
+
+@dataclass
+class CodeSegment:
+    """A function/class-sized part of a source file; lines are 1-based and inclusive."""
+
+    name: str
+    kind: str
+    start_line: int
+    end_line: int
+    text: str
+    # (start, end) line ranges changed in Git, for segments of a hunk-scoped analysis (see changed_segments).
+    changed_lines: list[tuple[int, int]] = field(default_factory=list)
+
+    @property
+    def label(self) -> str:
+        changed = ", ".join(f"{start}-{end}" if end > start else str(start) for start, end in self.changed_lines)
+        changed = f", changed {changed}" if changed else ""
+        return f"{self.kind} {self.name} (lines {self.start_line}-{self.end_line}{changed})"
+
+
+@dataclass
+class _Unit:
+    """A span [start, end) of 0-based line indices."""
+
+    start: int
+    end: int
+    kind: str
+    name: str
+
+
+def whole_file_segment(code: str) -> CodeSegment:
+    return CodeSegment(name="file", kind="file", start_line=1, end_line=max(1, len(code.splitlines())), text=code)
+
+
+def segment_code(code: str, file_path: str = "", max_chars: int = DEFAULT_SEGMENT_CHARS) -> list[CodeSegment]:
+    """Split code into segments of at most max_chars characters along function/class boundaries.
+
+    Python files are split with the ast module; anything else (or Python that
+    does not parse) with a brace-depth heuristic, or an indentation heuristic
+    when the file has no braces. Units still larger than max_chars are split
+    into line windows, and small neighbouring units are merged back together, so
+    every segment is close to max_chars. Files no larger than max_chars come
+    back as a single whole-file segment.
+    """
+    if max_chars <= 0 or len(code) <= max_chars:
+        return [whole_file_segment(code)]
+
+    lines = code.splitlines(keepends=True)
+    return _pack(_units(code, file_path, lines, max_chars), lines, max_chars)
+
+
+def changed_segments(
+    code: str, file_path: str, changed_lines, max_chars: int = DEFAULT_SEGMENT_CHARS, context: int = 0
+) -> list[CodeSegment]:
+    """Return only the parts of code around changed_lines, each widened to its enclosing function/class.
+
+    changed_lines holds 1-based inclusive (start, end) ranges, e.g. the hunks of
+    a diff; each is padded with context lines and then covers every unit (see
+    segment_code) it touches. Neighbouring units are merged up to max_chars, and
+    every segment records the changed lines it holds. When that covers the whole
+    file, it is segmented as by segment_code.
+    """
+    max_chars = max_chars if max_chars > 0 else DEFAULT_SEGMENT_CHARS
+    lines = code.splitlines(keepends=True)
+    if not lines or not changed_lines:
+        return segment_code(code, file_path, max_chars)
+    # Clamp to the file; a change at its very end (a deleted tail) touches the last line.
+    changed = [
+        (min(max(1, start), len(lines)), min(max(start, end, 1), len(lines))) for start, end in sorted(changed_lines)
+    ]
+
+    runs, previous_end = [], None
+    for unit in _units(code, file_path, lines, max_chars):
+        touched = any(unit.start < end + context and unit.end > start - 1 - context for start, end in changed)
+        if not touched:
+            continue
+        if previous_end == unit.start:
+            runs[-1].append(unit)
+        else:
+            runs.append([unit])
+        previous_end = unit.end
+    if len(runs) == 1 and runs[0][0].start == 0 and runs[0][-1].end == len(lines):
+        segments = segment_code(code, file_path, max_chars)
+    else:
+        segments = [segment for run in runs for segment in _pack(run, lines, max_chars)]
+
+    for segment in segments:
+        segment.changed_lines = [
+            (max(start, segment.start_line), min(end, segment.end_line))
+            for start, end in changed
+            if start <= segment.end_line and end >= segment.start_line
+        ]
+    return segments
+
+
+def _units(code: str, file_path: str, lines: list[str], max_chars: int) -> list[_Unit]:
+    """Split lines into contiguous function/class-sized units of at most max_chars characters."""
+    units = None
+    if file_path.lower().endswith(PYTHON_EXTENSIONS):
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError):
+            tree = None
+        if tree is not None:
+            units = _python_units(tree.body, 0, len(lines), lines, max_chars, prefix="")
+    if units is None:
+        if any("{" in _strip_strings(line) for line in lines):
+            units = _brace_units(lines, max_chars)
+        else:
+            units = _indent_units(lines, max_chars)
+
+    return [window for unit in units for window in _split_oversized(unit, lines, max_chars)]
+
+
+def _span_chars(lines: list[str], start: int, end: int) -> int:
+    return sum(len(line) for line in lines[start:end])
+
+
+def _python_units(body, start: int, end: int, lines: list[str], max_chars: int, prefix: str) -> list[_Unit]:
+    """One unit per statement of body, covering lines [start, end); oversized classes are split into members.
+
+    Units are contiguous: the comments and blank lines before a statement belong
+    to it, and lines after the last statement to the last unit.
+    """
+    units = []
+    for i, node in enumerate(body):
+        unit_start = start if i == 0 else body[i - 1].end_lineno
+        unit_end = end if i == len(body) - 1 else node.end_lineno
+
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            kind, name = ("method" if prefix else "function"), prefix + node.name
+        elif isinstance(node, ast.ClassDef):
+            kind, name = "class", prefix + node.name
+        else:
+            kind, name = "module", f"{prefix.rstrip('.')} body" if prefix else "module code"
+
+        if isinstance(node, ast.ClassDef) and _span_chars(lines, unit_start, unit_end) > max_chars:
+            units.extend(_python_units(node.body, unit_start, unit_end, lines, max_chars, prefix=f"{name}."))
+        else:
+            units.append(_Unit(unit_start, unit_end, kind, name))
+    return units
+
+
+def _strip_strings(line: str) -> str:
+    return _STRINGS_AND_COMMENTS.sub("", line)
+
+
+def _unit_name(lines: list[str], start: int, end: int) -> str:
+    """Name a heuristic unit after its first line that opens a block, else its first non-blank line."""
+    candidates = [line.strip() for line in lines[start:end] if line.strip()]
+    opener = next((line for line in candidates if "{" in _strip_strings(line) or line.endswith(":")), None)
+    name = (opener or (candidates[0] if candidates else "blank lines")).split("{")[0].strip()
+    return name[:60] or "block"
+
+
+def _brace_units(lines: list[str], max_chars: int) -> list[_Unit]:
+    """Split where the brace depth returns to a level, descending into blocks that are too large."""
+    depth_after = []
+    depth = 0
+    for line in lines:
+        stripped = _strip_strings(line)
+        depth = max(0, depth + stripped.count("{") - stripped.count("}"))
+        depth_after.append(depth)
+
+    def split(start: int, end: int, level: int) -> list[_Unit]:
+        units, unit_start, deepest = [], start, level
+        for i in range(start, end):
+            deepest = max(deepest, depth_after[i])
+            if depth_after[i] <= level and deepest > level:
+                units.append(_Unit(unit_start, i + 1, "block", _unit_name(lines, unit_start, i + 1)))
+                unit_start, deepest = i + 1, level
+        if unit_start < end:
+            # Trailing lines without a block of their own (closing braces, exports) join the last unit.
+            if units and deepest <= level:
+                units[-1].end = end
+            else:
+                units.append(_Unit(unit_start, end, "block", _unit_name(lines, unit_start, end)))
+
+        result = []
+        for unit in units:
+            if level < _MAX_NESTING and _span_chars(lines, unit.start, unit.end) > max_chars:
+                inner = split(unit.start, unit.end, level + 1)
+                if len(inner) > 1:
+                    result.extend(inner)
+                    continue
+            result.append(unit)
+        return result
+
+    return split(0, len(lines), 0)
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def _indent_units(lines: list[str], max_chars: int) -> list[_Unit]:
+    """Split before lines at the base indentation that follow an indented body."""
+
+    def split(start: int, end: int, nesting: int) -> list[_Unit]:
+        indents = [_indent(line) for line in lines[start:end] if line.strip()]
+        if not indents:
+            return [_Unit(start, end, "block", "blank lines")]
+        base = min(indents)
+        units, unit_start, seen_body = [], start, False
+        for i in range(start, end):
+            if not lines[i].strip():
+                continue
+            if _indent(lines[i]) > base or (seen_body and _BLOCK_CLOSER.match(lines[i])):
+                seen_body = True
+            elif seen_body:
+                units.append(_Unit(unit_start, i, "block", _unit_name(lines, unit_start, i)))
+                unit_start, seen_body = i, False
+        units.append(_Unit(unit_start, end, "block", _unit_name(lines, unit_start, end)))
+
+        result = []
+        for unit in units:
+            if nesting < _MAX_NESTING and _span_chars(lines, unit.start, unit.end) > max_chars:
+                # Keep the unit's header line with the first of its inner units.
+                inner = split(unit.start + 1, unit.end, nesting + 1)
+                if len(inner) > 1:
+                    inner[0].start = unit.start
+                    result.extend(inner)
+                    continue
+            result.append(unit)
+        return result
+
+    return split(0, len(lines), 0)
+
+
+def _split_oversized(unit: _Unit, lines: list[str], max_chars: int) -> list[_Unit]:
+    """Cut a unit larger than max_chars into consecutive line windows."""
+    if _span_chars(lines, unit.start, unit.end) <= max_chars:
+        return [unit]
+    windows, window_start, size = [], unit.start, 0
+    for i in range(unit.start, unit.end):
+        if size and size + len(lines[i]) > max_chars:
+            windows.append(window_start)
+            window_start, size = i, 0
+        size += len(lines[i])
+    windows.append(window_start)
+    bounds = [*windows, unit.end]
+    return [
+        _Unit(bounds[k], bounds[k + 1], unit.kind, f"{unit.name} (part {k + 1}/{len(windows)})")
+        for k in range(len(windows))
+    ]
+
+
+def _pack(units: list[_Unit], lines: list[str], max_chars: int) -> list[CodeSegment]:
+    """Merge neighbouring units while the merged text stays within max_chars."""
+    groups: list[list[_Unit]] = []
+    size = 0
+    for unit in units:
+        unit_size = _span_chars(lines, unit.start, unit.end)
+        if groups and size + unit_size <= max_chars:
+            groups[-1].append(unit)
+            size += unit_size
+        else:
+            groups.append([unit])
+            size = unit_size
+
+    segments = []
+    for group in groups:
+        start, end = group[0].start, group[-1].end
+        kinds = {unit.kind for unit in group}
+        names = list(dict.fromkeys(unit.name for unit in group))
+        name = ", ".join(names[:_MAX_LABEL_NAMES]) + (", ..." if len(names) > _MAX_LABEL_NAMES else "")
+        segments.append(
+            CodeSegment(
+                name=name,
+                kind=kinds.pop() if len(kinds) == 1 else "code",
+                start_line=start + 1,
+                end_line=max(start + 1, end),
+                text="".join(lines[start:end]),
+            )
+        )
+    return segments
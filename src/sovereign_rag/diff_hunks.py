@@ -0,0 +1,52 @@
+import re
+
+# Unchanged lines around each hunk that also widen it to the enclosing code, like git diff -U<n>.
+DEFAULT_HUNK_CONTEXT = 3
+
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def _diff_path(header: str) -> str | None:
+    """Return the path of a "+++ b/<path>" line, or None for a deleted file."""
+    target = header[4:].strip()
+    if target.startswith('"') and target.endswith('"'):
+        target = target[1:-1]
+    if target == "/dev/null":
+        return None
+    return target[2:] if target.startswith("b/") else target
+
+
+def parse_unified_diff(lines) -> dict[str, list[tuple[int, int]]]:
+    """Return the changed line ranges of each file in the output of git diff -U0.
+
+    Ranges are 1-based and inclusive, in the new version of the file, keyed by
+    its path relative to the repository root. A hunk that only deletes lines is
+    the pair of lines around the deletion. Hunk bodies are skipped by their line
+    counts, so a changed line that looks like a header is not taken for one.
+    """
+    hunks, current, remaining = {}, None, 0
+    for line in lines:
+        if line.startswith("\\"):
+            # "\ No newline at end of file" is not counted in the hunk.
+            continue
+        if remaining > 0:
+            remaining -= 1
+            continue
+        if line.startswith("+++ "):
+            current = _diff_path(line)
+            if current is not None:
+                hunks.setdefault(current, [])
+            continue
+        match = _HUNK_HEADER.match(line)
+        if match is None:
+            continue
+        old_count = int(match.group(1) or 1)
+        start, new_count = int(match.group(2)), int(match.group(3) or 1)
+        remaining = old_count + new_count
+        if current is None:
+            continue
+        if new_count:
+            hunks[current].append((start, start + new_count - 1))
+        else:
+            hunks[current].append((max(1, start), start + 1))
+    return hunks
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = "./embedding_cache"
+DEFAULT_MAX_ENTRIES = 200_000
+
+# Files are (re)allocated in steps of at least this many slots.
+_MIN_CAPACITY = 1024
+_KEY_BYTES = 32
+_META_FILENAME = "meta.json"
+_KEYS_FILENAME = "keys.u8"
+_TICKS_FILENAME = "ticks.u64"
+_VECTORS_FILENAME = "vectors.f32"
+_FORMAT_VERSION = 1
+
+
+def normalize_chunk(text: str) -> str:
+    """Collapse whitespace so re-chunked but otherwise identical text shares a cache key."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def chunk_key(text: str) -> bytes:
+    """Return the raw SHA-256 digest of the normalized chunk text."""
+    return hashlib.sha256(normalize_chunk(text).encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Persistent, size-bounded cache of chunk embeddings for one embedding model.
+
+    Each model gets its own directory holding three memory-mapped arrays that
+    share a slot index: the chunk-text hashes (``keys.u8``), last-use ticks for
+    LRU eviction (``ticks.u64``, 0 marks a free slot) and the float32 vectors
+    (``vectors.f32``). Nothing but the hash -> slot map is kept in Python memory.
+    The stored hash is checked on every lookup, so a slot overwritten by an
+    interrupted run can never be returned for the wrong chunk.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.model_name = model_name
+        self.max_entries = max(1, max_entries)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name).strip("_")
+        digest = hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:12]
+        self.path = os.path.join(cache_dir, f"{slug}-{digest}")
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._dim: int | None = None
+        self._capacity = 0
+        self._tick = 0
+        self._slots: dict[bytes, int] = {}
+        self._keys = self._ticks = self._vectors = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self) -> None:
+        try:
+            with open(self._file(_META_FILENAME), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get("version") != _FORMAT_VERSION or meta.get("model") != self.model_name:
+            return
+
+        try:
+            self._dim = int(meta["dim"])
+            self._capacity = int(meta["capacity"])
+            self._map_arrays()
+        except (KeyError, OSError, ValueError):
+            # Unreadable or truncated cache: start over rather than fail the ingest.
+            self._dim, self._capacity = None, 0
+            self._keys = self._ticks = self._vectors = None
+            return
+
+        live = np.flatnonzero(self._ticks)
+        self._slots = {self._keys[slot].tobytes(): int(slot) for slot in live}
+        self._tick = int(self._ticks.max()) if self._capacity else 0
+
+        if self._capacity > self.max_entries:
+            self._resize(self.max_entries)
+
+    def _map_arrays(self, mode: str = "r+") -> None:
+        shape = (self._capacity,)
+        self._keys = np.memmap(self._file(_KEYS_FILENAME), dtype=np.uint8, mode=mode, shape=(*shape, _KEY_BYTES))
+        self._ticks = np.memmap(self._file(_TICKS_FILENAME), dtype=np.uint64, mode=mode, shape=shape)
+        self._vectors = np.memmap(self._file(_VECTORS_FILENAME), dtype=np.float32, mode=mode, shape=(*shape, self._dim))
+
+    def _write_meta(self) -> None:
+        meta = {"version": _FORMAT_VERSION, "model": self.model_name, "dim": self._dim, "capacity": self._capacity}
+        tmp_path = self._file(f"{_META_FILENAME}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._file(_META_FILENAME))
+
+    def _resize(self, capacity: int) -> None:
+        """Rewrite the arrays with room for capacity slots, keeping the most recent entries."""
+        old = None
+        if self._capacity:
+            live = np.flatnonzero(self._ticks)
+            newest_first = live[np.argsort(self._ticks[live])[::-1]]
+            keep = newest_first[:capacity]
+            self.evictions += len(live) - len(keep)
+            old = (np.array(self._keys[keep]), np.array(self._ticks[keep]), np.array(self._vectors[keep]))
+            self.flush()
+            self._keys = self._ticks = self._vectors = None
+
+        os.makedirs(self.path, exist_ok=True)
+        self._capacity = capacity
+        self._map_arrays(mode="w+")
+        self._slots = {}
+        if old is not None:
+            keys, ticks, vectors = old
+            count = len(ticks)
+            self._keys[:count] = keys
+            self._ticks[:count] = ticks
+            self._vectors[:count] = vectors
+            self._slots = {keys[i].tobytes(): i for i in range(count)}
+        self._write_meta()
+
+    def _free_slots(self, count: int) -> list[int]:
+        """Return count writable slots, growing the files or evicting LRU entries as needed."""
+        if self._capacity - len(self._slots) < count and self._capacity < self.max_entries:
+            target = max(_MIN_CAPACITY, self._capacity * 2, len(self._slots) + count)
+            self._resize(min(self.max_entries, target))
+
+        free = np.flatnonzero(self._ticks == 0)[:count].tolist()
+        shortfall = count - len(free)
+        if shortfall > 0:
+            live = np.flatnonzero(self._ticks)
+            oldest = live[np.argpartition(self._ticks[live], shortfall - 1)[:shortfall]]
+            for slot in oldest.tolist():
+                del self._slots[self._keys[slot].tobytes()]
+                self._ticks[slot] = 0
+            self.evictions += len(oldest)
+            free.extend(oldest.tolist())
+        return free
+
+    def get_many(self, texts: list[str]) -> list[np.ndarray | None]:
+        """Look up embeddings for texts; missing entries come back as None."""
+        results: list[np.ndarray | None] = []
+        for text in texts:
+            key = chunk_key(text)
+            slot = self._slots.get(key)
+            if slot is None or self._keys[slot].tobytes() != key:
+                self.misses += 1
+                results.append(None)
+                continue
+            self.hits += 1
+            self._tick += 1
+            self._ticks[slot] = self._tick
+            results.append(np.array(self._vectors[slot]))
+        return results
+
+    def put_many(self, texts: list[str], embeddings) -> None:
+        """Store embeddings for texts, evicting least recently used entries when full."""
+        pairs = {}
+        for text, embedding in zip(texts, embeddings, strict=True):
+            key = chunk_key(text)
+            if key not in self._slots:
+                pairs[key] = np.asarray(embedding, dtype=np.float32)
+        if not pairs:
+            return
+
+        if self._dim is None:
+            self._dim = int(next(iter(pairs.values())).shape[-1])
+        # Never hand out more slots than the cache can hold.
+        items = list(pairs.items())[-self.max_entries :]
+        for slot, (key, vector) in zip(self._free_slots(len(items)), items, strict=True):
+            # Clear the key first so a crash mid-write leaves an unusable slot, not a wrong one.
+            self._keys[slot] = 0
+            self._vectors[slot] = vector
+            self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+            self._tick += 1
+            self._ticks[slot] = self._tick
+            self._slots[key] = slot
+
+    def flush(self) -> None:
+        """Write dirty pages of the memory-mapped arrays to disk."""
+        for array in (self._keys, self._ticks, self._vectors):
+            if array is not None:
+                array.flush()
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return (
+            f"Embedding cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), "
+            f"{self.evictions} evicted, {len(self)} entries"
+        )
@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+
+# Model assumed for collections indexed before the profile was recorded.
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+class EmbeddingMismatchError(RuntimeError):
+    """Raised when an embedding model does not match the one a collection was indexed with."""
+
+
+def is_normalized(st_model) -> bool:
+    """Return True if the SentenceTransformer pipeline ends in a Normalize module."""
+    return any(type(module).__name__ == "Normalize" for module in st_model)
+
+
+@dataclass(frozen=True)
+class EmbeddingProfile:
+    """How the vectors of a collection were produced.
+
+    Ingest stores it in the collection metadata so query can load exactly the
+    same embedding model instead of assuming one.
+    """
+
+    model: str
+    dimension: int
+    normalized: bool
+    chunking: str = "chars"
+    chunk_size_chars: int = 1800
+    overlap_sents: int = 2
+    max_tokens: int | None = None
+
+    @classmethod
+    def from_model(cls, st_model, model_name: str, **chunking) -> "EmbeddingProfile":
+        return cls(
+            model=model_name,
+            dimension=int(st_model.get_sentence_embedding_dimension()),
+            normalized=is_normalized(st_model),
+            **chunking,
+        )
+
+    @classmethod
+    def from_collection(cls, collection) -> "EmbeddingProfile | None":
+        """Read the profile from collection metadata; None if ingest never recorded one."""
+        metadata = collection.metadata or {}
+        if "embedding_model" not in metadata:
+            return None
+        return cls(
+            model=metadata["embedding_model"],
+            dimension=metadata["embedding_dimension"],
+            normalized=metadata["embedding_normalized"],
+            chunking=metadata.get("chunking", "chars"),
+            chunk_size_chars=metadata.get("chunk_size_chars", 1800),
+            overlap_sents=metadata.get("overlap_sents", 2),
+            max_tokens=metadata.get("chunk_max_tokens"),
+        )
+
+    def to_metadata(self) -> dict:
+        # Chroma metadata values cannot be None, so an unset max_tokens is left out.
+        metadata = {
+            "embedding_model": self.model,
+            "embedding_dimension": self.dimension,
+            "embedding_normalized": self.normalized,
+            "chunking": self.chunking,
+            "chunk_size_chars": self.chunk_size_chars,
+            "overlap_sents": self.overlap_sents,
+        }
+        if self.max_tokens is not None:
+            metadata["chunk_max_tokens"] = self.max_tokens
+        return metadata
+
+    def check(self, model_name: str, dimension: int, normalized: bool) -> None:
+        """Raise EmbeddingMismatchError unless the given model produces vectors like this profile's."""
+        if (model_name, dimension, normalized) != (self.model, self.dimension, self.normalized):
+            raise EmbeddingMismatchError(
+                f"Embedding model {model_name} ({dimension} dimensions, normalized={normalized}) does not match "
+                f"the collection, indexed with {self.model} ({self.dimension} dimensions, "
+                f"normalized={self.normalized})"
+            )
@@ -0,0 +1,87 @@
+import os
+import re
+
+# Tokens of code and reference context one packed prompt may hold; 0 turns packing off.
+DEFAULT_PACK_TOKENS = 0
+# Only files with at most this many lines are packed; larger ones keep a prompt of their own.
+SMALL_FILE_LINES = 50
+
+# A section header of the packed answer, e.g. "### File 2: app/models.py": a line of its
+# own with the file's number, optionally followed by a colon and the path. Markdown
+# heading and emphasis marks around it are tolerated.
+_SECTION_HEADER = re.compile(r"^[ \t#*_>]*File[ \t]+(\d+)[ \t]*(?::[^\n]*|[*_]*)[ \t]*$", re.IGNORECASE | re.MULTILINE)
+
+
+def is_small(code: str, max_lines: int = SMALL_FILE_LINES) -> bool:
+    return len(code.splitlines()) <= max_lines
+
+
+def pack_files(file_tokens, max_tokens: int) -> list[list[int]]:
+    """Group files into packs of at most max_tokens estimated tokens.
+
+    file_tokens holds (file_path, tokens) pairs, or None for files that must not
+    be packed. Packs never span directories, so each holds files of one module
+    or package, and keep the input order. A file that fits nowhere but on its
+    own is left out, as are packs of a single file.
+
+    Returns:
+        list: Packs of at least two indices into file_tokens
+    """
+    by_directory = {}
+    for position, item in enumerate(file_tokens):
+        if item is not None and item[1] <= max_tokens:
+            by_directory.setdefault(os.path.dirname(item[0]), []).append(position)
+
+    packs = []
+    for positions in by_directory.values():
+        pack, used = [], 0
+        for position in positions:
+            tokens = file_tokens[position][1]
+            if pack and used + tokens > max_tokens:
+                packs.append(pack)
+                pack, used = [], 0
+            pack.append(position)
+            used += tokens
+        packs.append(pack)
+    return sorted((pack for pack in packs if len(pack) > 1), key=lambda pack: pack[0])
+
+
+def format_packed_code(file_paths, codes) -> str:
+    """Return the code of every file of a pack, each under a numbered label."""
+    return "\n\n".join(
+        f"[File {number}: {file_path}]\n{code}"
+        for number, (file_path, code) in enumerate(zip(file_paths, codes, strict=True), 1)
+    )
+
+
+def answer_format(file_paths) -> str:
+    """Return the instructions for the per-file sections split_packed_analysis expects."""
+    headers = "\n".join(f"### File {number}: {file_path}" for number, file_path in enumerate(file_paths, 1))
+    return f"""Analyze each file on its own. Answer with exactly one section per file, in this order, each \
+starting with its header line:
+{headers}
+Report each file's findings, or "No vulnerabilities detected.", under its own header only."""
+
+
+def split_packed_analysis(text: str, count: int) -> list[str] | None:
+    """Split a packed answer into the analyses of its count files, or None when it does not have them all.
+
+    Headers must appear in order; one for a file whose section already started
+    or is still to come is left in the current section. Every section must be
+    non-empty.
+    """
+    starts, expected = [], 1
+    for match in _SECTION_HEADER.finditer(text):
+        if expected <= count and int(match.group(1)) == expected:
+            starts.append((match.start(), match.end()))
+            expected += 1
+    if len(starts) != count:
+        return None
+    sections = []
+    for i, (_, body_start) in enumerate(starts):
+        body_end = starts[i + 1][0] if i + 1 < count else len(text)
+        section = text[body_start:body_end].strip()
+        if not section:
+            return None
+        sections.append(section)
+    return sections
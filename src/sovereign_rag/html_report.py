@@ -1,4 +1,6 @@
 import datetime
+import json
+import os
 
 
 def generate_html_header(title):
@@ -122,7 +124,14 @@ def generate_html_footer():
 """
 
 
-def add_file_to_html(file_path, analysis_result, sources=None):
+# How each tier of a model cascade is described in the report.
+TIER_LABELS = {
+    "screen": "screening model (cleared, not analyzed further)",
+    "full": "full analysis model (flagged by the screening model)",
+}
+
+
+def add_file_to_html(file_path, analysis_result, sources=None, tier=None):
     """
     Generate HTML for a file analysis result with a collapsible section.
 
@@ -130,10 +139,16 @@ def add_file_to_html(file_path, analysis_result, sources=None):
         file_path (str): Path to the analyzed file
         analysis_result (str): The analysis result text
         sources (list, optional): Source documents retrieved as context for this file
+        tier (str, optional): Cascade tier that produced the verdict, "screen" or "full"
 
     Returns:
         str: HTML content for the file analysis
     """
+    tier_html = ""
+    if tier:
+        tier_html = f"""
+                <p class="tier"><strong>Verdict by:</strong> {TIER_LABELS.get(tier, tier)}</p>"""
+
     sources_html = ""
     if sources:
         items = "".join(f"<li>{s}</li>" for s in sources)
@@ -149,13 +164,86 @@ def add_file_to_html(file_path, analysis_result, sources=None):
                 <span>{file_path}</span>
                 <span class="toggle-icon">+</span>
             </div>
-            <div class="file-content">
+            <div class="file-content">{tier_html}
                 <pre>{analysis_result}</pre>{sources_html}
             </div>
         </div>
 """
 
 
+def add_triage_to_html(results, threshold, seconds):
+    """
+    Generate HTML listing the triage score and signals of every file, in a collapsible section.
+
+    Args:
+        results (list): TriageResult per file, in input order
+        threshold (int): Files scoring below this were skipped
+        seconds (float): Time the whole triage took
+
+    Returns:
+        str: HTML content for the triage section
+    """
+    skipped = [r for r in results if r.skipped(threshold)]
+    lines = []
+    for r in results:
+        decision = "skipped " if r.skipped(threshold) else "analyzed"
+        score = "-" if r.score is None else r.score
+        signals = ", ".join(r.signals) or ("unreadable" if r.score is None else "no security-relevant surface")
+        lines.append(f"{decision}  {score:>3}  {r.file_path}  ({signals}; {r.seconds * 1000:.1f} ms)")
+    listing = "\n".join(lines)
+    summary = f"Triage: {len(skipped)} of {len(results)} files skipped (score below {threshold}, {seconds:.2f}s)"
+
+    return f"""
+        <div class="file-item triage">
+            <div class="file-header">
+                <span>{summary}</span>
+                <span class="toggle-icon">+</span>
+            </div>
+            <div class="file-content">
+                <pre>{listing}</pre>
+            </div>
+        </div>
+"""
+
+
+def add_cascade_to_html(summary):
+    """
+    Generate HTML summarizing a model cascade run in a collapsible section.
+
+    Args:
+        summary (dict): "screen_model", "model", "files" (files per tier) and "latency"
+            (per tier: requests, mean, p50, p95 and max seconds, see latency_stats)
+
+    Returns:
+        str: HTML content for the cascade section
+    """
+    lines = [f"Screening model: {summary['screen_model']}", f"Full analysis model: {summary['model']}", ""]
+    for tier in ("screen", "full"):
+        lines.append(f"Verdicts by the {TIER_LABELS[tier]}: {summary['files'].get(tier, 0)} files")
+    lines.append("")
+    for tier, stats in summary["latency"].items():
+        lines.append(
+            f"{tier:<6} {stats['requests']:>5} requests  mean {stats['mean']:.2f}s  p50 {stats['p50']:.2f}s  "
+            f"p95 {stats['p95']:.2f}s  max {stats['max']:.2f}s"
+        )
+    listing = "\n".join(lines)
+    screened = summary["files"].get("screen", 0)
+    total = screened + summary["files"].get("full", 0)
+    screen_model = summary["screen_model"]
+
+    return f"""
+        <div class="file-item cascade">
+            <div class="file-header">
+                <span>Model cascade: {screened} of {total} files cleared by {screen_model}</span>
+                <span class="toggle-icon">+</span>
+            </div>
+            <div class="file-content">
+                <pre>{listing}</pre>
+            </div>
+        </div>
+"""
+
+
 def generate_html_report(title, html_content):
     """
     Generate a complete HTML report.
@@ -171,3 +259,72 @@ def generate_html_report(title, html_content):
     html_report += "".join(html_content)
     html_report += generate_html_footer()
     return html_report
+
+
+class ReportWriter:
+    """
+    Write report.html and its report.jsonl sidecar file by file, as analyses finish.
+
+    Every file is flushed to disk as soon as it is added, so a run that crashes
+    or is interrupted keeps the files analyzed so far and memory does not grow
+    with the size of the scan. report.jsonl holds one JSON object per file
+    ({"file", "analysis", "sources"}, plus "tier" in a model cascade) for tools
+    that consume partial results, after an optional {"triage": ...} record (see
+    add_triage) and before an optional {"cascade": ...} one (see add_cascade).
+    close() completes the HTML document.
+    """
+
+    def __init__(self, output_dir, title):
+        self.html_path = os.path.join(output_dir, "report.html")
+        self.jsonl_path = os.path.join(output_dir, "report.jsonl")
+        self.count = 0
+        # Files per cascade tier, for add_cascade.
+        self.tiers = {}
+        self._html = open(self.html_path, "w", encoding="utf-8")
+        self._jsonl = open(self.jsonl_path, "w", encoding="utf-8")
+        self._html.write(generate_html_header(title))
+        self._html.flush()
+
+    def add(self, file_path, analysis_result, sources=None, tier=None):
+        """Append one file's analysis to both files and flush them."""
+        self._html.write(add_file_to_html(file_path, analysis_result, sources, tier))
+        self._html.flush()
+        record = {"file": file_path, "analysis": analysis_result, "sources": list(sources or [])}
+        if tier:
+            record["tier"] = tier
+            self.tiers[tier] = self.tiers.get(tier, 0) + 1
+        self._jsonl.write(json.dumps(record) + "\n")
+        self._jsonl.flush()
+        self.count += 1
+
+    def add_triage(self, results, threshold, seconds):
+        """Append the triage section and a {"triage": ...} JSONL record."""
+        self._html.write(add_triage_to_html(results, threshold, seconds))
+        self._html.flush()
+        files = [
+            {"file": r.file_path, "score": r.score, "signals": r.signals, "skipped": r.skipped(threshold)}
+            for r in results
+        ]
+        record = {"triage": {"threshold": threshold, "seconds": round(seconds, 6), "files": files}}
+        self._jsonl.write(json.dumps(record) + "\n")
+        self._jsonl.flush()
+
+    def add_cascade(self, summary):
+        """Append the model cascade section and a {"cascade": ...} JSONL record."""
+        self._html.write(add_cascade_to_html(summary))
+        self._html.flush()
+        self._jsonl.write(json.dumps({"cascade": summary}) + "\n")
+        self._jsonl.flush()
+
+    def close(self):
+        if self._html.closed:
+            return
+        self._html.write(generate_html_footer())
+        self._html.close()
+        self._jsonl.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,7 +1,16 @@
 import argparse
+import hashlib
+import json
 import os
+import queue
 import re
 import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
 
 import chromadb
 import fitz
@@ -10,9 +19,24 @@ from colorama import Fore, Style, init
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
+from .embedding_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_ENTRIES, EmbeddingCache
+from .embedding_profile import EmbeddingMismatchError, EmbeddingProfile
+
 # Initialize colorama
 init(autoreset=True)
 
+# Pages handed to nlp.pipe per batch; PDF pages are long, so keep this modest.
+PIPE_BATCH_SIZE = 16
+
+# spaCy pipeline profiles accepted by load_nlp().
+NLP_PROFILES = ("full", "trimmed")
+# Components is_relevant_sentence never reads; dropped by the trimmed profile.
+TRIMMED_EXCLUDE = ["parser", "ner", "lemmatizer"]
+# With parse workers, PDFs of at least this many pages are split into ranges of
+# PAGE_RANGE_SIZE pages that the workers segment in parallel.
+PAGE_RANGE_MIN_PAGES = 100
+PAGE_RANGE_SIZE = 25
+
 
 def clean_text(text):
     text = re.sub(r"\n+", "\n", text)
@@ -52,8 +76,149 @@ def is_relevant_sentence(sent):
     return noun_like >= 2
 
 
+class TokenBudget:
+    """Measures text in an embedding model's own tokens.
+
+    max_tokens is the model's max_seq_length minus the special tokens its
+    tokenizer adds, i.e. the number of content tokens that reach the encoder
+    before the rest of a chunk is silently truncated.
+    """
+
+    def __init__(self, tokenizer, max_tokens: int):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+
+    @classmethod
+    def from_model(cls, st_model) -> "TokenBudget":
+        special = st_model.tokenizer.num_special_tokens_to_add(pair=False)
+        return cls(st_model.tokenizer, st_model.max_seq_length - special)
+
+    def count_many(self, texts: list[str]) -> list[int]:
+        if not texts:
+            return []
+        encoded = self.tokenizer(texts, add_special_tokens=False, verbose=False)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+
+class _ChunkPacker:
+    """Streaming sentence packer behind iter_chunks / build_chunks_from_sentences.
+
+    Sentences are pushed one at a time with their size; a chunk is handed back
+    as soon as the next sentence would overflow it. Only the open chunk is kept,
+    so once a chunk closes just its overlap window stays in memory. A single
+    sentence larger than limit becomes its own (oversized) chunk, and the
+    overlap carried into a new chunk can push it past limit too.
+    """
+
+    def __init__(self, limit: int, join_cost: int, overlap_sents: int):
+        self.limit = limit
+        # join_cost accounts for the space between joined sentences
+        self.join_cost = join_cost
+        self.overlap_sents = overlap_sents
+        self.current: list[tuple] = []
+        self.current_len = 0
+
+    def push(self, item, size: int) -> list | None:
+        """Add one sentence; return the items of the chunk it closed, if any."""
+        closed = None
+        projected = self.current_len + size + (self.join_cost if self.current else 0)
+
+        if self.current and projected > self.limit:
+            closed = [i for i, _ in self.current]
+
+            # overlap: keep last N sentences
+            self.current = self.current[-self.overlap_sents :] if self.overlap_sents > 0 else []
+            self.current_len = sum(sz for _, sz in self.current) + self.join_cost * max(0, len(self.current) - 1)
+
+        self.current.append((item, size))
+        self.current_len += size + (self.join_cost if len(self.current) > 1 else 0)
+        return closed
+
+    def finish(self) -> list | None:
+        """Return the items of the final, still open chunk."""
+        closed = [i for i, _ in self.current] or None
+        self.current, self.current_len = [], 0
+        return closed
+
+
+def iter_chunks(
+    sentence_batches,
+    chunk_size_chars: int = 1800,
+    overlap_sents: int = 2,
+    token_budget: TokenBudget | None = None,
+    stats: dict | None = None,
+):
+    """Yield chunks from a stream of sentence batches as soon as each one closes.
+
+    sentence_batches is any iterable of sentence lists (e.g. one list per PDF
+    page); batches only exist so token mode can make one tokenizer call per
+    batch. Duplicate chunks are dropped by 16-byte digest rather than by keeping
+    their text, so memory does not grow with the length of the document.
+    """
+    if token_budget is None:
+        packer = _ChunkPacker(chunk_size_chars, 1, overlap_sents)
+        char_packer = None
+    else:
+        packer = _ChunkPacker(token_budget.max_tokens, 0, overlap_sents)
+        # Shadow the char-based scheme over the same token counts for the report.
+        char_packer = _ChunkPacker(chunk_size_chars, 1, overlap_sents) if stats is not None else None
+    counts = {"chunks": 0, "over_budget": 0, "char_chunks": 0, "char_over_budget": 0}
+    seen: set[bytes] = set()
+
+    def close(sentences: list[str] | None) -> str | None:
+        if not sentences:
+            return None
+        chunk = " ".join(sentences)
+        digest = hashlib.blake2b(chunk.encode("utf-8"), digest_size=16).digest()
+        if digest in seen:
+            return None
+        seen.add(digest)
+        return chunk
+
+    def tally_char_chunk(token_sizes: list[int] | None) -> None:
+        if token_sizes:
+            counts["char_chunks"] += 1
+            counts["char_over_budget"] += sum(token_sizes) > token_budget.max_tokens
+
+    for batch in sentence_batches:
+        batch = [s.strip() for s in batch]
+        batch = [s for s in batch if s]
+        if not batch:
+            continue
+        sizes = token_budget.count_many(batch) if token_budget else [len(s) for s in batch]
+
+        for sentence, size in zip(batch, sizes, strict=True):
+            if char_packer is not None:
+                tally_char_chunk(char_packer.push(size, len(sentence)))
+            closed = packer.push((sentence, size), size)
+            if closed:
+                counts["chunks"] += 1
+                counts["over_budget"] += token_budget is not None and sum(sz for _, sz in closed) > packer.limit
+                chunk = close([sentence for sentence, _ in closed])
+                if chunk:
+                    yield chunk
+
+    # flush
+    closed = packer.finish()
+    if closed:
+        counts["chunks"] += 1
+        counts["over_budget"] += token_budget is not None and sum(sz for _, sz in closed) > packer.limit
+        chunk = close([sentence for sentence, _ in closed])
+        if chunk:
+            yield chunk
+    if char_packer is not None:
+        tally_char_chunk(char_packer.finish())
+
+    if stats is not None and token_budget is not None:
+        merge_chunking_stats(stats, counts)
+
+
 def build_chunks_from_sentences(
-    sentences: list[str], chunk_size_chars: int = 1800, overlap_sents: int = 2
+    sentences: list[str],
+    chunk_size_chars: int = 1800,
+    overlap_sents: int = 2,
+    token_budget: TokenBudget | None = None,
+    stats: dict | None = None,
 ) -> list[str]:
     """Group sentences into larger chunks to control context size.
 
@@ -61,54 +226,31 @@ def build_chunks_from_sentences(
         sentences: List of sentence strings.
         chunk_size_chars: Target chunk size in characters.
         overlap_sents: Number of sentences to overlap between consecutive chunks.
+        token_budget: When given, sentences are measured in the embedding model's
+            tokens and chunks are packed up to token_budget.max_tokens instead of
+            chunk_size_chars.
+        stats: Optional dict updated, in token mode, with chunk counts for both
+            schemes and how many would exceed the model's window (see
+            merge_chunking_stats).
 
     Returns:
         List of chunk strings.
     """
-    if not sentences:
-        return []
-
-    chunks: list[str] = []
-    current: list[str] = []
-    current_len = 0
-
-    for s in sentences:
-        s = s.strip()
-        if not s:
-            continue
-        # +1 for space/newline join
-        projected = current_len + len(s) + (1 if current else 0)
-
-        if current and projected > chunk_size_chars:
-            chunk = " ".join(current).strip()
-            if chunk:
-                chunks.append(chunk)
-
-            # overlap: keep last N sentences
-            if overlap_sents > 0:
-                current = current[-overlap_sents:]
-                current_len = sum(len(x) for x in current) + max(0, len(current) - 1)
-            else:
-                current = []
-                current_len = 0
-
-        current.append(s)
-        current_len = current_len + len(s) + (1 if len(current) > 1 else 0)
-
-    # flush
-    final_chunk = " ".join(current).strip()
-    if final_chunk:
-        chunks.append(final_chunk)
+    return list(
+        iter_chunks(
+            [sentences],
+            chunk_size_chars=chunk_size_chars,
+            overlap_sents=overlap_sents,
+            token_budget=token_budget,
+            stats=stats,
+        )
+    )
 
-    # de-duplicate while preserving order
-    seen = set()
-    deduped: list[str] = []
-    for c in chunks:
-        if c not in seen:
-            seen.add(c)
-            deduped.append(c)
 
-    return deduped
+def merge_chunking_stats(total: dict, stats: dict) -> None:
+    """Add token-chunking counters from one document into a running total."""
+    for key, value in stats.items():
+        total[key] = total.get(key, 0) + value
 
 
 def strip_markdown(text: str) -> str:
@@ -131,55 +273,365 @@ def strip_markdown(text: str) -> str:
     return text
 
 
-def _chunk_sentences(text: str, chunk_size_chars: int, overlap_sents: int) -> list[str]:
+def _chunk_sentences(
+    text: str,
+    chunk_size_chars: int,
+    overlap_sents: int,
+    token_budget: TokenBudget | None = None,
+    stats: dict | None = None,
+) -> list[str]:
     """Run spaCy segmentation + relevance filtering, then group into chunks."""
     sentences: list[str] = []
     spacy_doc = nlp(text)
     for sent in spacy_doc.sents:
         if is_relevant_sentence(sent):
             sentences.append(sent.text.strip())
-    return build_chunks_from_sentences(sentences, chunk_size_chars=chunk_size_chars, overlap_sents=overlap_sents)
+    return build_chunks_from_sentences(
+        sentences,
+        chunk_size_chars=chunk_size_chars,
+        overlap_sents=overlap_sents,
+        token_budget=token_budget,
+        stats=stats,
+    )
+
+
+def _segment_pages(pages):
+    """Lazily turn PDF pages into one list of relevant sentences per non-empty page."""
+    texts = (clean_text(page.get_text()) for page in pages)
+    # Pages are streamed through nlp.pipe so spaCy can batch them internally.
+    return (
+        [sent.text.strip() for sent in spacy_doc.sents if is_relevant_sentence(sent)]
+        for spacy_doc in nlp.pipe((text for text in texts if text), batch_size=PIPE_BATCH_SIZE)
+    )
+
+
+def _segment_page_range_in_worker(pdf_path, start: int, stop: int) -> list[list[str]]:
+    doc = fitz.open(pdf_path)
+    try:
+        return list(_segment_pages(doc.pages(start, stop)))
+    finally:
+        doc.close()
 
 
-def preprocess_pdf(pdf_path, chunk_size_chars: int = 1800, overlap_sents: int = 2):
+def _pdf_page_count(pdf_path) -> int:
     try:
         doc = fitz.open(pdf_path)
-        sentences: list[str] = []
+    except Exception:
+        # Leave the error to the parse path, which reports it per file.
+        return 0
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
 
-        for page in tqdm(doc, desc=f"Processing {pdf_path}"):
-            raw_text = page.get_text()
-            cleaned = clean_text(raw_text)
-            if not cleaned:
-                continue
-            spacy_doc = nlp(cleaned)
-            for sent in spacy_doc.sents:
-                if is_relevant_sentence(sent):
-                    sentences.append(sent.text.strip())
 
+def _iter_page_range_sentences(pdf_path, executor, max_in_flight: int):
+    """Segment a PDF's page ranges on executor and yield the sentence batches in page order.
+
+    At most max_in_flight ranges are submitted ahead of the consumer, so memory
+    stays bounded however long the document is.
+    """
+    page_count = _pdf_page_count(pdf_path)
+    pending: deque = deque()
+    progress = tqdm(total=page_count, desc=f"Processing {pdf_path}")
+
+    def take_next():
+        pages, future = pending.popleft()
+        batches = future.result()
+        progress.update(pages)
+        return batches
+
+    try:
+        for start in range(0, page_count, PAGE_RANGE_SIZE):
+            stop = min(start + PAGE_RANGE_SIZE, page_count)
+            pending.append((stop - start, executor.submit(_segment_page_range_in_worker, pdf_path, start, stop)))
+            if len(pending) >= max(1, max_in_flight):
+                yield from take_next()
+        while pending:
+            yield from take_next()
+    finally:
+        for _, future in pending:
+            future.cancel()
+        progress.close()
+
+
+def iter_pdf_chunks(
+    pdf_path,
+    chunk_size_chars: int = 1800,
+    overlap_sents: int = 2,
+    token_budget: TokenBudget | None = None,
+    stats: dict | None = None,
+    executor=None,
+    max_in_flight: int = 2,
+):
+    """Stream a PDF's chunks page by page.
+
+    Pages are extracted, segmented and packed lazily, so memory stays roughly
+    constant no matter how many pages the document has. Errors propagate to the
+    caller; use preprocess_pdf for the list-returning, error-reporting form.
+
+    With an executor (a parse worker pool), pages are extracted and segmented in
+    ranges of PAGE_RANGE_SIZE on the workers while sentences are still packed
+    here, in page order, so chunk boundaries and overlap across range edges are
+    exactly those of the serial run.
+    """
+    if executor is not None:
+        sentence_batches = _iter_page_range_sentences(pdf_path, executor, max_in_flight)
         # Group sentences into larger chunks (fewer, bigger chunks = faster LLM context)
-        return build_chunks_from_sentences(sentences, chunk_size_chars=chunk_size_chars, overlap_sents=overlap_sents)
+        yield from iter_chunks(
+            sentence_batches,
+            chunk_size_chars=chunk_size_chars,
+            overlap_sents=overlap_sents,
+            token_budget=token_budget,
+            stats=stats,
+        )
+        return
+
+    doc = fitz.open(pdf_path)
+    try:
+        sentence_batches = _segment_pages(tqdm(doc, desc=f"Processing {pdf_path}"))
+        yield from iter_chunks(
+            sentence_batches,
+            chunk_size_chars=chunk_size_chars,
+            overlap_sents=overlap_sents,
+            token_budget=token_budget,
+            stats=stats,
+        )
+    finally:
+        doc.close()
+
+
+def preprocess_pdf(
+    pdf_path,
+    chunk_size_chars: int = 1800,
+    overlap_sents: int = 2,
+    token_budget: TokenBudget | None = None,
+    stats: dict | None = None,
+    executor=None,
+):
+    try:
+        return list(
+            iter_pdf_chunks(
+                pdf_path,
+                chunk_size_chars=chunk_size_chars,
+                overlap_sents=overlap_sents,
+                token_budget=token_budget,
+                stats=stats,
+                executor=executor,
+            )
+        )
 
     except Exception as e:
         print(f"{Fore.RED}Error processing PDF {pdf_path}: {str(e)}")
         return []
 
 
-def preprocess_markdown(md_path, chunk_size_chars: int = 1800, overlap_sents: int = 2):
-    try:
-        with open(md_path, encoding="utf-8") as f:
-            raw_text = f.read()
+def _markdown_chunks(
+    md_path,
+    chunk_size_chars: int = 1800,
+    overlap_sents: int = 2,
+    token_budget: TokenBudget | None = None,
+    stats: dict | None = None,
+) -> list[str]:
+    """Chunk a Markdown file; errors propagate to the caller, like iter_pdf_chunks."""
+    with open(md_path, encoding="utf-8") as f:
+        raw_text = f.read()
 
-        cleaned = clean_text(strip_markdown(raw_text))
-        if not cleaned:
-            return []
+    cleaned = clean_text(strip_markdown(raw_text))
+    if not cleaned:
+        return []
 
-        return _chunk_sentences(cleaned, chunk_size_chars, overlap_sents)
+    return _chunk_sentences(cleaned, chunk_size_chars, overlap_sents, token_budget=token_budget, stats=stats)
+
+
+def preprocess_markdown(
+    md_path,
+    chunk_size_chars: int = 1800,
+    overlap_sents: int = 2,
+    token_budget: TokenBudget | None = None,
+    stats: dict | None = None,
+):
+    try:
+        return _markdown_chunks(md_path, chunk_size_chars, overlap_sents, token_budget=token_budget, stats=stats)
 
     except Exception as e:
         print(f"{Fore.RED}Error processing Markdown {md_path}: {str(e)}")
         return []
 
 
+def preprocess_file(
+    file_path,
+    chunk_size_chars: int = 1800,
+    overlap_sents: int = 2,
+    token_budget: TokenBudget | None = None,
+    stats: dict | None = None,
+) -> list[str]:
+    """Extract and chunk a single source file, dispatching by extension."""
+    options = {
+        "chunk_size_chars": chunk_size_chars,
+        "overlap_sents": overlap_sents,
+        "token_budget": token_budget,
+        "stats": stats,
+    }
+    if file_path.lower().endswith(".md"):
+        return preprocess_markdown(file_path, **options)
+    return preprocess_pdf(file_path, **options)
+
+
+def iter_file_chunks(
+    file_path,
+    chunk_size_chars: int = 1800,
+    overlap_sents: int = 2,
+    token_budget: TokenBudget | None = None,
+    stats: dict | None = None,
+):
+    """Streaming counterpart of preprocess_file.
+
+    PDFs are chunked page by page (see iter_pdf_chunks). Markdown files are
+    small, so they are still chunked in one go. Errors of either propagate to the
+    caller, so a file that fails is never mistaken for an empty one.
+    """
+    options = {
+        "chunk_size_chars": chunk_size_chars,
+        "overlap_sents": overlap_sents,
+        "token_budget": token_budget,
+        "stats": stats,
+    }
+    if file_path.lower().endswith(".md"):
+        yield from _markdown_chunks(file_path, **options)
+    else:
+        yield from iter_pdf_chunks(file_path, **options)
+
+
+def load_nlp(profile: str = "full"):
+    """Load the spaCy pipeline used for sentence segmentation and relevance filtering.
+
+    The "trimmed" profile keeps only what is_relevant_sentence reads: sentence
+    boundaries (the statistical senter instead of the dependency parser) and
+    pos_/is_alpha (tagger + attribute_ruler). NER, the lemmatizer and the parser
+    are never loaded, which cuts parse time and memory on large PDFs.
+    """
+    if profile not in NLP_PROFILES:
+        raise ValueError(f"Unknown spaCy profile '{profile}'. Expected one of: {', '.join(NLP_PROFILES)}")
+    if profile == "full":
+        return spacy.load("en_core_web_sm")
+
+    nlp = spacy.load("en_core_web_sm", exclude=TRIMMED_EXCLUDE)
+    if "senter" in nlp.component_names:
+        # en_core_web_sm ships senter disabled because the parser normally sets sentences.
+        if "senter" in nlp.disabled:
+            nlp.enable_pipe("senter")
+    else:
+        nlp.add_pipe("sentencizer", first=True)
+    return nlp
+
+
+def _init_parse_worker(nlp_profile: str = "full", token_budget: TokenBudget | None = None):
+    """Give each parser process its own spaCy pipeline (and tokenizer, in token mode)."""
+    global nlp, _worker_token_budget
+    nlp = load_nlp(nlp_profile)
+    _worker_token_budget = token_budget
+
+
+def _preprocess_in_worker(file_path, chunk_size_chars: int, overlap_sents: int) -> tuple[list[str], dict]:
+    stats: dict = {}
+    chunks = list(
+        iter_file_chunks(file_path, chunk_size_chars, overlap_sents, token_budget=_worker_token_budget, stats=stats)
+    )
+    return chunks, stats
+
+
+def _failed_chunks(error: Exception):
+    """Chunks of a file that failed in a parse worker: raises its error once consumed, like iter_file_chunks."""
+    raise error
+    yield
+
+
+def parse_documents(
+    file_paths: list[str],
+    chunk_size_chars: int = 1800,
+    overlap_sents: int = 2,
+    workers: int = 1,
+    nlp_profile: str = "full",
+    token_budget: TokenBudget | None = None,
+    stats: dict | None = None,
+):
+    """Yield (file_path, chunks) for every file, in input order.
+
+    Serially, chunks is a lazy iterator over the file (see iter_file_chunks)
+    that must be consumed before the next file is requested. With workers > 1
+    files are parsed in a pool of processes, each with its own spaCy pipeline,
+    and chunks is the complete list for the file; at most 2 * workers files are
+    parsed ahead of the consumer. PDFs of PAGE_RANGE_MIN_PAGES
+    or more are instead split into page ranges across the same pool and
+    streamed like in the serial case. All paths produce identical chunks and
+    fail alike: a file that cannot be parsed gives chunks that raise its error
+    once consumed. Only wall time and memory profile change. Token-chunking
+    counters from every file are merged into stats.
+    """
+    page_ranged = set()
+    if workers > 1:
+        page_ranged = {
+            file_path
+            for file_path in file_paths
+            if file_path.lower().endswith(".pdf") and _pdf_page_count(file_path) >= PAGE_RANGE_MIN_PAGES
+        }
+
+    if workers <= 1 or (len(file_paths) <= 1 and not page_ranged):
+        for file_path in file_paths:
+            chunks = iter_file_chunks(
+                file_path, chunk_size_chars, overlap_sents, token_budget=token_budget, stats=stats
+            )
+            yield file_path, chunks
+        return
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers if page_ranged else min(workers, len(file_paths)),
+        initializer=_init_parse_worker,
+        initargs=(nlp_profile, token_budget),
+    )
+    # Like page ranges, at most 2 * workers files are submitted ahead of the
+    # consumer, so parsed chunks never pile up for the whole corpus.
+    max_in_flight = 2 * workers
+    pending: deque = deque()
+
+    def take_next():
+        file_path, future = pending.popleft()
+        if future is None:
+            chunks = iter_pdf_chunks(
+                file_path,
+                chunk_size_chars,
+                overlap_sents,
+                token_budget=token_budget,
+                stats=stats,
+                executor=executor,
+                max_in_flight=max_in_flight,
+            )
+            return file_path, chunks
+
+        try:
+            chunks, file_stats = future.result()
+        except Exception as e:
+            return file_path, _failed_chunks(e)
+        if stats is not None:
+            merge_chunking_stats(stats, file_stats)
+        return file_path, chunks
+
+    try:
+        for file_path in file_paths:
+            future = None
+            if file_path not in page_ranged:
+                future = executor.submit(_preprocess_in_worker, file_path, chunk_size_chars, overlap_sents)
+            pending.append((file_path, future))
+            if len(pending) >= max_in_flight:
+                yield take_next()
+        while pending:
+            yield take_next()
+    finally:
+        # Don't parse the rest of the corpus when the consumer stops early.
+        executor.shutdown(cancel_futures=True)
+
+
 def find_source_files(docs_dir: str) -> list[str]:
     """Return supported source files under docs_dir, recursively and deterministically."""
     source_files: list[str] = []
@@ -191,7 +643,355 @@ def find_source_files(docs_dir: str) -> list[str]:
     return source_files
 
 
-def index_documents(docs_dir, chunk_size_chars: int = 1800, overlap_sents: int = 2, embed_batch_size: int = 32):
+CHROMA_PATH = "./chroma_db"
+MANIFEST_FILENAME = "ingest_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_digest(file_path: str) -> str:
+    """Return the SHA-256 hex digest of a file's raw bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """Load the ingest manifest, returning an empty one if it is missing or unreadable.
+
+    The manifest maps each source file (relative to the docs dir) to the content
+    hash, chunking parameters and embedding model it was last indexed with.
+    """
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"version": MANIFEST_VERSION, "files": {}}
+
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "files": {}}
+    manifest.setdefault("files", {})
+    return manifest
+
+
+def save_manifest(manifest_path: str, manifest: dict) -> None:
+    """Atomically write the ingest manifest next to the vector database."""
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def record_embedding_profile(profile: EmbeddingProfile) -> None:
+    """Store profile in the collection metadata, refusing to mix models in one collection.
+
+    A collection that already holds chunks keeps the embedding model it was
+    indexed with; re-indexing with another model needs a fresh CHROMA_PATH.
+    """
+    stored = EmbeddingProfile.from_collection(collection)
+    if stored is not None and collection.count():
+        try:
+            stored.check(profile.model, profile.dimension, profile.normalized)
+        except EmbeddingMismatchError as e:
+            raise EmbeddingMismatchError(f"{e}. Delete {CHROMA_PATH} to re-index with {profile.model}.") from e
+    collection.modify(metadata={**(collection.metadata or {}), **profile.to_metadata()})
+
+
+def _remove_source_chunks(relative_path: str) -> None:
+    """Delete every chunk previously indexed for a source file."""
+    try:
+        collection.delete(where={"source": relative_path})
+    except Exception as e:
+        print(f"{Fore.RED}Error removing stale chunks for {relative_path}: {str(e)}")
+
+
+# Fallback used when the Chroma client cannot report its own write limit.
+DEFAULT_MAX_WRITE_BATCH = 5461
+
+
+def _max_write_batch_size() -> int:
+    """Return the largest number of records Chroma accepts in a single add()."""
+    try:
+        limit = chroma_client.get_max_batch_size()
+    except Exception:
+        return DEFAULT_MAX_WRITE_BATCH
+    return limit if isinstance(limit, int) and limit > 0 else DEFAULT_MAX_WRITE_BATCH
+
+
+def _encode_batch(batch: list[str], indices: list[int], file_path: str, batch_size: int) -> list[tuple]:
+    """Encode one batch; on failure retry chunk by chunk so only bad chunks are dropped."""
+    try:
+        embeddings = model.encode(batch, batch_size=batch_size, show_progress_bar=False)
+    except Exception:
+        # Fall back to one chunk at a time to isolate the failing chunk(s).
+        encoded = []
+        for idx, chunk in zip(indices, batch, strict=True):
+            try:
+                embedding = model.encode(chunk, batch_size=batch_size, show_progress_bar=False)
+            except Exception as e:
+                print(f"{Fore.RED}Error encoding chunk {idx} from {file_path}: {str(e)}")
+                continue
+            encoded.append((idx, chunk, embedding))
+        return encoded
+    return list(zip(indices, batch, embeddings, strict=True))
+
+
+def _encode_chunks(
+    chunks: list[str],
+    file_path: str,
+    embed_batch_size: int = 32,
+    offset: int = 0,
+    cache: EmbeddingCache | None = None,
+) -> list[tuple]:
+    """Encode chunks in batches of embed_batch_size.
+
+    A batch that fails to encode is retried chunk by chunk, so a single bad chunk
+    is reported and skipped without discarding the rest of its batch. With a
+    cache, only chunks it does not already hold are sent to the model.
+
+    Returns:
+        List of (chunk index, chunk, embedding) tuples for the chunks that encoded;
+        indices start at offset.
+    """
+    encoded: list[tuple] = []
+    batch_size = max(1, embed_batch_size)
+    for start in range(offset, offset + len(chunks), batch_size):
+        batch = chunks[start - offset : start - offset + batch_size]
+        indices = list(range(start, start + len(batch)))
+        if cache is None:
+            encoded.extend(_encode_batch(batch, indices, file_path, batch_size))
+            continue
+
+        cached = cache.get_many(batch)
+        misses = [i for i, embedding in enumerate(cached) if embedding is None]
+        fresh = {}
+        if misses:
+            fresh_encoded = _encode_batch(
+                [batch[i] for i in misses], [indices[i] for i in misses], file_path, batch_size
+            )
+            cache.put_many([chunk for _, chunk, _ in fresh_encoded], [embedding for _, _, embedding in fresh_encoded])
+            fresh = {idx: embedding for idx, _, embedding in fresh_encoded}
+        for idx, chunk, embedding in zip(indices, batch, cached, strict=True):
+            if embedding is None:
+                embedding = fresh.get(idx)
+            if embedding is not None:
+                encoded.append((idx, chunk, embedding))
+    return encoded
+
+
+def _write_chunks(records: list[tuple]) -> set[str]:
+    """Add buffered (file_path, idx, doc_id, chunk, embedding, metadata) records in one call.
+
+    When the bulk write fails the records are re-added one by one so the error is
+    reported against the exact chunk that caused it.
+
+    Returns:
+        Set of file paths that had at least one chunk fail to write.
+    """
+    try:
+        collection.add(
+            documents=[r[3] for r in records],
+            embeddings=[r[4] for r in records],
+            ids=[r[2] for r in records],
+            metadatas=[r[5] for r in records],
+        )
+    except Exception as e:
+        if len(records) == 1:
+            file_path, idx = records[0][:2]
+            print(f"{Fore.RED}Error adding chunk {idx} from {file_path}: {str(e)}")
+            return {file_path}
+        failed: set[str] = set()
+        for record in records:
+            failed |= _write_chunks([record])
+        return failed
+    return set()
+
+
+# Items each inter-stage queue holds before the upstream stage blocks.
+PIPELINE_QUEUE_SIZE = 4
+# Chunks the parse stage forwards per queue item, so huge files stream through
+# the pipeline instead of travelling as one list.
+PARSE_PIECE_CHUNKS = 64
+
+# Sentinel passed down the pipeline when a stage has no more items.
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    """Throughput counters for one ingest pipeline stage."""
+
+    name: str
+    items: int = 0
+    chunks: int = 0
+    busy_seconds: float = 0.0
+
+    def record(self, seconds: float, chunks: int = 0, items: int = 1) -> None:
+        self.busy_seconds += seconds
+        self.chunks += chunks
+        self.items += items
+
+    def summary(self) -> str:
+        rate = self.chunks / self.busy_seconds if self.busy_seconds else 0.0
+        return (
+            f"{self.name}: {self.items} items, {self.chunks} chunks, "
+            f"{self.busy_seconds:.2f}s busy ({rate:.1f} chunks/s)"
+        )
+
+
+def _pipeline_put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Block until item is queued (backpressure) or the pipeline is stopping."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _pipeline_get(q: queue.Queue, stop: threading.Event):
+    """Block until an item is available; returns _DONE once the pipeline is stopping."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _start_stage(target, outbox: queue.Queue, stop: threading.Event, errors: list, *args) -> threading.Thread:
+    """Run target(*args) in a thread that always signals _DONE downstream.
+
+    An exception in any stage stops the whole pipeline and is re-raised by
+    index_documents once the other stages have wound down.
+    """
+
+    def run():
+        try:
+            target(*args)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _pipeline_put(outbox, _DONE, stop)
+
+    thread = threading.Thread(target=run, name=f"ingest-{target.__name__}", daemon=True)
+    thread.start()
+    return thread
+
+
+def _parse_stage(parsed, outbox: queue.Queue, stats: StageStats, stop: threading.Event) -> None:
+    """Pull chunks from the parse generator and hand them to the embedder in pieces.
+
+    Emits ("chunks", file_path, offset, chunks) items of at most
+    PARSE_PIECE_CHUNKS chunks, then one ("file", file_path, chunk_count, ok) item
+    per file. ok is False when the file failed part way through.
+    """
+    parsed = iter(parsed)
+    try:
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                file_path, chunks = next(parsed)
+            except StopIteration:
+                return
+            stats.record(time.perf_counter() - started, items=0)
+
+            chunks = iter(chunks)
+            total, ok = 0, True
+            while True:
+                started = time.perf_counter()
+                piece = []
+                try:
+                    # Append one by one so chunks produced before a failure are kept.
+                    for chunk in islice(chunks, PARSE_PIECE_CHUNKS):
+                        piece.append(chunk)
+                except Exception as e:
+                    print(f"{Fore.RED}Error processing {file_path}: {str(e)}")
+                    ok = False
+                stats.record(time.perf_counter() - started, chunks=len(piece), items=0)
+                if piece:
+                    if not _pipeline_put(outbox, ("chunks", file_path, total, piece), stop):
+                        return
+                    total += len(piece)
+                if not ok or len(piece) < PARSE_PIECE_CHUNKS:
+                    break
+
+            stats.items += 1
+            if not _pipeline_put(outbox, ("file", file_path, total, ok), stop):
+                return
+    finally:
+        # Shut down the parser pool (if any) even when we stop early.
+        close = getattr(parsed, "close", None)
+        if close:
+            close()
+
+
+def _embed_stage(
+    inbox: queue.Queue,
+    outbox: queue.Queue,
+    embed_batch_size: int,
+    cache: EmbeddingCache | None,
+    stats: StageStats,
+    stop: threading.Event,
+) -> None:
+    """Encode incoming chunk pieces batch by batch, forwarding every batch as soon as it is ready.
+
+    Emits ("batch", file_path, encoded) items followed by one
+    ("file", file_path, chunk_count, encoded_count, ok) item per file.
+    """
+    batch_size = max(1, embed_batch_size)
+    encoded_count = 0
+    while (item := _pipeline_get(inbox, stop)) is not _DONE:
+        if item[0] == "file":
+            _, file_path, chunk_count, ok = item
+            stats.items += 1
+            if not _pipeline_put(outbox, ("file", file_path, chunk_count, encoded_count, ok), stop):
+                return
+            encoded_count = 0
+            continue
+
+        _, file_path, offset, chunks = item
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start : start + batch_size]
+            started = time.perf_counter()
+            encoded = _encode_chunks(batch, file_path, embed_batch_size, offset=offset + start, cache=cache)
+            stats.record(time.perf_counter() - started, chunks=len(encoded), items=0)
+            encoded_count += len(encoded)
+            if not _pipeline_put(outbox, ("batch", file_path, encoded), stop):
+                return
+
+
+def index_documents(
+    docs_dir,
+    chunk_size_chars: int = 1800,
+    overlap_sents: int = 2,
+    embed_batch_size: int = 32,
+    model_name: str | None = None,
+    manifest_path: str | None = None,
+    workers: int = 1,
+    nlp_profile: str = "full",
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    embedding_cache: EmbeddingCache | None = None,
+    token_budget: TokenBudget | None = None,
+):
+    """Chunk, embed and store every supported file under docs_dir.
+
+    With a manifest_path the run is incremental: files whose content hash,
+    chunking parameters and model match the manifest are skipped, changed files
+    have their previous chunks replaced, and chunks of files that no longer exist
+    are removed from the collection. Without one, every file is (re)indexed.
+
+    workers > 1 parses files in that many processes, each loading the spaCy
+    pipeline selected by nlp_profile (see parse_documents and load_nlp).
+
+    Parsing, embedding and Chroma writes run as concurrent stages connected by
+    queues of at most queue_size items, and per-stage throughput is printed at
+    the end of the run.
+    """
     # Create directory if it doesn't exist
     if not os.path.exists(docs_dir):
         print(f"{Fore.YELLOW}Creating directory {docs_dir}")
@@ -201,6 +1001,16 @@ def index_documents(docs_dir, chunk_size_chars: int = 1800, overlap_sents: int =
 
     # Check if directory contains supported files (PDF and Markdown), recursively.
     source_files = find_source_files(docs_dir)
+
+    manifest = load_manifest(manifest_path) if manifest_path else None
+    if manifest is not None:
+        current = {os.path.relpath(file_path, docs_dir) for file_path in source_files}
+        for relative_path in sorted(set(manifest["files"]) - current):
+            print(f"{Fore.CYAN}Removing chunks of deleted file {relative_path}")
+            _remove_source_chunks(relative_path)
+            del manifest["files"][relative_path]
+        save_manifest(manifest_path, manifest)
+
     if not source_files:
         print(
             f"{Fore.YELLOW}No PDF or Markdown files found in {docs_dir}. "
@@ -208,47 +1018,191 @@ def index_documents(docs_dir, chunk_size_chars: int = 1800, overlap_sents: int =
         )
         return
 
-    # Process each source file, dispatching by extension
+    settings = {
+        "chunk_size_chars": chunk_size_chars,
+        "overlap_sents": overlap_sents,
+        "model": model_name,
+        "nlp_profile": nlp_profile,
+        "max_tokens": token_budget.max_tokens if token_budget else None,
+    }
+
+    # Chunks from every file are buffered and written in bulk; the buffer is
+    # flushed whenever it reaches Chroma's max batch size and once at the end.
+    max_write_batch = _max_write_batch_size()
+    pending: list[tuple] = []
+    # Manifest entries of files whose chunks are all queued; they are committed
+    # once the flush carrying their last chunk succeeds.
+    ready: dict[str, dict] = {}
+    # Files with a chunk that failed to write in any flush; a file's chunks can
+    # span several flushes, so they are never committed to the manifest.
+    failed_files: set[str] = set()
+    skipped = 0
+
+    chunking_stats: dict = {}
+    parse_stats = StageStats("parse")
+    embed_stats = StageStats("embed")
+    write_stats = StageStats("write")
+
+    def flush():
+        nonlocal pending
+        started = time.perf_counter()
+        if pending:
+            failed_files.update(_write_chunks(pending))
+        write_stats.record(time.perf_counter() - started, chunks=len(pending), items=0)
+        pending = []
+        if manifest is None:
+            return
+        for file_path, entry in ready.items():
+            if file_path not in failed_files:
+                manifest["files"][relative_paths[file_path]] = entry
+        ready.clear()
+        save_manifest(manifest_path, manifest)
+
+    # Hash first so unchanged files never reach the (expensive) parse stage.
+    to_parse: list[str] = []
+    entries: dict[str, dict] = {}
     for file_path in source_files:
-        relative_path = os.path.relpath(file_path, docs_dir)
-        print(f"{Fore.CYAN}Processing {file_path}")
-        if file_path.lower().endswith(".md"):
-            chunks = preprocess_markdown(file_path, chunk_size_chars=chunk_size_chars, overlap_sents=overlap_sents)
-        else:
-            chunks = preprocess_pdf(file_path, chunk_size_chars=chunk_size_chars, overlap_sents=overlap_sents)
-
-        if not chunks:
-            print(f"{Fore.YELLOW}No valid chunks extracted from {file_path}")
-            continue
+        if manifest is not None:
+            relative_path = os.path.relpath(file_path, docs_dir)
+            entry = {"sha256": file_digest(file_path), **settings}
+            previous = manifest["files"].get(relative_path)
+            if previous and all(previous.get(key) == value for key, value in entry.items()):
+                skipped += 1
+                continue
+            entries[file_path] = entry
+        to_parse.append(file_path)
 
-        print(f"{Fore.CYAN}Adding {len(chunks)} chunks to the vector database")
-        for idx, chunk in enumerate(chunks):
-            try:
-                embedding = model.encode(chunk, batch_size=embed_batch_size, show_progress_bar=False)
-            except Exception as e:
-                print(f"{Fore.RED}Error encoding embeddings for {file_path}: {str(e)}")
+    parsed = parse_documents(
+        to_parse,
+        chunk_size_chars=chunk_size_chars,
+        overlap_sents=overlap_sents,
+        workers=workers,
+        nlp_profile=nlp_profile,
+        token_budget=token_budget,
+        stats=chunking_stats,
+    )
+
+    # Parsing, embedding and writing run concurrently, connected by bounded
+    # queues: a slow stage blocks the ones upstream of it instead of letting
+    # parsed chunks or embeddings pile up in memory.
+    stop = threading.Event()
+    errors: list[BaseException] = []
+    parsed_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    encoded_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    stages = [
+        _start_stage(_parse_stage, parsed_q, stop, errors, parsed, parsed_q, parse_stats, stop),
+        _start_stage(
+            _embed_stage,
+            encoded_q,
+            stop,
+            errors,
+            parsed_q,
+            encoded_q,
+            embed_batch_size,
+            embedding_cache,
+            embed_stats,
+            stop,
+        ),
+    ]
+
+    # The write stage runs on this thread so only one thread ever touches Chroma.
+    relative_paths: dict[str, str] = {}
+    try:
+        while (item := _pipeline_get(encoded_q, stop)) is not _DONE:
+            kind, file_path = item[:2]
+            relative_path = relative_paths.get(file_path)
+
+            if relative_path is None:
+                relative_path = relative_paths[file_path] = os.path.relpath(file_path, docs_dir)
+                print(f"{Fore.CYAN}Processing {file_path}")
+                if manifest is not None:
+                    # Replace, never append: drop whatever this file contributed last time.
+                    _remove_source_chunks(relative_path)
+                    manifest["files"].pop(relative_path, None)
+
+            if kind == "batch":
+                for idx, chunk, embedding in item[2]:
+                    doc_id = f"{relative_path}_{idx}"
+                    pending.append((file_path, idx, doc_id, chunk, embedding, {"source": relative_path}))
+                    if len(pending) >= max_write_batch:
+                        flush()
                 continue
 
-            try:
-                doc_id = f"{relative_path}_{idx}"
-                collection.add(
-                    documents=[chunk],
-                    embeddings=[embedding],
-                    ids=[doc_id],
-                    metadatas=[{"source": relative_path}],
-                )
-            except Exception as e:
-                print(f"{Fore.RED}Error adding chunk {idx} from {file_path}: {str(e)}")
+            chunk_count, encoded_count, ok = item[2:]
+            write_stats.items += 1
+            entry = entries.get(file_path)
+            if not chunk_count:
+                if ok:
+                    print(f"{Fore.YELLOW}No valid chunks extracted from {file_path}")
+                    # Recorded too, so an unchanged empty or image-only file is not parsed again. A file
+                    # that failed to parse is not ok (see _parse_stage) and is retried next run.
+                    if entry is not None:
+                        ready[file_path] = {**entry, "chunks": 0}
+                continue
+            print(f"{Fore.CYAN}Adding {chunk_count} chunks to the vector database")
+
+            # Files that failed part way, or with chunks that failed to encode,
+            # stay out of the manifest so the next run retries them.
+            if entry is not None and ok and encoded_count == chunk_count:
+                ready[file_path] = {**entry, "chunks": chunk_count}
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for stage in stages:
+            stage.join()
 
+        if embedding_cache is not None:
+            embedding_cache.flush()
+
+    if errors:
+        raise errors[0]
+
+    flush()
+
+    if skipped:
+        print(f"{Fore.CYAN}Skipped {skipped} unchanged files")
+    if embedding_cache is not None and to_parse:
+        print(f"{Fore.CYAN}{embedding_cache.summary()}")
+    if token_budget is not None and chunking_stats:
+        report_chunking_stats(chunking_stats, token_budget.max_tokens, chunk_size_chars)
+    if to_parse:
+        report_stage_stats([parse_stats, embed_stats, write_stats])
     print(f"{Fore.GREEN}{Style.BRIGHT}Indexing completed!")
 
 
+def report_chunking_stats(stats: dict, max_tokens: int, chunk_size_chars: int) -> None:
+    """Compare token-aware chunking with what the char-based scheme would have produced."""
+    print(
+        f"{Fore.CYAN}Token-aware chunking: {stats.get('chunks', 0)} chunks of up to {max_tokens} tokens "
+        f"({stats.get('over_budget', 0)} chunks over the token budget still truncated by the model)"
+    )
+    print(
+        f"{Fore.CYAN}Char-based chunking at {chunk_size_chars} chars would have produced "
+        f"{stats.get('char_chunks', 0)} chunks, {stats.get('char_over_budget', 0)} of them truncated by the model"
+    )
+
+
+def report_stage_stats(stats: list[StageStats]) -> None:
+    """Print per-stage throughput and name the stage that spent the most time working."""
+    for stage in stats:
+        print(f"{Fore.CYAN}  {stage.summary()}")
+    bottleneck = max(stats, key=lambda stage: stage.busy_seconds)
+    if bottleneck.busy_seconds:
+        print(f"{Fore.CYAN}  Bottleneck stage: {bottleneck.name}")
+
+
 def run_ingest(
     docs_dir="./sources/",
     model_name="all-MiniLM-L6-v2",
     chunk_size_chars: int = 1800,
     overlap_sents: int = 2,
     embed_batch_size: int = 32,
+    workers: int = 1,
+    nlp_profile: str = "full",
+    embedding_cache_dir: str | None = DEFAULT_CACHE_DIR,
+    embedding_cache_max_entries: int = DEFAULT_MAX_ENTRIES,
+    chunking: str = "chars",
 ):
     """
     Run the ingestion process to index PDF/Markdown documents.
@@ -256,31 +1210,57 @@ def run_ingest(
     Args:
         docs_dir (str): Directory containing .pdf/.md files to index
         model_name (str): Sentence transformer model to use
+        workers (int): Number of document parser processes; 0 uses one per CPU
+        nlp_profile (str): spaCy pipeline profile, "full" or "trimmed" (see load_nlp)
+        embedding_cache_dir (str, optional): Directory of the persistent embedding cache; None disables it
+        embedding_cache_max_entries (int): Embeddings kept before least recently used ones are evicted
+        chunking (str): "chars" packs chunks up to chunk_size_chars; "tokens" packs them up to the
+            embedding model's max_seq_length, measured with its own tokenizer
     """
     try:
         # Initialize spaCy
         global nlp
-        nlp = spacy.load("en_core_web_sm")
+        nlp = load_nlp(nlp_profile)
 
         # Initialize sentence transformer
         global model
         model = SentenceTransformer(model_name)
 
+        token_budget = TokenBudget.from_model(model) if chunking == "tokens" else None
+
+        embedding_cache = None
+        if embedding_cache_dir:
+            embedding_cache = EmbeddingCache(embedding_cache_dir, model_name, max_entries=embedding_cache_max_entries)
+
         # Initialize ChromaDB
         global chroma_client, collection
-        chroma_client = chromadb.PersistentClient(path="./chroma_db")
+        chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
         collection = chroma_client.get_or_create_collection("security_docs")
-
-        # Index documents
-        if chunk_size_chars == 1800 and overlap_sents == 2 and embed_batch_size == 32:
-            index_documents(docs_dir)
-        else:
-            index_documents(
-                docs_dir,
+        record_embedding_profile(
+            EmbeddingProfile.from_model(
+                model,
+                model_name,
+                chunking=chunking,
                 chunk_size_chars=chunk_size_chars,
                 overlap_sents=overlap_sents,
-                embed_batch_size=embed_batch_size,
+                max_tokens=token_budget.max_tokens if token_budget else None,
             )
+        )
+
+        # Index documents; the manifest lives with the database it describes, so
+        # wiping chroma_db also forces a full re-ingest.
+        index_documents(
+            docs_dir,
+            chunk_size_chars=chunk_size_chars,
+            overlap_sents=overlap_sents,
+            embed_batch_size=embed_batch_size,
+            model_name=model_name,
+            manifest_path=os.path.join(CHROMA_PATH, MANIFEST_FILENAME),
+            workers=workers or os.cpu_count() or 1,
+            nlp_profile=nlp_profile,
+            embedding_cache=embedding_cache,
+            token_budget=token_budget,
+        )
 
         return True
 
@@ -325,6 +1305,43 @@ def main():
         default=32,
         help="Batch size for embedding encoding (default: 32)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to parse documents; 0 uses one per CPU (default: 1)",
+    )
+    parser.add_argument(
+        "--nlp-profile",
+        choices=NLP_PROFILES,
+        default="full",
+        help="spaCy pipeline to load: 'full' en_core_web_sm, or 'trimmed' (senter + tagger only) for faster, "
+        "leaner parsing (default: full)",
+    )
+    parser.add_argument(
+        "--embedding-cache-dir",
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory of the persistent embedding cache (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--embedding-cache-max-entries",
+        type=int,
+        default=DEFAULT_MAX_ENTRIES,
+        help=f"Maximum cached embeddings before LRU eviction (default: {DEFAULT_MAX_ENTRIES})",
+    )
+    parser.add_argument(
+        "--no-embedding-cache",
+        action="store_true",
+        help="Always re-encode chunks instead of reusing cached embeddings",
+    )
+    parser.add_argument(
+        "--chunking",
+        choices=["chars", "tokens"],
+        default="chars",
+        help="Chunk size unit: 'chars' uses --chunk-size-chars; 'tokens' packs chunks up to the embedding "
+        "model's max sequence length (default: chars)",
+    )
     args = parser.parse_args()
 
     success = run_ingest(
@@ -333,6 +1350,11 @@ def main():
         chunk_size_chars=args.chunk_size_chars,
         overlap_sents=args.overlap_sents,
         embed_batch_size=args.embed_batch_size,
+        workers=args.workers,
+        nlp_profile=args.nlp_profile,
+        embedding_cache_dir=None if args.no_embedding_cache else args.embedding_cache_dir,
+        embedding_cache_max_entries=args.embedding_cache_max_entries,
+        chunking=args.chunking,
     )
     if not success:
         sys.exit(1)
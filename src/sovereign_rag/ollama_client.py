@@ -0,0 +1,326 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+
+class OllamaError(RuntimeError):
+    """Raised when the Ollama server cannot be reached or rejects a request.
+
+    status is the HTTP status of a rejected request, None for other errors.
+    """
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def rejected(self) -> bool:
+        """True when the request itself was refused (HTTP 4xx), so every endpoint would refuse it.
+
+        408 and 429 are the server being slow or busy, not the request's fault.
+        """
+        return self.status is not None and 400 <= self.status < 500 and self.status not in (408, 429)
+
+
+class StreamInterrupted(OllamaError):
+    """Raised by OllamaPool when a streamed answer breaks off after its first chunk.
+
+    The chunks already yielded cannot be taken back, so the pool does not retry
+    it; the caller may start the request over, away from endpoint (see avoiding).
+    """
+
+    def __init__(self, message: str, endpoint: str | None = None):
+        super().__init__(message)
+        self.endpoint = endpoint
+
+
+@dataclass
+class EvalTimings:
+    """Token counts and durations Ollama reports for a finished request."""
+
+    prompt_tokens: int = 0
+    prompt_seconds: float = 0.0
+    output_tokens: int = 0
+    output_seconds: float = 0.0
+    load_seconds: float = 0.0
+
+    @classmethod
+    def from_response(cls, raw) -> "EvalTimings | None":
+        """Read the *_count / *_duration (nanoseconds) fields of an Ollama response; None if absent."""
+        if not isinstance(raw, dict) or "prompt_eval_duration" not in raw and "eval_duration" not in raw:
+            return None
+        return cls(
+            prompt_tokens=raw.get("prompt_eval_count", 0),
+            prompt_seconds=raw.get("prompt_eval_duration", 0) / 1e9,
+            output_tokens=raw.get("eval_count", 0),
+            output_seconds=raw.get("eval_duration", 0) / 1e9,
+            load_seconds=raw.get("load_duration", 0) / 1e9,
+        )
+
+    def __add__(self, other: "EvalTimings") -> "EvalTimings":
+        return EvalTimings(
+            self.prompt_tokens + other.prompt_tokens,
+            self.prompt_seconds + other.prompt_seconds,
+            self.output_tokens + other.output_tokens,
+            self.output_seconds + other.output_seconds,
+            self.load_seconds + other.load_seconds,
+        )
+
+    def summary(self) -> str:
+        return (
+            f"prompt eval {self.prompt_tokens} tokens in {self.prompt_seconds:.2f}s, "
+            f"generation {self.output_tokens} tokens in {self.output_seconds:.2f}s, load {self.load_seconds:.2f}s"
+        )
+
+
+@dataclass
+class Completion:
+    """Result of one completion; text and delta mirror llama_index's CompletionResponse.
+
+    While streaming, text is the answer so far and delta the part added by this chunk.
+    """
+
+    text: str
+    raw: dict = field(default_factory=dict)
+    delta: str = ""
+
+
+class OllamaClient:
+    """Minimal blocking client for Ollama's /api/generate endpoint.
+
+    Uses only the standard library, so the query path does not need an LLM
+    framework just to send a prompt. One request per call and no shared state,
+    so a single client can be used from several threads.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        request_timeout: float = 300.0,
+        options: dict | None = None,
+        keep_alive: str | float | None = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.request_timeout = request_timeout
+        self.options = dict(options or {})
+        # How long Ollama keeps the model loaded after each request (e.g. "30m"); server default when None.
+        self.keep_alive = keep_alive
+
+    def _open(self, path: str, payload: dict):
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.request_timeout)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", errors="replace").strip()
+            raise OllamaError(f"Ollama returned HTTP {e.code} for {path}: {detail}", status=e.code) from e
+        except urllib.error.URLError as e:
+            raise OllamaError(f"Cannot reach Ollama at {self.base_url}: {e.reason}") from e
+
+    def _post(self, path: str, payload: dict) -> dict:
+        with self._open(path, payload) as response:
+            return json.load(response)
+
+    def _generate_payload(self, prompt: str, system: str | None, stream: bool) -> dict:
+        payload = {"model": self.model, "prompt": prompt, "stream": stream}
+        if system is not None:
+            payload["system"] = system
+        if self.options:
+            payload["options"] = self.options
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def complete(self, prompt: str, system: str | None = None) -> Completion:
+        """Generate a completion for prompt and return it once finished.
+
+        system replaces the model's system message. Keeping it identical across
+        requests lets Ollama reuse the already evaluated prompt prefix.
+        """
+        body = self._post("/api/generate", self._generate_payload(prompt, system, stream=False))
+        return Completion(text=body.get("response", ""), raw=body)
+
+    def stream_complete(self, prompt: str, system: str | None = None):
+        """Generate a completion for prompt, yielding a Completion per chunk Ollama sends.
+
+        request_timeout then bounds the wait for each chunk rather than for the
+        whole answer, so long analyses on slow hardware do not time out. The last
+        chunk's raw holds the token counts and durations of the request.
+        """
+        path = "/api/generate"
+        text = ""
+        with self._open(path, self._generate_payload(prompt, system, stream=True)) as response:
+            try:
+                for line in response:
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise OllamaError(f"Ollama failed during {path}: {chunk['error']}")
+                    delta = chunk.get("response", "")
+                    text += delta
+                    yield Completion(text=text, raw=chunk, delta=delta)
+            except TimeoutError as e:
+                raise OllamaError(f"Ollama sent nothing for {self.request_timeout}s during {path}") from e
+
+
+def _rejected(error: Exception) -> bool:
+    return isinstance(error, OllamaError) and error.rejected
+
+
+# Endpoint names the current thread's pool requests stay away from (see avoiding).
+_avoided = threading.local()
+
+
+@contextmanager
+def avoiding(names):
+    """Within this block, OllamaPool requests from the current thread go to other endpoints than names.
+
+    Used to start a broken-off answer over (see StreamInterrupted.endpoint). The
+    named endpoints are still used when no other healthy endpoint is left.
+    """
+    previous = getattr(_avoided, "names", frozenset())
+    _avoided.names = previous | {name for name in names if name is not None}
+    try:
+        yield
+    finally:
+        _avoided.names = previous
+
+
+def parse_endpoints(value) -> list[str]:
+    """Split a comma-separated string (or list) of Ollama URLs into a list, dropping blanks."""
+    items = value.split(",") if isinstance(value, str) else list(value)
+    return [item.strip() for item in items if item and item.strip()]
+
+
+@dataclass
+class Endpoint:
+    """One member of an OllamaPool and its request bookkeeping."""
+
+    name: str
+    client: object
+    outstanding: int = 0
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    unhealthy_until: float = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return self.unhealthy_until <= now
+
+
+class OllamaPool:
+    """Spreads requests over several Ollama endpoints serving the same model.
+
+    Each request goes to the healthy endpoint with the fewest outstanding
+    requests (the one with fewer recent failures, then the first listed, on a
+    tie). A request that fails is retried on the next endpoint until every
+    healthy one has been tried; a streamed answer is only retried when it
+    failed before its first chunk, and raises StreamInterrupted otherwise;
+    a caller starting it over can keep away from that endpoint (see avoiding). A
+    request the endpoint rejected as invalid (see OllamaError.rejected) would
+    be rejected by every endpoint, so it is neither retried nor counted against
+    the endpoint. After max_failures consecutive errors an endpoint is left out
+    for cooldown seconds, then gets another chance.
+    Members only need complete/stream_complete, like OllamaClient, so the
+    llama_index backend can be pooled too.
+    """
+
+    def __init__(self, clients, names=None, max_failures: int = 3, cooldown: float = 60.0):
+        names = names or [getattr(client, "base_url", f"endpoint {i + 1}") for i, client in enumerate(clients)]
+        self.endpoints = [Endpoint(name, client) for name, client in zip(names, clients, strict=True)]
+        self.max_failures = max(1, max_failures)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    def _acquire(self, tried) -> Endpoint | None:
+        with self._lock:
+            now = time.monotonic()
+            candidates = [e for e in self.endpoints if e.healthy(now) and e not in tried]
+            if not candidates:
+                return None
+            avoided = getattr(_avoided, "names", frozenset())
+            candidates = [e for e in candidates if e.name not in avoided] or candidates
+            endpoint = min(candidates, key=lambda e: (e.outstanding, e.consecutive_failures))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _release(self, endpoint: Endpoint, error: Exception | None) -> None:
+        with self._lock:
+            endpoint.outstanding -= 1
+            if error is None or _rejected(error):
+                # The endpoint answered; only the request was at fault.
+                endpoint.consecutive_failures = 0
+                return
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.max_failures:
+                endpoint.unhealthy_until = time.monotonic() + self.cooldown
+
+    def _exhausted(self, last_error: Exception | None) -> OllamaError:
+        if last_error is None:
+            return OllamaError("All Ollama endpoints are marked unhealthy after repeated errors")
+        return OllamaError(f"No Ollama endpoint could complete the request; last error: {last_error}")
+
+    def complete(self, prompt: str, system: str | None = None) -> Completion:
+        tried, last_error = [], None
+        while (endpoint := self._acquire(tried)) is not None:
+            tried.append(endpoint)
+            try:
+                completion = endpoint.client.complete(prompt, system=system)
+            except Exception as e:
+                self._release(endpoint, e)
+                if _rejected(e):
+                    raise
+                last_error = e
+                continue
+            self._release(endpoint, None)
+            return completion
+        raise self._exhausted(last_error) from last_error
+
+    def stream_complete(self, prompt: str, system: str | None = None):
+        tried, last_error = [], None
+        while (endpoint := self._acquire(tried)) is not None:
+            tried.append(endpoint)
+            started, error = False, None
+            try:
+                for chunk in endpoint.client.stream_complete(prompt, system=system):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                error = e
+                if started:
+                    raise StreamInterrupted(
+                        f"The answer from {endpoint.name} broke off: {e}", endpoint=endpoint.name
+                    ) from e
+                if _rejected(e):
+                    raise
+            finally:
+                self._release(endpoint, error)
+            if error is None:
+                return
+            last_error = error
+        raise self._exhausted(last_error) from last_error
+
+    def healthy_count(self) -> int:
+        now = time.monotonic()
+        return sum(endpoint.healthy(now) for endpoint in self.endpoints)
+
+    def summary(self) -> list[str]:
+        """One line per endpoint: requests, failures and health."""
+        now = time.monotonic()
+        return [
+            f"{e.name}: {e.requests} requests, {e.failures} failed, {'healthy' if e.healthy(now) else 'unhealthy'}"
+            for e in self.endpoints
+        ]
@@ -0,0 +1,125 @@
+import argparse
+import math
+from dataclasses import dataclass
+
+# Conservative characters-per-token ratio for source code and technical prose;
+# Ollama models do not expose their tokenizer, so prompts are estimated with it.
+CHARS_PER_TOKEN = 3.0
+# Tokens kept free in the context window for the model's answer.
+DEFAULT_OUTPUT_TOKENS = 1024
+# Reference context always left room for, so code never crowds it out entirely.
+MIN_CONTEXT_TOKENS = 256
+# A partially kept reference chunk must have at least this many tokens left.
+MIN_PARTIAL_CHUNK_TOKENS = 64
+# Context windows considered by --num-ctx auto, smallest first.
+NUM_CTX_SIZES = (2048, 4096, 8192, 16384, 32768)
+
+
+def parse_num_ctx(value):
+    """argparse type for --num-ctx: a positive integer or "auto"."""
+    if value == "auto":
+        return value
+    try:
+        num_ctx = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number of tokens or 'auto', got '{value}'") from None
+    if num_ctx <= 0:
+        raise argparse.ArgumentTypeError("must be positive")
+    return num_ctx
+
+
+def smallest_num_ctx(prompt_tokens: int, output_tokens: int = DEFAULT_OUTPUT_TOKENS) -> int:
+    """Return the smallest of NUM_CTX_SIZES that holds the prompt and the answer (the largest if none does)."""
+    needed = prompt_tokens + output_tokens
+    return next((size for size in NUM_CTX_SIZES if size >= needed), NUM_CTX_SIZES[-1])
+
+
+@dataclass
+class PromptUsage:
+    """Estimated tokens of one prompt, by part."""
+
+    instructions: int
+    code: int
+    context: int
+    dropped_chunks: int = 0
+    truncated_chunks: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.instructions + self.code + self.context
+
+    @property
+    def trimmed(self) -> bool:
+        return bool(self.dropped_chunks or self.truncated_chunks)
+
+
+class PromptBudget:
+    """Fits analysis prompts into an Ollama context window.
+
+    Room for output_tokens is always reserved. Code larger than the rest of the
+    window (less MIN_CONTEXT_TOKENS) has to be split before prompting (see
+    max_code_chars); reference context is then trimmed to whatever is left,
+    dropping the lowest-ranked chunks first. Without num_ctx nothing is trimmed
+    and prompts are only measured.
+    """
+
+    def __init__(
+        self,
+        num_ctx: int | None = None,
+        output_tokens: int = DEFAULT_OUTPUT_TOKENS,
+        chars_per_token: float = CHARS_PER_TOKEN,
+    ):
+        self.num_ctx = num_ctx
+        self.output_tokens = output_tokens
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+    @property
+    def prompt_tokens(self) -> int | None:
+        """Tokens available to the prompt, or None when the window is unknown."""
+        if self.num_ctx is None:
+            return None
+        return max(0, self.num_ctx - self.output_tokens)
+
+    def max_code_chars(self, instruction_tokens: int) -> int | None:
+        """Largest code size, in characters, that still leaves MIN_CONTEXT_TOKENS for context."""
+        if self.prompt_tokens is None:
+            return None
+        tokens = self.prompt_tokens - instruction_tokens - MIN_CONTEXT_TOKENS
+        return max(1, int(tokens * self.chars_per_token))
+
+    def fit(self, instructions: str, code: str, context_blocks: list[str], separator: str = "\n\n"):
+        """Trim context_blocks, kept in rank order, to the room code and instructions leave.
+
+        Returns:
+            tuple: (kept context blocks, the last possibly truncated, and the PromptUsage)
+        """
+        instruction_tokens = self.count(instructions)
+        code_tokens = self.count(code)
+        if self.prompt_tokens is None:
+            kept = list(context_blocks)
+            return kept, PromptUsage(instruction_tokens, code_tokens, self.count(separator.join(kept)))
+
+        room = self.prompt_tokens - instruction_tokens - code_tokens
+        kept, used, truncated = [], 0, 0
+        for block in context_blocks:
+            cost = self.count(block) + (self.count(separator) if kept else 0)
+            if used + cost <= room:
+                kept.append(block)
+                used += cost
+                continue
+            left = room - used - (self.count(separator) if kept else 0)
+            if left >= MIN_PARTIAL_CHUNK_TOKENS:
+                kept.append(block[: int(left * self.chars_per_token)])
+                truncated = 1
+            break
+        usage = PromptUsage(
+            instruction_tokens,
+            code_tokens,
+            self.count(separator.join(kept)),
+            dropped_chunks=len(context_blocks) - len(kept),
+            truncated_chunks=truncated,
+        )
+        return kept, usage
@@ -3,30 +3,127 @@ import datetime
 import os
 import subprocess
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 import chromadb
 from colorama import Fore, Style, init
-from llama_index.core import Settings, VectorStoreIndex
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.llms.ollama import Ollama
-from llama_index.vector_stores.chroma import ChromaVectorStore
+from sentence_transformers import SentenceTransformer
 
 # Try absolute import first, then relative import as fallback
 try:
-    from src.html_report import add_file_to_html, generate_html_footer, generate_html_header, generate_html_report
+    from src.html_report import (
+        ReportWriter,
+        add_file_to_html,
+        generate_html_footer,
+        generate_html_header,
+        generate_html_report,
+    )
 except ImportError:
     try:
         from .html_report import (
+            ReportWriter,
             add_file_to_html,
             generate_html_footer,  # noqa: F401 - re-exported for compatibility with existing imports/tests.
             generate_html_header,  # noqa: F401 - re-exported for compatibility with existing imports/tests.
-            generate_html_report,
+            generate_html_report,  # noqa: F401 - re-exported for compatibility with existing imports/tests.
         )
     except ImportError:
-        from .html_report import add_file_to_html, generate_html_report
+        from .html_report import ReportWriter, add_file_to_html
+
+from .analysis_cache import (
+    DEFAULT_CACHE_DIR as DEFAULT_ANALYSIS_CACHE_DIR,
+    DEFAULT_MAX_AGE_DAYS as DEFAULT_ANALYSIS_CACHE_MAX_AGE_DAYS,
+    DEFAULT_MAX_ENTRIES as DEFAULT_ANALYSIS_CACHE_MAX_ENTRIES,
+    AnalysisCache,
+    analysis_key,
+)
+from .code_segments import DEFAULT_SEGMENT_CHARS, changed_segments, segment_code
+from .diff_hunks import DEFAULT_HUNK_CONTEXT, parse_unified_diff
+from .embedding_profile import DEFAULT_EMBEDDING_MODEL, EmbeddingProfile, is_normalized
+from .file_packing import (
+    DEFAULT_PACK_TOKENS,
+    SMALL_FILE_LINES,
+    answer_format,
+    format_packed_code,
+    is_small,
+    pack_files,
+    split_packed_analysis,
+)
+from .ollama_client import (
+    Completion,
+    EvalTimings,
+    OllamaClient,
+    OllamaError,
+    OllamaPool,
+    StreamInterrupted,
+    avoiding,
+    parse_endpoints,
+)
+from .prompt_budget import NUM_CTX_SIZES, PromptBudget, parse_num_ctx, smallest_num_ctx
+from .run_checkpoints import RunCheckpoints
+from .triage import DEFAULT_TRIAGE_THRESHOLD, triage_files
 
 init(autoreset=True)
 
+# Bump whenever the analysis prompt changes, so cached analyses made with the
+# old prompt are no longer reused.
+PROMPT_TEMPLATE_VERSION = 1
+# Reference chunks retrieved per analyzed file.
+SIMILARITY_TOP_K = 3
+# Ollama request timeout in seconds.
+REQUEST_TIMEOUT = 300
+# How long Ollama keeps the model loaded between requests, so it stays resident for a whole run.
+DEFAULT_KEEP_ALIVE = "30m"
+# Prompt layouts accepted by run_query(). "system" sends the fixed instructions
+# as a stable system message ahead of the per-file context and code, so Ollama
+# can reuse their evaluated prefix from one request to the next; "inline" is the
+# original single prompt with the code first.
+PROMPT_LAYOUTS = ("system", "inline")
+# Retrieval/LLM stacks accepted by run_query(). "lean" queries Chroma with
+# SentenceTransformer (as ingest does) and calls Ollama directly; "llama_index"
+# keeps the original llama_index stack.
+QUERY_BACKENDS = ("lean", "llama_index")
+
+# Set by run_query(); anything with complete(prompt, system=None) -> object with .text and .raw,
+# and stream_complete(prompt, system=None) yielding such objects with a .delta.
+llm = None
+# Set by run_query() when a screening model is used (see screen_segment); same interface as llm.
+screen_llm = None
+
+# Bump whenever the screening prompt changes.
+SCREEN_PROMPT_VERSION = 1
+# Bump whenever the prompt of packed files (see build_pack_prompts) changes.
+PACK_PROMPT_VERSION = 1
+# Output tokens the screening model may spend on its one-word verdict.
+SCREEN_OUTPUT_TOKENS = 8
+
+SYSTEM_PROMPT = """You are a software security analyst. Use ALL the provided technical knowledge to analyze the code \
+in each request.
+
+Your objective is to:
+- Identify OWASP vulnerabilities.
+- Point out common vulnerabilities.
+- Suggest security improvements.
+
+For EVERY vulnerability you report, you MUST include:
+- A description of the problem.
+- A suggested fix.
+- The source: cite the exact source document name (from the [Source: ...] labels in the request) that the \
+information was drawn from. If no provided source supports the finding, write "Source: general security knowledge".
+
+If no vulnerabilities are found, explicitly state: "No vulnerabilities detected."
+
+IMPORTANT: always consider the OWASP Top 10 and web application security best practices."""
+
+
+SCREEN_SYSTEM_PROMPT = """You are a software security triage assistant. Decide whether the code in each request \
+could contain a security vulnerability that deserves a detailed review.
+
+Answer with exactly one word: SUSPICIOUS or CLEAN. When in doubt, answer SUSPICIOUS."""
+
 
 def create_output_directory():
     """
@@ -103,6 +200,14 @@ def find_git_root(path):
     return roots[0] if roots else None
 
 
+def _git_pathspec(path):
+    """Return the Git root of path and path relative to it."""
+    git_root = find_git_root(path)
+    if not git_root:
+        raise RuntimeError(f"Path '{path}' is not inside a Git repository, or Git is not available.")
+    return git_root, os.path.relpath(os.path.abspath(path), git_root)
+
+
 def find_changed_files(path, changed_base="HEAD", staged=False):
     """Return changed files under path as absolute paths.
 
@@ -110,15 +215,7 @@ def find_changed_files(path, changed_base="HEAD", staged=False):
     untracked files. staged=True is intended for pre-commit hooks and only
     considers files in the index.
     """
-    git_root = find_git_root(path)
-    if not git_root:
-        raise RuntimeError(f"Path '{path}' is not inside a Git repository, or Git is not available.")
-
-    path_abs = os.path.abspath(path)
-    pathspec = os.path.relpath(path_abs, git_root)
-    if pathspec == ".":
-        pathspec = "."
-
+    git_root, pathspec = _git_pathspec(path)
     if staged:
         changed = _run_git(["diff", "--cached", "--name-only", "--diff-filter=ACMR", "--", pathspec], git_root)
     else:
@@ -137,33 +234,49 @@ def find_changed_files(path, changed_base="HEAD", staged=False):
     return changed_abs
 
 
+def find_changed_hunks(path, changed_base="HEAD", staged=False):
+    """Return the changed line ranges of the files under path, keyed by absolute path.
+
+    Compares the same versions as find_changed_files (see parse_unified_diff).
+    Untracked files have no diff and are not in the result. With staged=True the
+    ranges are those of the index, which match the working tree unless a file
+    was changed again after staging it.
+    """
+    git_root, pathspec = _git_pathspec(path)
+    # Fixed prefixes and no quoting, whatever the user's diff configuration.
+    args = ["-c", "core.quotePath=false", "diff", "-U0", "--no-color", "--no-ext-diff", "--src-prefix=a/"]
+    args += ["--dst-prefix=b/", "--diff-filter=ACMR"]
+    args += ["--cached"] if staged else [changed_base]
+    hunks = parse_unified_diff(_run_git([*args, "--", pathspec], git_root))
+    return {os.path.abspath(os.path.join(git_root, file_path)): ranges for file_path, ranges in hunks.items()}
+
+
 def filter_to_changed_files(files_to_process, path, changed_base="HEAD", staged=False):
     """Keep only files that Git reports as changed."""
     changed_files = set(find_changed_files(path, changed_base=changed_base, staged=staged))
     return [file_path for file_path in files_to_process if os.path.abspath(file_path) in changed_files]
 
 
-def process_file(file_path, index, model_name, ollama_url, output_dir, html_content):
+@dataclass
+class RetrievedChunk:
+    """A reference chunk returned by a vector search.
+
+    Exposes the node_id / metadata / get_content() subset of llama_index's
+    NodeWithScore that process_file reads, so both can be passed as nodes.
     """
-    Process a single file for security analysis.
 
-    Args:
-        file_path (str): Path to the file to analyze
-        index: The vector index for retrieval
-        model_name (str): The name of the Ollama model to use
-        ollama_url (str): The URL of the Ollama API
-        output_dir (str): Directory to save the output
-        html_content (list): List to append HTML content to
+    node_id: str
+    text: str
+    metadata: dict
+    distance: float | None = None
 
-    Returns:
-        bool: True if processing was successful, False otherwise
-    """
-    try:
-        print(f"{Fore.WHITE}{Style.BRIGHT}File process started: {file_path}")
-        with open(file_path, encoding="utf-8", errors="replace") as f:
-            code = f.read()
+    def get_content(self) -> str:
+        return self.text
 
-        query = f"""
+
+def build_retrieval_query(code):
+    """Return the text embedded to retrieve reference context for code."""
+    return f"""
 You are a software security analyst. Use ALL the indexed knowledge to analyze the following code:
 
 {code}
@@ -178,23 +291,98 @@ If no vulnerabilities are found, explicitly state: "No vulnerabilities detected.
 IMPORTANT: always consider the OWASP Top 10 and web application security best practices.
 """
 
-        retriever = index.as_retriever(similarity_top_k=3)
-        nodes = retriever.retrieve(query)
 
-        # Build the context with an explicit source label per chunk so the model
-        # can cite where each piece of knowledge came from. The source filename is
-        # stored as chunk metadata at ingest time; fall back to "unknown source".
-        context_blocks = []
-        sources = []
-        for n in nodes:
-            source = n.metadata.get("source", "unknown source") if n.metadata else "unknown source"
-            if source not in sources:
-                sources.append(source)
-            context_blocks.append(f"[Source: {source}]\n{n.get_content()}")
-        context = "\n\n".join(context_blocks)
+def retrieve_for_segments(
+    file_paths,
+    collection,
+    embed_batch,
+    top_k=SIMILARITY_TOP_K,
+    max_segment_chars=0,
+    changed_lines=None,
+    hunk_context=DEFAULT_HUNK_CONTEXT,
+):
+    """
+    Split every file into segments and retrieve reference chunks for all of them
+    with one encode call and one Chroma search.
+
+    Args:
+        file_paths (list): Files to retrieve context for
+        collection: The Chroma collection populated by ingest
+        embed_batch (callable): Maps a list of texts to a list of embeddings
+        top_k (int): Chunks retrieved per segment
+        max_segment_chars (int): Files larger than this are split into function/class-sized
+            segments (see segment_code); 0 keeps every file whole
+        changed_lines (dict, optional): Changed line ranges by absolute path (see find_changed_hunks);
+            those files are cut down to the segments around their changes (see changed_segments),
+            padded with hunk_context lines. Files not in it are segmented as usual.
+
+    Returns:
+        list: Per file, in input order, a list of (CodeSegment, list of RetrievedChunk)
+        pairs; None for files that could not be read (process_file reports those).
+    """
+    file_segments = []
+    for file_path in file_paths:
+        try:
+            with open(file_path, encoding="utf-8", errors="replace") as f:
+                code = f.read()
+        except OSError:
+            file_segments.append(None)
+            continue
+        ranges = (changed_lines or {}).get(os.path.abspath(file_path))
+        if ranges is not None:
+            file_segments.append(changed_segments(code, file_path, ranges, max_segment_chars, hunk_context))
+        else:
+            file_segments.append(segment_code(code, file_path, max_segment_chars))
+
+    queries = [build_retrieval_query(segment.text) for segments in file_segments for segment in segments or []]
+    if not queries:
+        return [None] * len(file_paths)
+
+    result = collection.query(
+        query_embeddings=[list(map(float, e)) for e in embed_batch(queries)],
+        n_results=top_k,
+        include=["documents", "metadatas", "distances"],
+    )
+    chunk_lists = []
+    for i in range(len(queries)):
+        ids = result["ids"][i]
+        documents = result["documents"][i]
+        metadatas = (result.get("metadatas") or [None] * len(queries))[i] or [None] * len(ids)
+        distances = (result.get("distances") or [None] * len(queries))[i] or [None] * len(ids)
+        chunk_lists.append(
+            [
+                RetrievedChunk(node_id=chunk_id, text=document or "", metadata=metadata or {}, distance=distance)
+                for chunk_id, document, metadata, distance in zip(ids, documents, metadatas, distances, strict=True)
+            ]
+        )
+
+    retrieved, position = [], 0
+    for segments in file_segments:
+        if segments is None:
+            retrieved.append(None)
+            continue
+        retrieved.append(list(zip(segments, chunk_lists[position : position + len(segments)], strict=True)))
+        position += len(segments)
+    return retrieved
 
-        final_prompt = f"""
-        You are a software security analyst. Use ALL the indexed knowledge to analyze the following code:
+
+def retrieve_for_files(file_paths, collection, embed_batch, top_k=SIMILARITY_TOP_K):
+    """
+    Retrieve reference chunks for every whole file with one encode call and one Chroma search.
+
+    Returns:
+        list: One list of RetrievedChunk per file, in input order; None for files
+        that could not be read (process_file reports those).
+    """
+    retrieved = retrieve_for_segments(file_paths, collection, embed_batch, top_k=top_k)
+    return [pairs[0][1] if pairs else None for pairs in retrieved]
+
+
+def build_analysis_prompt(code, context, scope=None):
+    """Return the analysis prompt; scope names the part of a file that code is, when it is not the whole file."""
+    subject = f"the following code, {scope}" if scope else "the following code"
+    return f"""
+        You are a software security analyst. Use ALL the indexed knowledge to analyze {subject}:
 
         {code}
 
@@ -219,21 +407,854 @@ IMPORTANT: always consider the OWASP Top 10 and web application security best pr
         IMPORTANT: always consider the OWASP Top 10 and web application security best practices.
         """
 
-        response = Settings.llm.complete(final_prompt)
 
-        # Add the file analysis to the HTML content, including the retrieved sources
-        file_html = add_file_to_html(file_path, response.text, sources)
-        html_content.append(file_html)
+def build_request_prompt(code, context, scope=None):
+    """Return the per-request part of the "system" layout: reference context first, then the code."""
+    subject = f"Code to analyze, {scope}" if scope else "Code to analyze"
+    return f"""Here is the extracted technical knowledge to assist you. Each block is prefixed with its source \
+document in the form [Source: <document>]:
+{context}
 
-        print(f"{Fore.WHITE}{Style.BRIGHT}File process finished: {file_path}")
+{subject}:
+{code}
+"""
+
+
+def build_prompts(code, context, scope=None, layout="system"):
+    """Return (system message, prompt) for layout; the inline layout has no system message."""
+    if layout == "inline":
+        return None, build_analysis_prompt(code, context, scope)
+    return SYSTEM_PROMPT, build_request_prompt(code, context, scope)
+
+
+def _instructions(scope=None, layout="system"):
+    """The fixed text of a layout's prompts, i.e. everything but the code and context."""
+    system, prompt = build_prompts("", "", scope, layout)
+    return (system or "") + prompt
+
+
+def prepare_segment_prompt(file_path, segment, nodes, whole_file=True, budget=None, layout="system"):
+    """
+    Build the analysis prompt for one segment, trimming reference context to the budget.
+
+    Returns:
+        tuple: (system message or None, prompt, list of cited sources, ids of the chunks in the prompt,
+        PromptUsage)
+    """
+    # Build the context with an explicit source label per chunk so the model
+    # can cite where each piece of knowledge came from. The source filename is
+    # stored as chunk metadata at ingest time; fall back to "unknown source".
+    context_blocks, chunk_sources = [], []
+    for n in nodes:
+        source = n.metadata.get("source", "unknown source") if n.metadata else "unknown source"
+        chunk_sources.append(source)
+        context_blocks.append(f"[Source: {source}]\n{n.get_content()}")
+
+    scope = None if whole_file else f"{segment.label} of {file_path}"
+    budget = budget or PromptBudget()
+    kept, usage = budget.fit(_instructions(scope, layout), segment.text, context_blocks)
+    sources = list(dict.fromkeys(chunk_sources[: len(kept)]))
+    system, prompt = build_prompts(segment.text, "\n\n".join(kept), scope, layout)
+    return system, prompt, sources, [n.node_id for n in nodes[: len(kept)]], usage
+
+
+def build_pack_prompts(file_paths, codes, context, layout="system"):
+    """Return (system message or None, prompt) analyzing several small files in one request."""
+    code = format_packed_code(file_paths, codes)
+    scope = f"{len(file_paths)} small files"
+    system, prompt = build_prompts(code, context, scope, layout)
+    return system, f"{prompt}\n{answer_format(file_paths)}\n"
+
+
+def prepare_pack_prompt(file_paths, segments, budget=None, layout="system"):
+    """
+    Build the prompt of a pack of whole files, trimming the shared reference context to the budget.
+
+    The files' chunks are interleaved by rank, so trimming drops every file's
+    weakest chunks first; a chunk retrieved for several files is included once.
+
+    Returns:
+        tuple: (system message or None, prompt, cited sources per file, ids of the chunks in the prompt)
+    """
+    codes = [pairs[0][0].text for pairs in segments]
+    chunks, owners = {}, {}
+    for rank in range(max(len(pairs[0][1]) for pairs in segments)):
+        for position, pairs in enumerate(segments):
+            nodes = pairs[0][1]
+            if rank < len(nodes):
+                chunks.setdefault(nodes[rank].node_id, nodes[rank])
+                owners.setdefault(nodes[rank].node_id, set()).add(position)
+
+    context_blocks = []
+    for n in chunks.values():
+        source = n.metadata.get("source", "unknown source") if n.metadata else "unknown source"
+        context_blocks.append(f"[Source: {source}]\n{n.get_content()}")
+    system, prompt = build_pack_prompts(file_paths, [""] * len(codes), "", layout)
+    budget = budget or PromptBudget()
+    kept, _ = budget.fit((system or "") + prompt, format_packed_code(file_paths, codes), context_blocks)
+    kept_ids = list(chunks)[: len(kept)]
+    sources = [
+        list(
+            dict.fromkeys(
+                (chunks[i].metadata or {}).get("source", "unknown source") for i in kept_ids if position in owners[i]
+            )
+        )
+        for position in range(len(file_paths))
+    ]
+    system, prompt = build_pack_prompts(file_paths, codes, "\n\n".join(kept), layout)
+    return system, prompt, sources, kept_ids
+
+
+def complete(prompt, system=None, stream=False, client=None):
+    """Send prompt to client (the run's llm by default); when streaming, collect the chunks into one Completion."""
+    client = client or llm
+    kwargs = {} if system is None else {"system": system}
+    if not stream:
+        return client.complete(prompt, **kwargs)
+    deltas, last = [], None
+    for last in client.stream_complete(prompt, **kwargs):
+        deltas.append(last.delta)
+    return Completion(text="".join(deltas), raw=last.raw if last is not None else {})
+
+
+def build_screen_prompts(code, scope=None, layout="system"):
+    """Return (system message or None, prompt) asking the screening model for a SUSPICIOUS/CLEAN verdict."""
+    label = f" ({scope})" if scope else ""
+    request = f"Code{label}:\n{code}\n\nAnswer SUSPICIOUS or CLEAN."
+    if layout == "inline":
+        return None, f"{SCREEN_SYSTEM_PROMPT}\n\n{request}"
+    return SCREEN_SYSTEM_PROMPT, request
+
+
+def is_suspicious(verdict):
+    """Read a screening answer; anything but a clear CLEAN counts as suspicious."""
+    text = verdict.upper()
+    return "SUSPICIOUS" in text or "CLEAN" not in text
+
+
+def screen_segment(
+    file_path, segment, screen_model, num_ctx=None, cache=None, whole_file=True, layout="system", stream=False
+):
+    """
+    Ask the screening model whether a segment needs the full analysis.
+
+    The screening model only sees the code, without reference context, and
+    answers with a single word, so it costs a fraction of a full analysis.
+
+    Returns:
+        tuple: (True if the segment is suspicious, seconds the request took or None when cached)
+    """
+    scope = None if whole_file else f"{segment.label} of {file_path}"
+    system, prompt = build_screen_prompts(segment.text, scope, layout)
+
+    cache_key = None
+    if cache is not None:
+        keyed_code = segment.text if whole_file else f"{scope}\n{segment.text}"
+        prompt_version = f"screen-{layout}-{SCREEN_PROMPT_VERSION}"
+        cache_key = analysis_key(keyed_code, screen_model, num_ctx, prompt_version, [])
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return is_suspicious(cached["analysis"]), None
+
+    start = time.perf_counter()
+    response = complete(prompt, system, stream, client=screen_llm)
+    seconds = time.perf_counter() - start
+    if cache_key is not None:
+        cache.put(cache_key, response.text, [])
+    return is_suspicious(response.text), seconds
+
+
+def analyze_segment(
+    file_path,
+    segment,
+    nodes,
+    model_name,
+    num_ctx=None,
+    cache=None,
+    whole_file=True,
+    budget=None,
+    layout="system",
+    stream=False,
+):
+    """
+    Analyze one segment of a file with its retrieved reference chunks.
+
+    Returns:
+        tuple: (analysis text, list of cited sources, whether the analysis came from the cache,
+        EvalTimings reported by Ollama or None)
+    """
+    system, prompt, sources, chunk_ids, _ = prepare_segment_prompt(
+        file_path, segment, nodes, whole_file, budget, layout
+    )
+
+    cache_key = None
+    if cache is not None:
+        # A segment's prompt also names the segment, so that is part of its key.
+        keyed_code = segment.text if whole_file else f"{segment.label} of {file_path}\n{segment.text}"
+        prompt_version = PROMPT_TEMPLATE_VERSION if layout == "inline" else f"{layout}-{PROMPT_TEMPLATE_VERSION}"
+        cache_key = analysis_key(keyed_code, model_name, num_ctx, prompt_version, chunk_ids)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached["analysis"], cached["sources"], True, None
+
+    response = complete(prompt, system, stream)
+    if cache_key is not None:
+        cache.put(cache_key, response.text, sources)
+    return response.text, sources, False, EvalTimings.from_response(getattr(response, "raw", None))
+
+
+def plan_token_usage(file_paths, segments, budget, layout="system"):
+    """Return, per file, the PromptUsage of each of its prompts (None for unreadable files)."""
+    usage = []
+    for file_path, pairs in zip(file_paths, segments, strict=True):
+        if pairs is None:
+            usage.append(None)
+            continue
+        whole_file = len(pairs) == 1 and pairs[0][0].kind == "file"
+        usage.append(
+            [
+                prepare_segment_prompt(file_path, segment, nodes, whole_file, budget, layout)[4]
+                for segment, nodes in pairs
+            ]
+        )
+    return usage
+
+
+def plan_packs(file_paths, segments, budget, pack_tokens, layout="system"):
+    """
+    Return the packs (see pack_files) of small whole files whose code and reference context fit pack_tokens.
+
+    With a known context window a pack also leaves room for its instructions, so
+    its code is never trimmed; the shared context still is when needed.
+    """
+    limit = pack_tokens
+    if budget.prompt_tokens is not None:
+        system, prompt = build_pack_prompts([], [], "", layout)
+        limit = min(limit, budget.prompt_tokens - budget.count((system or "") + prompt))
+    file_tokens = []
+    for file_path, pairs in zip(file_paths, segments, strict=True):
+        if not pairs or len(pairs) != 1 or pairs[0][0].kind != "file" or not is_small(pairs[0][0].text):
+            file_tokens.append(None)
+            continue
+        segment, nodes = pairs[0]
+        # The file's label and its header in the answer format name it twice.
+        tokens = budget.count(segment.text) + 2 * budget.count(f"### File 00: {file_path}\n")
+        tokens += sum(budget.count(n.get_content()) for n in nodes)
+        file_tokens.append((file_path, tokens))
+    return pack_files(file_tokens, limit)
+
+
+def report_token_usage(file_paths, usage, num_ctx):
+    """Print each file's estimated prompt tokens and whether its context had to be trimmed."""
+    window = f" of {num_ctx}" if num_ctx else ""
+    print(f"{Fore.CYAN}Estimated prompt tokens per file (context window{window or ': model default'}):")
+    for file_path, prompts in zip(file_paths, usage, strict=True):
+        if not prompts:
+            continue
+        largest = max(prompts, key=lambda u: u.total)
+        trimmed = sum(u.dropped_chunks for u in prompts), sum(u.truncated_chunks for u in prompts)
+        line = (
+            f"  {file_path}: {len(prompts)} prompt(s), largest ~{largest.total}{window} tokens "
+            f"(code {largest.code}, context {largest.context}, instructions {largest.instructions})"
+        )
+        if any(trimmed):
+            line += f"; context trimmed ({trimmed[0]} chunks dropped, {trimmed[1]} truncated)"
+        print(f"{Fore.CYAN}{line}")
+
+
+def process_file(
+    file_path,
+    index,
+    model_name,
+    ollama_url,
+    output_dir,
+    html_content,
+    num_ctx=None,
+    cache=None,
+    nodes=None,
+    segments=None,
+    max_segment_chars=0,
+    budget=None,
+    layout="system",
+    timings=None,
+    stream=False,
+    results=None,
+    screen_model=None,
+    latencies=None,
+):
+    """
+    Process a single file for security analysis.
+
+    Args:
+        file_path (str): Path to the file to analyze
+        index: The vector index for retrieval
+        model_name (str): The name of the Ollama model to use
+        ollama_url (str): The URL of the Ollama API
+        output_dir (str): Directory to save the output
+        html_content (list): List to append HTML content to; may be None when results is given
+        num_ctx (int, optional): Ollama context window, part of the cache key
+        cache (AnalysisCache, optional): Reuse the stored analysis when the file,
+            model, prompt and retrieved chunks are all unchanged
+        nodes (list, optional): Reference chunks already retrieved for the whole file
+            (see retrieve_for_files); retrieved through index when None. Without an index,
+            every segment of a split file shares them.
+        segments (list, optional): (CodeSegment, reference chunks) pairs already
+            retrieved for this file (see retrieve_for_segments); each segment gets its
+            own prompt and the analyses are merged into one report entry
+        max_segment_chars (int): When segments is None, files larger than this are
+            split into segments retrieved through index; 0 keeps the file whole
+        budget (PromptBudget, optional): Trims each prompt's reference context to fit num_ctx
+        layout (str): Prompt layout, "system" or "inline" (see PROMPT_LAYOUTS)
+        timings (list, optional): When given, the file's Ollama prompt-eval and generation
+            timings are printed and appended to it as (file_path, EvalTimings)
+        stream (bool): Stream completions from Ollama instead of waiting for whole answers
+        results (list, optional): When given, (file_path, analysis, sources, tier) is appended
+            to it, for a ReportWriter
+        screen_model (str, optional): Screening model of a cascade (see screen_segment); only
+            segments it flags as suspicious are analyzed by model_name. The file's tier is then
+            "screen" when every segment was cleared by it, else "full"; None without a cascade.
+        latencies (dict, optional): When given, the seconds of every uncached request are appended
+            to its "screen" and "full" lists
+
+    Returns:
+        bool: True if processing was successful, False otherwise (including when index,
+        segments and nodes are all None); raises StreamInterrupted when an answer broke off
+        midway, so the caller can start the file over
+    """
+    try:
+        print(f"{Fore.WHITE}{Style.BRIGHT}File process started: {file_path}")
+        if segments is None and nodes is None and index is None:
+            # The lean backend has no index to retrieve through (see _init_lean_backend).
+            raise ValueError(
+                "no reference chunks: without an index, pass segments or nodes "
+                "retrieved from the collection (see retrieve_for_segments)"
+            )
+        if segments is None:
+            with open(file_path, encoding="utf-8", errors="replace") as f:
+                code = f.read()
+
+            units = segment_code(code, file_path, max_segment_chars)
+            if nodes is not None and (len(units) == 1 or index is None):
+                segments = [(unit, nodes) for unit in units]
+            else:
+                retriever = index.as_retriever(similarity_top_k=SIMILARITY_TOP_K)
+                segments = [(unit, retriever.retrieve(build_retrieval_query(unit.text))) for unit in units]
+
+        # A single hunk-scoped segment (see changed_segments) still names the part of the file it is.
+        whole_file = len(segments) == 1 and segments[0][0].kind == "file"
+        analyses, sources, all_cached, file_timings = [], [], True, None
+        tier = "screen" if screen_model else None
+        for segment, segment_nodes in segments:
+            if screen_model:
+                suspicious, seconds = screen_segment(
+                    file_path, segment, screen_model, num_ctx, cache, whole_file, layout, stream
+                )
+                if seconds is not None and latencies is not None:
+                    latencies["screen"].append(seconds)
+                all_cached = all_cached and seconds is None
+                if not suspicious:
+                    verdict = f"No vulnerabilities detected. (Screened as clean by {screen_model}.)"
+                    analyses.append(verdict if whole_file else f"[{segment.label}]\n{verdict}")
+                    continue
+                tier = "full"
+
+            start = time.perf_counter()
+            analysis, segment_sources, cached, segment_timings = analyze_segment(
+                file_path,
+                segment,
+                segment_nodes,
+                model_name,
+                num_ctx=num_ctx,
+                cache=cache,
+                whole_file=whole_file,
+                budget=budget,
+                layout=layout,
+                stream=stream,
+            )
+            if not cached and latencies is not None:
+                latencies["full"].append(time.perf_counter() - start)
+            if segment_timings is not None:
+                file_timings = segment_timings if file_timings is None else file_timings + segment_timings
+            analyses.append(analysis if whole_file else f"[{segment.label}]\n{analysis}")
+            sources.extend(source for source in segment_sources if source not in sources)
+            all_cached = all_cached and cached
+
+        # Add the file analysis to the HTML content, including the retrieved sources
+        analysis = "\n\n".join(analyses)
+        if html_content is not None:
+            html_content.append(add_file_to_html(file_path, analysis, sources, tier))
+        if results is not None:
+            results.append((file_path, analysis, sources, tier))
+
+        if all_cached:
+            print(f"{Fore.WHITE}{Style.BRIGHT}File process finished (cached): {file_path}")
+        else:
+            print(f"{Fore.WHITE}{Style.BRIGHT}File process finished: {file_path}")
+        if timings is not None and file_timings is not None:
+            print(f"{Fore.CYAN}Timings for {file_path}: {file_timings.summary()}")
+            timings.append((file_path, file_timings))
 
         return True
 
+    except StreamInterrupted:
+        raise
     except Exception as e:
         print(f"{Fore.RED}{Style.BRIGHT}Error processing {file_path}: {str(e)}")
         return False
 
 
+def process_pack(
+    file_paths,
+    segments,
+    model_name,
+    num_ctx=None,
+    cache=None,
+    budget=None,
+    layout="system",
+    timings=None,
+    stream=False,
+):
+    """
+    Analyze several small whole files with one request and split the answer back per file.
+
+    Args:
+        file_paths (list): The files of the pack (see pack_files)
+        segments (list): Per file, its single (whole-file CodeSegment, reference chunks) pair
+        timings (list, optional): When given, the request's Ollama timings are appended to it
+            as ("N packed files (first, ...)", EvalTimings)
+
+    Other arguments are those of process_file.
+
+    Returns:
+        list: (file_path, analysis, sources, None) per file, for a ReportWriter, or None when
+        the answer could not be split into one section per file
+    """
+    directory = os.path.dirname(file_paths[0]) or "."
+    print(f"{Fore.WHITE}{Style.BRIGHT}Packed analysis started: {len(file_paths)} files in {directory}")
+    system, prompt, sources, chunk_ids = prepare_pack_prompt(file_paths, segments, budget, layout)
+
+    cache_key = None
+    if cache is not None:
+        keyed_code = "\n".join(
+            f"{file_path}\n{pairs[0][0].text}" for file_path, pairs in zip(file_paths, segments, strict=True)
+        )
+        cache_key = analysis_key(keyed_code, model_name, num_ctx, f"pack-{layout}-{PACK_PROMPT_VERSION}", chunk_ids)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            analyses = split_packed_analysis(cached["analysis"], len(file_paths))
+            if analyses is not None:
+                print(f"{Fore.WHITE}{Style.BRIGHT}Packed analysis finished (cached): {len(file_paths)} files")
+                return list(zip(file_paths, analyses, sources, [None] * len(file_paths), strict=True))
+
+    response = complete(prompt, system, stream)
+    analyses = split_packed_analysis(response.text, len(file_paths))
+    if analyses is None:
+        return None
+    if cache_key is not None:
+        cache.put(cache_key, response.text, sorted({source for file_sources in sources for source in file_sources}))
+
+    print(f"{Fore.WHITE}{Style.BRIGHT}Packed analysis finished: {len(file_paths)} files")
+    pack_timings = EvalTimings.from_response(getattr(response, "raw", None))
+    if timings is not None and pack_timings is not None:
+        label = f"{len(file_paths)} packed files ({file_paths[0]}, ...)"
+        print(f"{Fore.CYAN}Timings for {label}: {pack_timings.summary()}")
+        timings.append((label, pack_timings))
+    return list(zip(file_paths, analyses, sources, [None] * len(file_paths), strict=True))
+
+
+def analyze_files(
+    files_to_process,
+    index,
+    model_name,
+    ollama_url,
+    output_dir,
+    concurrency=1,
+    num_ctx=None,
+    cache=None,
+    retrieved=None,
+    segments=None,
+    max_segment_chars=0,
+    budget=None,
+    layout="system",
+    timings=None,
+    stream=False,
+    report=None,
+    checkpoints=None,
+    screen_model=None,
+    latencies=None,
+    retries=0,
+    packs=None,
+):
+    """
+    Run process_file over every file, up to concurrency files at a time.
+
+    Each file renders into its own slot, so the report keeps the input order no
+    matter which analysis finishes first, and a failing file never affects the
+    others. retrieved optionally holds each file's pre-fetched reference chunks
+    (see retrieve_for_files), segments each file's pre-fetched segments and their
+    chunks (see retrieve_for_segments).
+
+    With a report (ReportWriter), each file is written to it as soon as every file
+    before it has finished, and its slot is released; nothing is kept in memory.
+    checkpoints (RunCheckpoints, used with a report) records every analyzed file
+    as soon as it finishes; files it already holds as completed are written to
+    the report from their records instead of being analyzed again. A file whose
+    answer broke off midway (StreamInterrupted) is analyzed again up to retries
+    times, away from the endpoints it broke off on. Other failures are
+    not retried: the pool has already tried every endpoint, or the request was
+    rejected and would fail again.
+
+    packs (see pack_files) lists positions of small files analyzed together by
+    one process_pack request, which needs segments; when its answer cannot be
+    split per file, or the request fails, they are analyzed one by one.
+
+    Returns:
+        tuple: (html_content in input order for the files that succeeded, empty with a report,
+        list of failed file paths)
+    """
+    slots = [[] for _ in files_to_process]
+    finished = [False] * len(files_to_process)
+    next_position = 0
+    report_lock = threading.Lock()
+
+    def write_finished(position):
+        nonlocal next_position
+        with report_lock:
+            finished[position] = True
+            while next_position < len(slots) and finished[next_position]:
+                for result in slots[next_position]:
+                    report.add(*result)
+                slots[next_position] = []
+                next_position += 1
+
+    def analyze(position):
+        file_path = files_to_process[position]
+        try:
+            completed = checkpoints.completed.get(file_path) if checkpoints else None
+            if completed is not None:
+                slots[position].append((file_path, completed["analysis"], completed["sources"], completed.get("tier")))
+                return True
+            broken_endpoints = []
+            for attempt in range(retries + 1):
+                if attempt:
+                    print(f"{Fore.YELLOW}Retrying {file_path} ({attempt} of {retries})...")
+                try:
+                    with avoiding(broken_endpoints):
+                        ok = process_file(
+                            file_path,
+                            index,
+                            model_name,
+                            ollama_url,
+                            output_dir,
+                            None if report else slots[position],
+                            num_ctx=num_ctx,
+                            cache=cache,
+                            nodes=retrieved[position] if retrieved else None,
+                            segments=segments[position] if segments else None,
+                            max_segment_chars=max_segment_chars,
+                            budget=budget,
+                            layout=layout,
+                            timings=timings,
+                            stream=stream,
+                            results=slots[position] if report else None,
+                            screen_model=screen_model,
+                            latencies=latencies,
+                        )
+                except StreamInterrupted as e:
+                    print(f"{Fore.RED}{Style.BRIGHT}Error processing {file_path}: {str(e)}")
+                    broken_endpoints.append(e.endpoint)
+                    ok = False
+                    continue
+                break
+            if ok and checkpoints is not None:
+                for result in slots[position]:
+                    checkpoints.record(*result)
+            return ok
+        except Exception as e:
+            print(f"{Fore.RED}{Style.BRIGHT}Error processing {file_path}: {str(e)}")
+            return False
+        finally:
+            if report is not None:
+                write_finished(position)
+
+    def analyze_pack(positions):
+        packed_files = [files_to_process[position] for position in positions]
+        try:
+            results = process_pack(
+                packed_files,
+                [segments[position] for position in positions],
+                model_name,
+                num_ctx=num_ctx,
+                cache=cache,
+                budget=budget,
+                layout=layout,
+                timings=timings,
+                stream=stream,
+            )
+        except Exception as e:
+            print(f"{Fore.RED}{Style.BRIGHT}Error processing packed files {', '.join(packed_files)}: {str(e)}")
+            results = None
+        if results is None:
+            print(f"{Fore.YELLOW}Analyzing the {len(packed_files)} packed files one by one instead...")
+            return [analyze(position) for position in positions]
+        for position, result in zip(positions, results, strict=True):
+            slots[position].append(result if report else add_file_to_html(*result))
+            if checkpoints is not None:
+                checkpoints.record(*result)
+            if report is not None:
+                write_finished(position)
+        return [True] * len(positions)
+
+    # Every pack is one unit of work, placed at its first file; other files are units of their own.
+    pack_of = {position: pack for pack in packs or [] for position in pack}
+    units = [
+        pack_of.get(position, [position])
+        for position in range(len(files_to_process))
+        if pack_of.get(position, [position])[0] == position
+    ]
+
+    def analyze_unit(unit):
+        return analyze_pack(unit) if len(unit) > 1 else [analyze(unit[0])]
+
+    if concurrency <= 1 or len(units) <= 1:
+        unit_outcomes = [analyze_unit(unit) for unit in units]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(units))) as executor:
+            unit_outcomes = list(executor.map(analyze_unit, units))
+    outcome_of = {
+        position: ok
+        for unit, oks in zip(units, unit_outcomes, strict=True)
+        for position, ok in zip(unit, oks, strict=True)
+    }
+    outcomes = [outcome_of[position] for position in range(len(files_to_process))]
+
+    html_content = [html for slot in slots for html in slot]
+    failed = [file_path for file_path, ok in zip(files_to_process, outcomes, strict=True) if not ok]
+    return html_content, failed
+
+
+def load_embedding_profile(collection):
+    """Return the EmbeddingProfile ingest recorded on collection.
+
+    Collections indexed before profiles were recorded fall back to
+    DEFAULT_EMBEDDING_MODEL with a warning; their vectors cannot be checked.
+    """
+    profile = EmbeddingProfile.from_collection(collection)
+    if profile is None:
+        print(
+            f"{Fore.YELLOW}The collection does not record its embedding model; assuming {DEFAULT_EMBEDDING_MODEL}. "
+            "Re-run ingest to record it."
+        )
+    else:
+        print(f"{Fore.WHITE}{Style.BRIGHT}Using embedding model {profile.model} recorded at ingest...")
+    return profile
+
+
+def _init_lean_backend(collection, profile=None):
+    """Embed with SentenceTransformer, the engine ingest uses; retrieval queries Chroma directly."""
+    embedding_model = profile.model if profile else DEFAULT_EMBEDDING_MODEL
+    embed_model = SentenceTransformer(embedding_model)
+    if profile:
+        profile.check(embedding_model, embed_model.get_sentence_embedding_dimension(), is_normalized(embed_model))
+
+    def embed_batch(texts):
+        return embed_model.encode(texts, batch_size=32, show_progress_bar=False)
+
+    return embed_batch, None
+
+
+def _init_llama_index_backend(collection, profile=None):
+    """The llama_index stack: HuggingFace embeddings and a VectorStoreIndex over collection.
+
+    Imported lazily so the default backend never pays for loading llama_index.
+    """
+    from llama_index.core import Settings, VectorStoreIndex
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    from llama_index.vector_stores.chroma import ChromaVectorStore
+
+    if profile:
+        Settings.embed_model = HuggingFaceEmbedding(model_name=profile.model, normalize=profile.normalized)
+        dimension = len(Settings.embed_model.get_text_embedding("dimension probe"))
+        profile.check(profile.model, dimension, profile.normalized)
+    else:
+        Settings.embed_model = HuggingFaceEmbedding(model_name=DEFAULT_EMBEDDING_MODEL)
+
+    print(f"{Fore.WHITE}{Style.BRIGHT}Initializing vector store...")
+    vector_store = ChromaVectorStore(chroma_collection=collection)
+    index = VectorStoreIndex(
+        [],
+        vector_store=vector_store,
+    )
+
+    def embed_batch(texts):
+        return Settings.embed_model.get_text_embedding_batch(texts, show_progress=False)
+
+    return embed_batch, index
+
+
+def _http_status(error):
+    """HTTP status of an error from llama_index's Ollama client (ollama.ResponseError, httpx.HTTPStatusError)."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) and status > 0 else None
+
+
+class _LlamaIndexLLM:
+    """Gives llama_index's Ollama LLM the complete(prompt, system=None) interface of OllamaClient.
+
+    HTTP errors are raised as OllamaError with their status, so an OllamaPool
+    tells a rejected request from a failing endpoint on this backend too.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    @staticmethod
+    def _error(error):
+        status = _http_status(error)
+        if status is None:
+            return None
+        return OllamaError(f"Ollama returned HTTP {status}: {error}", status=status)
+
+    @staticmethod
+    def _messages(prompt, system):
+        from llama_index.core.llms import ChatMessage
+
+        return [ChatMessage(role="system", content=system), ChatMessage(role="user", content=prompt)]
+
+    def complete(self, prompt, system=None):
+        try:
+            if system is None:
+                return self.llm.complete(prompt)
+            response = self.llm.chat(self._messages(prompt, system))
+        except Exception as e:
+            error = self._error(e)
+            if error is None:
+                raise
+            raise error from e
+        return Completion(text=response.message.content or "", raw=response.raw or {})
+
+    def stream_complete(self, prompt, system=None):
+        try:
+            if system is None:
+                for response in self.llm.stream_complete(prompt):
+                    yield Completion(text=response.text, raw=response.raw or {}, delta=response.delta or "")
+                return
+            for response in self.llm.stream_chat(self._messages(prompt, system)):
+                yield Completion(
+                    text=response.message.content or "", raw=response.raw or {}, delta=response.delta or ""
+                )
+        except Exception as e:
+            error = self._error(e)
+            if error is None:
+                raise
+            raise error from e
+
+
+def create_llm(backend, model_name, ollama_url, num_ctx, keep_alive=DEFAULT_KEEP_ALIVE, max_output_tokens=None):
+    """Return the backend's Ollama LLM: OllamaClient for "lean", llama_index's Ollama otherwise.
+
+    max_output_tokens caps each answer (Ollama's num_predict). With several
+    comma-separated URLs in ollama_url, one LLM is created per endpoint and
+    they are load-balanced by an OllamaPool.
+    """
+    endpoints = parse_endpoints(ollama_url)
+    if len(endpoints) > 1:
+        clients = [
+            create_llm(backend, model_name, url, num_ctx, keep_alive=keep_alive, max_output_tokens=max_output_tokens)
+            for url in endpoints
+        ]
+        return OllamaPool(clients, names=endpoints)
+    ollama_url = endpoints[0] if endpoints else ollama_url
+    options = {}
+    if num_ctx:
+        options["num_ctx"] = num_ctx
+    if max_output_tokens:
+        options["num_predict"] = max_output_tokens
+    if backend == "llama_index":
+        from llama_index.core import Settings
+        from llama_index.llms.ollama import Ollama
+
+        llm_kwargs = {"additional_kwargs": options} if options else {}
+        ollama = Ollama(
+            model=model_name, base_url=ollama_url, request_timeout=REQUEST_TIMEOUT, keep_alive=keep_alive, **llm_kwargs
+        )
+        if max_output_tokens:
+            # A screening model; Settings.llm stays the analysis model.
+            return _LlamaIndexLLM(ollama)
+        Settings.llm = ollama
+        return _LlamaIndexLLM(Settings.llm)
+    return OllamaClient(
+        ollama_url,
+        model_name,
+        request_timeout=REQUEST_TIMEOUT,
+        options=options or None,
+        keep_alive=keep_alive,
+    )
+
+
+def report_timings(timings):
+    """Print totals of the per-file Ollama timings and compare the first request with the rest.
+
+    A first request that pays for the shared prompt prefix, followed by much faster
+    prompt evaluation, shows that Ollama is reusing the cached prefix.
+    """
+    if not timings:
+        return
+    total = timings[0][1]
+    for _, file_timings in timings[1:]:
+        total = total + file_timings
+    print(f"{Fore.CYAN}Timings for {len(timings)} files: {total.summary()}")
+    if len(timings) > 1:
+        rest = (total.prompt_seconds - timings[0][1].prompt_seconds) / (len(timings) - 1)
+        print(
+            f"{Fore.CYAN}Prompt eval: {timings[0][1].prompt_seconds:.2f}s for the first file, "
+            f"{rest:.2f}s per file after it"
+        )
+
+
+def latency_stats(seconds):
+    """Return the request count and mean, p50, p95 and max of a list of request latencies in seconds."""
+    ordered = sorted(seconds)
+    if not ordered:
+        return {"requests": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    return {
+        "requests": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": percentile(50),
+        "p95": percentile(95),
+        "max": ordered[-1],
+    }
+
+
+def report_cascade(summary):
+    """Print how many files each cascade tier settled and the per-tier request latencies."""
+    files = summary["files"]
+    print(
+        f"{Fore.CYAN}Model cascade: {files.get('screen', 0)} files cleared by {summary['screen_model']}, "
+        f"{files.get('full', 0)} analyzed by {summary['model']}"
+    )
+    for tier, stats in summary["latency"].items():
+        print(
+            f"{Fore.CYAN}  {tier}: {stats['requests']} requests, mean {stats['mean']:.2f}s, "
+            f"p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s, max {stats['max']:.2f}s"
+        )
+
+
+def _max_code_chars(num_ctx, layout="system"):
+    """Largest code segment whose prompt fits num_ctx ("auto" allows the largest NUM_CTX_SIZES window)."""
+    if num_ctx is None:
+        return None
+    budget = PromptBudget(NUM_CTX_SIZES[-1] if num_ctx == "auto" else num_ctx)
+    # Segment prompts also name the segment and its file; leave room for a long label.
+    return budget.max_code_chars(budget.count(_instructions(" " * 200, layout)))
+
+
 def run_query(
     path,
     extension=None,
@@ -243,6 +1264,22 @@ def run_query(
     changed_only=False,
     changed_base="HEAD",
     staged=False,
+    concurrency=1,
+    backend="lean",
+    max_segment_chars=DEFAULT_SEGMENT_CHARS,
+    prompt_layout="system",
+    keep_alive=DEFAULT_KEEP_ALIVE,
+    measure_timings=False,
+    stream=True,
+    resume_dir=None,
+    triage_threshold=DEFAULT_TRIAGE_THRESHOLD,
+    screen_model=None,
+    pack_tokens=DEFAULT_PACK_TOKENS,
+    hunks=False,
+    hunk_context=DEFAULT_HUNK_CONTEXT,
+    analysis_cache_dir=DEFAULT_ANALYSIS_CACHE_DIR,
+    analysis_cache_max_entries=DEFAULT_ANALYSIS_CACHE_MAX_ENTRIES,
+    analysis_cache_max_age_days=DEFAULT_ANALYSIS_CACHE_MAX_AGE_DAYS,
 ):
     """
     Run security analysis on files.
@@ -251,12 +1288,46 @@ def run_query(
         path (str): Path to a file or directory to analyze
         extension (str, optional): File extension to filter by when path is a directory
         model_name (str): The name of the Ollama model to use
-        ollama_url (str): The URL of the Ollama API
-        num_ctx (int, optional): Ollama context window size. Smaller values reduce KV-cache
-            VRAM usage so the model fits on the GPU; None uses the model's default.
+        ollama_url (str): The URL of the Ollama API, or several comma-separated URLs (or a list) of
+            servers with the same models, between which files are load-balanced
+        num_ctx (int or str, optional): Ollama context window size. Smaller values reduce KV-cache
+            VRAM usage so the model fits on the GPU; None uses the model's default, and "auto" the
+            smallest of NUM_CTX_SIZES that fits the largest prompt of the run. Prompts are split and
+            their reference context trimmed to fit a set window.
         changed_only (bool): Only analyze files changed in Git.
         changed_base (str): Git ref used as the base for changed_only when staged=False.
         staged (bool): Only analyze staged files; useful for pre-commit hooks.
+        concurrency (int): Files analyzed at the same time. Match it to the Ollama server's
+            OLLAMA_NUM_PARALLEL (summed over the servers of a pool); extra requests only queue on the server.
+        backend (str): "lean" (SentenceTransformer + direct Chroma and Ollama calls) or
+            "llama_index" (the llama_index Ollama/HuggingFace/ChromaVectorStore stack)
+        max_segment_chars (int): Files larger than this many characters are split into
+            function/class-sized segments, each retrieved and analyzed on its own; 0 analyzes whole files
+        prompt_layout (str): "system" sends the fixed instructions as a stable system message first so
+            Ollama can reuse their cached prefix across files; "inline" keeps the original prompt
+        keep_alive (str, optional): How long Ollama keeps the model loaded after each request
+        measure_timings (bool): Print Ollama's prompt-eval and generation timings per file and for the run
+        stream (bool): Stream completions from Ollama, so the request timeout applies between chunks
+            rather than to a whole answer
+        resume_dir (str, optional): Output directory of an interrupted run to continue instead of
+            creating a new one. Files it recorded as analyzed, with unchanged content, are not analyzed
+            again, and the report is rebuilt from its checkpoints.
+        triage_threshold (int): Files whose static triage score (see triage_code) is below this are not
+            analyzed and are only listed in the report's triage section; 0 analyzes every file. A path
+            naming a single file is never triaged.
+        screen_model (str, optional): Small, fast Ollama model that first classifies each file (or
+            segment) as clean or suspicious from its code alone; only suspicious ones are analyzed by
+            model_name with retrieved context. Report entries record the tier of their verdict.
+        pack_tokens (int): Analyze small files (see SMALL_FILE_LINES) of the same directory together,
+            in prompts of up to this many tokens of code and context, and split the answer back per file;
+            files whose answer cannot be split are analyzed one by one. 0 gives every file its own prompt.
+        hunks (bool): With changed_only or staged, analyze only the code around each changed hunk,
+            widened to its enclosing function or class (see changed_segments), instead of whole files.
+            Report entries name the lines of each part and the changed lines in it.
+        hunk_context (int): Unchanged lines around each hunk that also widen it, like git diff -U<n>
+        analysis_cache_dir (str, optional): Directory of the persistent analysis cache; None disables it
+        analysis_cache_max_entries (int): Cached analyses kept before least recently used ones are evicted
+        analysis_cache_max_age_days (float): Cached analyses unused for longer than this are evicted
 
     Returns:
         bool: True if processing was successful, False otherwise
@@ -265,10 +1336,29 @@ def run_query(
         print(f"{Fore.RED}{Style.BRIGHT}Error: Path '{path}' not found.")
         return False
 
+    if backend not in QUERY_BACKENDS:
+        expected = ", ".join(QUERY_BACKENDS)
+        print(f"{Fore.RED}{Style.BRIGHT}Error: Unknown backend '{backend}'. Expected one of: {expected}")
+        return False
+
+    if prompt_layout not in PROMPT_LAYOUTS:
+        expected = ", ".join(PROMPT_LAYOUTS)
+        print(f"{Fore.RED}{Style.BRIGHT}Error: Unknown prompt layout '{prompt_layout}'. Expected one of: {expected}")
+        return False
+
+    if hunks and not (changed_only or staged):
+        print(f"{Fore.RED}{Style.BRIGHT}Error: Hunk-scoped analysis needs --changed-only or --staged.")
+        return False
+
+    if resume_dir and not os.path.isdir(resume_dir):
+        print(f"{Fore.RED}{Style.BRIGHT}Error: Run directory '{resume_dir}' to resume not found.")
+        return False
+
     try:
         # Determine files to process
         files_to_process = []
-        if os.path.isfile(path):
+        single_file = os.path.isfile(path)
+        if single_file:
             files_to_process = [path]
         elif os.path.isdir(path):
             if extension:
@@ -296,49 +1386,191 @@ def run_query(
             if not files_to_process:
                 print(f"{Fore.YELLOW}No {changed_label} files matched the requested path/extension.")
                 return True
+        changed_lines = find_changed_hunks(path, changed_base=changed_base, staged=staged) if hunks else None
 
         print(f"{Fore.WHITE}{Style.BRIGHT}Found {len(files_to_process)} files to process.")
 
-        # Create output directory with datetime subdirectory
-        output_dir = create_output_directory()
-
-        print(f"{Fore.WHITE}{Style.BRIGHT}Using Ollama model {model_name} at {ollama_url}...")
-        llm_kwargs = {"additional_kwargs": {"num_ctx": num_ctx}} if num_ctx else {}
-        Settings.llm = Ollama(model=model_name, base_url=ollama_url, request_timeout=300, **llm_kwargs)
-        Settings.embed_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        # Skip files without security-relevant surface before any retrieval or LLM call.
+        # A file named by path was asked for explicitly and is always analyzed.
+        triage_results, triage_seconds = None, 0.0
+        if triage_threshold > 0 and not single_file:
+            start = time.perf_counter()
+            triage_results = triage_files(files_to_process)
+            triage_seconds = time.perf_counter() - start
+            skipped = [r.file_path for r in triage_results if r.skipped(triage_threshold)]
+            skipped_set = set(skipped)
+            files_to_process = [file_path for file_path in files_to_process if file_path not in skipped_set]
+            print(
+                f"{Fore.CYAN}Triage skipped {len(skipped)} of {len(triage_results)} files with a score below "
+                f"{triage_threshold} in {triage_seconds:.2f}s; {len(files_to_process)} files left to analyze."
+            )
+            for file_path in skipped:
+                print(f"{Fore.CYAN}  skipped: {file_path}")
+
+        # Create output directory with datetime subdirectory, or continue an interrupted run
+        output_dir = resume_dir or create_output_directory()
+        checkpoints = RunCheckpoints(output_dir)
+        pending = files_to_process
+        if resume_dir:
+            completed = checkpoints.resume(files_to_process)
+            pending = [file_path for file_path in files_to_process if file_path not in checkpoints.completed]
+            print(
+                f"{Fore.WHITE}{Style.BRIGHT}Resuming {output_dir}: {len(completed)} of {len(files_to_process)} "
+                "files already analyzed."
+            )
 
         print(f"{Fore.WHITE}{Style.BRIGHT}Initializing ChromaDB...")
         chroma_client = chromadb.PersistentClient(path="./chroma_db")
         collection = chroma_client.get_collection("security_docs")
+        profile = load_embedding_profile(collection)
 
-        print(f"{Fore.WHITE}{Style.BRIGHT}Initializing vector store...")
-        vector_store = ChromaVectorStore(chroma_collection=collection)
-
-        index = VectorStoreIndex(
-            [],
-            vector_store=vector_store,
-        )
-
-        # Initialize HTML content
-        html_content = []
-
-        # Process each file
-        success = True
-        for file_path in files_to_process:
-            file_success = process_file(file_path, index, model_name, ollama_url, output_dir, html_content)
-            success = success and file_success
+        init_backend = _init_llama_index_backend if backend == "llama_index" else _init_lean_backend
+        embed_batch, index = init_backend(collection, profile)
 
-        # Generate and save the HTML report
-        if success and html_content:
-            report_title = f"SovereignRag - Security Analysis Report - {os.path.basename(path)}"
-            html_report = generate_html_report(report_title, html_content)
+        cache = None
+        if analysis_cache_dir:
+            cache = AnalysisCache(
+                analysis_cache_dir,
+                max_entries=analysis_cache_max_entries,
+                max_age_days=analysis_cache_max_age_days,
+            )
 
-            # Save the HTML report
-            report_path = os.path.join(output_dir, "report.html")
-            with open(report_path, "w") as f:
-                f.write(html_report)
+        # Retrieve reference context for every file in one batch up front
+        print(f"{Fore.WHITE}{Style.BRIGHT}Retrieving reference context for {len(pending)} files...")
+        # Code that cannot fit the context window next to the instructions is split
+        # into segments even when segmentation is otherwise off.
+        code_limit = _max_code_chars(num_ctx, prompt_layout)
+        if code_limit:
+            max_segment_chars = min(max_segment_chars, code_limit) if max_segment_chars else code_limit
+        segments = retrieve_for_segments(
+            pending,
+            collection,
+            embed_batch,
+            max_segment_chars=max_segment_chars,
+            changed_lines=changed_lines,
+            hunk_context=hunk_context,
+        )
+        segment_count = sum(len(pairs) for pairs in segments if pairs)
+        if changed_lines is not None:
+            scoped = [segment for pairs in segments if pairs for segment, _ in pairs]
+            scoped_lines = sum(segment.end_line - segment.start_line + 1 for segment in scoped)
+            print(
+                f"{Fore.WHITE}{Style.BRIGHT}Analyzing {segment_count} segments ({scoped_lines} lines) around the "
+                f"changed hunks of {len(pending)} files..."
+            )
+        elif segment_count > len(pending):
+            print(f"{Fore.WHITE}{Style.BRIGHT}Analyzing {segment_count} segments of large files separately...")
+
+        # Size the context window to the prompts, then trim their context to it
+        usage = plan_token_usage(pending, segments, PromptBudget(), prompt_layout)
+        largest = max((u.total for prompts in usage if prompts for u in prompts), default=0)
+        if num_ctx == "auto":
+            num_ctx = smallest_num_ctx(largest)
+            print(f"{Fore.CYAN}Largest prompt is ~{largest} tokens; using num_ctx {num_ctx}.")
+        elif num_ctx is None:
+            print(
+                f"{Fore.CYAN}Largest prompt is ~{largest} tokens; --num-ctx {smallest_num_ctx(largest)} "
+                "would fit every prompt (--num-ctx auto picks it)."
+            )
+        budget = PromptBudget(num_ctx)
+        if num_ctx is not None:
+            usage = plan_token_usage(pending, segments, budget, prompt_layout)
+        report_token_usage(pending, usage, num_ctx)
+        # Files completed by an earlier run have nothing retrieved; their checkpoints are reused.
+        pending_segments = dict(zip(pending, segments, strict=True))
+        segments = [pending_segments.get(file_path) for file_path in files_to_process]
+        packs = []
+        if pack_tokens > 0 and screen_model:
+            print(f"{Fore.YELLOW}Files are not packed with a screening model; each file gets its own prompt.")
+        elif pack_tokens > 0:
+            packs = plan_packs(files_to_process, segments, budget, pack_tokens, prompt_layout)
+            print(
+                f"{Fore.CYAN}Packed {sum(len(pack) for pack in packs)} small files into {len(packs)} prompts "
+                f"of up to {pack_tokens} tokens"
+            )
 
-            print(f"{Fore.GREEN}{Style.BRIGHT}Report saved to: {report_path}")
+        endpoints = parse_endpoints(ollama_url)
+        endpoint_list = ", ".join(endpoints)
+        print(f"{Fore.WHITE}{Style.BRIGHT}Using Ollama model {model_name} at {endpoint_list} ({backend} backend)...")
+        if len(endpoints) > 1 and concurrency < len(endpoints):
+            print(
+                f"{Fore.YELLOW}Only {concurrency} file(s) analyzed at a time; use --concurrency {len(endpoints)} "
+                f"or more to keep all {len(endpoints)} Ollama endpoints busy."
+            )
+        global llm, screen_llm
+        llm = create_llm(backend, model_name, endpoints, num_ctx, keep_alive=keep_alive)
+        screen_llm = None
+        latencies = None
+        if screen_model:
+            print(f"{Fore.WHITE}{Style.BRIGHT}Screening files with {screen_model} first...")
+            screen_llm = create_llm(
+                backend,
+                screen_model,
+                endpoints,
+                num_ctx,
+                keep_alive=keep_alive,
+                max_output_tokens=SCREEN_OUTPUT_TOKENS,
+            )
+            latencies = {"screen": [], "full": []}
+
+        # Process the files, concurrency at a time, writing each one to the report as it finishes
+        timings = [] if measure_timings else None
+        if concurrency > 1:
+            print(f"{Fore.WHITE}{Style.BRIGHT}Analyzing up to {concurrency} files concurrently...")
+        report_title = f"SovereignRag - Security Analysis Report - {os.path.basename(path)}"
+        with checkpoints, ReportWriter(output_dir, report_title) as report:
+            print(f"{Fore.WHITE}{Style.BRIGHT}Writing report to: {report.html_path}")
+            if triage_results is not None:
+                report.add_triage(triage_results, triage_threshold, triage_seconds)
+            _, failed = analyze_files(
+                files_to_process,
+                index,
+                model_name,
+                ollama_url,
+                output_dir,
+                concurrency=concurrency,
+                num_ctx=num_ctx,
+                cache=cache,
+                segments=segments,
+                max_segment_chars=max_segment_chars,
+                budget=budget,
+                layout=prompt_layout,
+                timings=timings,
+                stream=stream,
+                report=report,
+                checkpoints=checkpoints,
+                screen_model=screen_model,
+                latencies=latencies,
+                # An answer that broke off midway gets another try on each of the other endpoints of a pool.
+                retries=len(endpoints) - 1,
+                packs=packs,
+            )
+            if screen_model:
+                cascade = {
+                    "screen_model": screen_model,
+                    "model": model_name,
+                    "files": dict(report.tiers),
+                    "latency": {tier: latency_stats(seconds) for tier, seconds in latencies.items()},
+                }
+                report.add_cascade(cascade)
+                report_cascade(cascade)
+        report_timings(timings)
+        if isinstance(llm, OllamaPool):
+            print(f"{Fore.CYAN}Ollama endpoints:")
+            for line in llm.summary():
+                print(f"{Fore.CYAN}  {line}")
+        if cache is not None:
+            cache.prune()
+            print(f"{Fore.CYAN}{cache.summary()}")
+        success = not failed
+        if failed:
+            print(f"{Fore.RED}{Style.BRIGHT}{len(failed)} of {len(files_to_process)} files failed:")
+            for file_path in failed:
+                print(f"{Fore.RED}  {file_path}")
+
+        # Files that failed are left out of the report
+        if report.count:
+            print(f"{Fore.GREEN}{Style.BRIGHT}Report saved to: {report.html_path} ({report.jsonl_path})")
 
         return success
 
@@ -376,15 +1608,17 @@ def main():
         "--ollama-url",
         type=str,
         default="http://localhost:11434",
-        help="Ollama API URL",
+        help="Ollama API URL; several comma-separated URLs of servers with the same models are load-balanced, "
+        "and files that fail on one are retried on another",
     )
     parser.add_argument(
         "--num-ctx",
-        type=int,
+        type=parse_num_ctx,
         default=None,
         help=(
-            "Ollama context window size (e.g. 4096, 8192). Lower values use less VRAM so the model fits on "
-            "the GPU; omit to use the model default."
+            "Ollama context window size (e.g. 4096, 8192), or 'auto' for the smallest window that fits the "
+            "largest prompt. Lower values use less VRAM so the model fits on the GPU; prompts are split and "
+            "their context trimmed to fit. Omit to use the model default."
         ),
     )
     parser.add_argument(
@@ -402,6 +1636,113 @@ def main():
         action="store_true",
         help="Only analyze staged files. Intended for pre-commit hooks.",
     )
+    parser.add_argument(
+        "--hunks",
+        action="store_true",
+        help="With --changed-only or --staged, analyze only the changed hunks, widened to their enclosing "
+        "function or class, instead of whole files",
+    )
+    parser.add_argument(
+        "--hunk-context",
+        type=int,
+        default=DEFAULT_HUNK_CONTEXT,
+        help="Unchanged lines around each hunk that also widen it, like git diff -U<n> "
+        f"(default: {DEFAULT_HUNK_CONTEXT})",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of files analyzed at the same time; match the server's OLLAMA_NUM_PARALLEL (default: 1)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=QUERY_BACKENDS,
+        default="lean",
+        help="Retrieval/LLM stack: 'lean' queries Chroma with SentenceTransformer and calls Ollama directly; "
+        "'llama_index' uses the llama_index stack (default: lean)",
+    )
+    parser.add_argument(
+        "--max-segment-chars",
+        type=int,
+        default=DEFAULT_SEGMENT_CHARS,
+        help="Split files larger than this many characters into function/class-sized segments that are "
+        f"retrieved and analyzed separately; 0 analyzes whole files (default: {DEFAULT_SEGMENT_CHARS})",
+    )
+    parser.add_argument(
+        "--prompt-layout",
+        choices=PROMPT_LAYOUTS,
+        default="system",
+        help="'system' sends the fixed instructions first as a stable system message so Ollama reuses their "
+        "cached prefix across files; 'inline' is the original single prompt (default: system)",
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=str,
+        default=DEFAULT_KEEP_ALIVE,
+        help=f"How long Ollama keeps the model loaded between requests (default: {DEFAULT_KEEP_ALIVE})",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Report Ollama prompt-eval and generation time per file, e.g. to confirm prompt prefix reuse",
+    )
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="Wait for each whole answer instead of streaming it; the request timeout then covers the whole answer",
+    )
+    parser.add_argument(
+        "--screen-model",
+        type=str,
+        help="Small, fast Ollama model that first classifies each file as clean or suspicious; only "
+        "suspicious files are analyzed by --model (default: off)",
+    )
+    parser.add_argument(
+        "--pack-tokens",
+        type=int,
+        default=DEFAULT_PACK_TOKENS,
+        help=f"Analyze files of up to {SMALL_FILE_LINES} lines from the same directory together, in prompts of up "
+        "to this many tokens of code and context; 0 gives every file its own prompt (default: 0)",
+    )
+    parser.add_argument(
+        "--triage-threshold",
+        type=int,
+        default=DEFAULT_TRIAGE_THRESHOLD,
+        help="Skip files whose static triage score (I/O, subprocess, SQL, memory, XML, crypto, deserialization, "
+        "HTTP, redirect... signals) is below this; 0 analyzes every file, as does a --path naming a single file "
+        f"(default: {DEFAULT_TRIAGE_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        metavar="RUN_DIR",
+        help="Continue an interrupted run in its output directory (e.g. output/2024-01-01_12-00-00): files it "
+        "already analyzed are skipped and the report is rebuilt from its checkpoints",
+    )
+    parser.add_argument(
+        "--analysis-cache-dir",
+        type=str,
+        default=DEFAULT_ANALYSIS_CACHE_DIR,
+        help=f"Directory of the persistent analysis cache (default: {DEFAULT_ANALYSIS_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--analysis-cache-max-entries",
+        type=int,
+        default=DEFAULT_ANALYSIS_CACHE_MAX_ENTRIES,
+        help=f"Maximum cached analyses before LRU eviction (default: {DEFAULT_ANALYSIS_CACHE_MAX_ENTRIES})",
+    )
+    parser.add_argument(
+        "--analysis-cache-max-age-days",
+        type=float,
+        default=DEFAULT_ANALYSIS_CACHE_MAX_AGE_DAYS,
+        help=f"Evict cached analyses unused for this many days (default: {DEFAULT_ANALYSIS_CACHE_MAX_AGE_DAYS})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always run the LLM instead of reusing cached analyses",
+    )
     args = parser.parse_args()
 
     # If path is a directory, extension is required
@@ -417,6 +1758,22 @@ def main():
         changed_only=args.changed_only,
         changed_base=args.changed_base,
         staged=args.staged,
+        concurrency=args.concurrency,
+        backend=args.backend,
+        max_segment_chars=args.max_segment_chars,
+        prompt_layout=args.prompt_layout,
+        keep_alive=args.keep_alive,
+        measure_timings=args.timings,
+        stream=not args.no_stream,
+        resume_dir=args.resume,
+        triage_threshold=args.triage_threshold,
+        screen_model=args.screen_model,
+        pack_tokens=args.pack_tokens,
+        hunks=args.hunks,
+        hunk_context=args.hunk_context,
+        analysis_cache_dir=None if args.no_cache else args.analysis_cache_dir,
+        analysis_cache_max_entries=args.analysis_cache_max_entries,
+        analysis_cache_max_age_days=args.analysis_cache_max_age_days,
     )
     if not success:
         sys.exit(1)
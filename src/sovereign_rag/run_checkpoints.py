@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import threading
+
+CHECKPOINT_FILE = "checkpoints.jsonl"
+
+
+def content_hash(file_path: str) -> str:
+    """Return the SHA-256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RunCheckpoints:
+    """Per-file completion records of one query run, kept in its output directory.
+
+    Every analyzed file is appended to checkpoints.jsonl as soon as it finishes,
+    with its content hash, analysis and sources, and the line is flushed right
+    away. A resumed run (see resume) treats files whose content still hashes the
+    same as done and rebuilds the report from their records. The file is only
+    ever appended to: a line cut short by a crash is ignored when loading, and
+    for a file recorded twice the last record wins.
+    """
+
+    def __init__(self, run_dir: str):
+        self.path = os.path.join(run_dir, CHECKPOINT_FILE)
+        self.records = self._load()
+        self.completed: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+        if self._torn:
+            # End the torn line so the next record starts on a line of its own.
+            self._file.write("\n")
+            self._file.flush()
+
+    def _load(self) -> dict[str, dict]:
+        records = {}
+        self._torn = False
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                self._torn = not line.endswith("\n")
+                try:
+                    record = json.loads(line)
+                    records[record["file"]] = record
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return records
+
+    def resume(self, file_paths) -> list[str]:
+        """Mark the files recorded with their current content as completed and return them."""
+        for file_path in file_paths:
+            record = self.records.get(file_path)
+            if record is None:
+                continue
+            try:
+                unchanged = content_hash(file_path) == record.get("sha256")
+            except OSError:
+                unchanged = False
+            if unchanged:
+                self.completed[file_path] = record
+        return [file_path for file_path in file_paths if file_path in self.completed]
+
+    def record(self, file_path: str, analysis: str, sources, tier: str | None = None) -> None:
+        """Append the finished analysis of file_path; files that can no longer be read are skipped."""
+        try:
+            digest = content_hash(file_path)
+        except OSError:
+            return
+        record = {"file": file_path, "sha256": digest, "analysis": analysis, "sources": list(sources or [])}
+        if tier:
+            record["tier"] = tier
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            self.records[file_path] = record
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
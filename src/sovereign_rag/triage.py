@@ -0,0 +1,197 @@
+import ast
+import re
+import time
+from dataclasses import dataclass, field
+
+# Files scoring below this are not sent to the LLM; 0 analyzes every file.
+DEFAULT_TRIAGE_THRESHOLD = 1
+
+# (category, weight, pattern). For Python the patterns match the names a file
+# imports, calls, decorates with or otherwise references, so comments and
+# docstrings do not count, and its string literals are only checked for SQL
+# statements. Other languages are matched as plain text.
+_SQL_STATEMENT = r"\b(?:SELECT\s[\s\S]*?\sFROM|INSERT\s+INTO|UPDATE\s+\w+\s+SET|DELETE\s+FROM|CREATE\s+TABLE)\b"
+_SIGNALS = (
+    (
+        "process",
+        3,
+        r"\b(?:subprocess|os\.system|os\.popen|os\.exec\w*|os\.spawn\w*|pty|child_process|ProcessBuilder|"
+        r"Runtime\.getRuntime|shell_exec|proc_open|popen|execv?p?)\b",
+    ),
+    # Builtins are only matched on their own, not as methods such as re.compile.
+    ("eval", 3, r"(?<!\.)\b(?:eval|exec|compile|__import__|importlib|new Function)\b"),
+    (
+        "deserialization",
+        3,
+        r"\b(?:pickle|cPickle|dill|marshal|shelve|jsonpickle|yaml\.load|yaml\.unsafe_load|ObjectInputStream|"
+        r"unserialize|BinaryFormatter|readObject)\b",
+    ),
+    # Unbounded copies and format strings of C/C++; printf(buf) is a format-string bug.
+    (
+        "memory",
+        3,
+        r"\b(?:strcpy|strcat|gets|sprintf|vsprintf|printf|fprintf|scanf|sscanf|fscanf|memcpy|memmove|alloca|"
+        r"malloc|realloc)\b",
+    ),
+    # XML parsers, whose default configuration may resolve external entities (XXE).
+    (
+        "xml",
+        3,
+        r"\b(?:DocumentBuilderFactory|SAXParserFactory|SAXParser|XMLInputFactory|XMLReader|TransformerFactory|"
+        r"SAXReader|XmlDocument|XmlReader|lxml|xml\.etree|xml\.sax|xml\.dom|xmlrpc|simplexml_load_string|"
+        r"DOMDocument|libxml\w*)\b",
+    ),
+    (
+        "sql",
+        3,
+        _SQL_STATEMENT + r"|\b(?:executemany|executescript|execute|cursor|sqlite3|psycopg2?|pymysql|sqlalchemy|"
+        r"PreparedStatement|createStatement|rawQuery|knex|sequelize)\b",
+    ),
+    (
+        "http",
+        2,
+        r"\b(?:flask|django|fastapi|starlette|aiohttp|tornado|bottle|werkzeug|route|app\.(?:get|post|put|delete)|"
+        r"express|HttpServlet|RequestMapping|GetMapping|PostMapping|http\.server|BaseHTTPRequestHandler|"
+        r"request\.(?:args|form|json|GET|POST|body|params|query)|req\.(?:query|body|params|cookies)|params\[:[A-Za-z_]\w*|"
+        r"r\.URL\.Query|(?:Post)?FormValue)\b"
+        # PHP superglobals start with a non-word character, so they cannot follow \b.
+        r"|\$_(?:GET|POST|REQUEST|COOKIE)\b",
+    ),
+    (
+        "templating",
+        2,
+        r"\b(?:jinja2|render_template(?:_string)?|Template|Markup|mark_safe|innerHTML|outerHTML|"
+        r"dangerouslySetInnerHTML|document\.write|v-html|autoescape)\b",
+    ),
+    (
+        "crypto",
+        2,
+        r"\b(?:hashlib|hmac|secrets|random|ssl|cryptography|Crypto|Cipher|md5|sha1|jwt|bcrypt|MessageDigest|"
+        r"SecureRandom|crypto)\b",
+    ),
+    (
+        "network",
+        2,
+        r"\b(?:socket|requests|urllib\d?|httpx|http\.client|ftplib|smtplib|paramiko|telnetlib|fetch|axios|"
+        r"XMLHttpRequest|HttpClient|URLConnection|curl_exec|http\.(?:Get|Post|PostForm|Head|NewRequest\w*|Client))\b",
+    ),
+    (
+        "redirect",
+        2,
+        r"\b(?:redirect|redirect_to|sendRedirect|HttpResponseRedirect|RedirectResponse|http\.Redirect)\b"
+        r"|\bLocation:",
+    ),
+    (
+        "secrets",
+        2,
+        r"\b(?:password|passwd|secret|api_?key|access_?token|private_?key|credential)s?\b",
+    ),
+    (
+        "file_io",
+        1,
+        r"(?<!\.)\b(?:open|os\.remove|os\.unlink|os\.path\.join|shutil|tempfile|pathlib|Path|fopen|file_get_contents|"
+        r"readFile(?:Sync)?|writeFile(?:Sync)?|FileInputStream|FileOutputStream|tarfile|zipfile|send_file)\b",
+    ),
+    ("env", 1, r"\b(?:os\.environ|os\.getenv|getenv|process\.env|System\.getenv)\b"),
+    ("input", 1, r"\b(?:argparse|sys\.argv|sys\.stdin|input|getopt|click|process\.argv|Scanner)\b"),
+)
+_PATTERNS = tuple((category, weight, re.compile(pattern)) for category, weight, pattern in _SIGNALS)
+_SQL_IN_LITERALS = re.compile(_SQL_STATEMENT)
+
+
+@dataclass
+class TriageResult:
+    """Security-relevant surface found in one file.
+
+    score is the summed weight of its signal categories, or None for a file that
+    could not be read; those are never skipped, so process_file reports them.
+    """
+
+    file_path: str
+    score: int | None
+    signals: list[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def skipped(self, threshold: int) -> bool:
+        return self.score is not None and self.score < threshold
+
+
+def _dotted_name(node) -> str | None:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted_name(node.value)
+        return f"{base}.{node.attr}" if base else node.attr
+    if isinstance(node, ast.Call):
+        return _dotted_name(node.func)
+    return None
+
+
+def _python_surface(tree) -> tuple[str, str]:
+    """Return the imported/called/decorator names and the string literals of a module, one per line."""
+    names, strings = set(), []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names.add(node.module)
+            names.update(f"{node.module}.{alias.name}" for alias in node.names)
+        elif isinstance(node, ast.Call):
+            name = _dotted_name(node.func)
+            if name:
+                names.add(name)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.update(name for name in map(_dotted_name, node.decorator_list) if name)
+            if isinstance(node, ast.ClassDef):
+                names.update(name for name in map(_dotted_name, node.bases) if name)
+        elif isinstance(node, ast.Attribute):
+            # Uses that are not calls, such as os.environ["KEY"] or request.args.
+            names.add(_dotted_name(node) or node.attr)
+        elif isinstance(node, ast.Name):
+            names.add(node.id)
+        elif isinstance(node, ast.arg | ast.keyword) and node.arg:
+            names.add(node.arg)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            strings.append(node.value)
+    return "\n".join(sorted(names)), "\n".join(strings)
+
+
+def triage_code(code: str, file_path: str = "") -> TriageResult:
+    """Score code by the categories of security-relevant calls, imports and strings it contains."""
+    start = time.perf_counter()
+    names = strings = None
+    if file_path.lower().endswith((".py", ".pyw")):
+        try:
+            names, strings = _python_surface(ast.parse(code))
+        except (SyntaxError, ValueError):
+            pass
+
+    signals = []
+    for category, _, pattern in _PATTERNS:
+        if names is None:
+            found = pattern.search(code)
+        else:
+            found = pattern.search(names) or (category == "sql" and _SQL_IN_LITERALS.search(strings))
+        if found:
+            signals.append(category)
+    weights = {category: weight for category, weight, _ in _PATTERNS}
+    return TriageResult(
+        file_path=file_path,
+        score=sum(weights[category] for category in signals),
+        signals=signals,
+        seconds=time.perf_counter() - start,
+    )
+
+
+def triage_files(file_paths) -> list[TriageResult]:
+    """Triage every file in order."""
+    results = []
+    for file_path in file_paths:
+        try:
+            with open(file_path, encoding="utf-8", errors="replace") as f:
+                code = f.read()
+        except OSError:
+            results.append(TriageResult(file_path=file_path, score=None))
+            continue
+        results.append(triage_code(code, file_path))
+    return results
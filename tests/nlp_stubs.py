@@ -0,0 +1,18 @@
+import spacy
+from spacy.language import Language
+
+
+@Language.component("test_verb_tagger")
+def _test_verb_tagger(doc):
+    """Tag every alphabetic token as a verb so relevance filtering keeps real sentences."""
+    for tok in doc:
+        tok.pos_ = "VERB" if tok.is_alpha else "PUNCT"
+    return doc
+
+
+def blank_tagged_nlp(*args, **kwargs):
+    """Stand-in for en_core_web_sm: rule-based sentences plus a trivial tagger."""
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    nlp.add_pipe("test_verb_tagger")
+    return nlp
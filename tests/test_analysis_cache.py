@@ -0,0 +1,87 @@
+import os
+import tempfile
+import time
+import unittest
+
+from sovereign_rag.analysis_cache import AnalysisCache, analysis_key
+
+
+class TestAnalysisKey(unittest.TestCase):
+    """Test what invalidates a cached analysis."""
+
+    def test_every_input_changes_the_key(self):
+        base = ("print('hi')", "mistral", 4096, 1, ["a.md_0", "b.md_3"])
+        key = analysis_key(*base)
+        self.assertEqual(key, analysis_key(*base))
+
+        variants = [
+            ("print('bye')", "mistral", 4096, 1, ["a.md_0", "b.md_3"]),
+            ("print('hi')", "qwen", 4096, 1, ["a.md_0", "b.md_3"]),
+            ("print('hi')", "mistral", 8192, 1, ["a.md_0", "b.md_3"]),
+            ("print('hi')", "mistral", 4096, 2, ["a.md_0", "b.md_3"]),
+            ("print('hi')", "mistral", 4096, 1, ["b.md_3", "a.md_0"]),
+        ]
+        for variant in variants:
+            with self.subTest(variant=variant):
+                self.assertNotEqual(analysis_key(*variant), key)
+
+
+class TestAnalysisCache(unittest.TestCase):
+    """Test the persistent analysis cache."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _age(self, cache, key, days):
+        past = time.time() - days * 86400
+        os.utime(os.path.join(cache.path, key + ".json"), (past, past))
+
+    def test_round_trip_across_instances(self):
+        AnalysisCache(self.cache_dir).put("k1", "No vulnerabilities detected.", ["owasp.md"])
+
+        cache = AnalysisCache(self.cache_dir)
+
+        self.assertEqual(cache.get("k1"), {"analysis": "No vulnerabilities detected.", "sources": ["owasp.md"]})
+        self.assertIsNone(cache.get("k2"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertIn("50.0% hit rate", cache.summary())
+
+    def test_entries_unused_past_max_age_expire(self):
+        cache = AnalysisCache(self.cache_dir, max_age_days=7)
+        cache.put("old", "stale", [])
+        cache.put("new", "fresh", [])
+        self._age(cache, "old", 8)
+
+        self.assertIsNone(cache.get("old"))
+        self.assertEqual(cache.prune(), 1)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNotNone(cache.get("new"))
+
+    def test_prune_keeps_most_recently_used_entries(self):
+        cache = AnalysisCache(self.cache_dir, max_entries=2)
+        for days, key in ((3, "a"), (2, "b"), (1, "c")):
+            cache.put(key, key, [])
+            self._age(cache, key, days)
+        # A hit makes "a" the most recently used entry.
+        cache.get("a")
+
+        self.assertEqual(cache.prune(), 1)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_corrupt_entry_is_a_miss(self):
+        cache = AnalysisCache(self.cache_dir)
+        with open(os.path.join(self.cache_dir, "bad.json"), "w", encoding="utf-8") as f:
+            f.write("{not json")
+
+        self.assertIsNone(cache.get("bad"))
+
+
+if __name__ == "__main__":
+    unittest.main()
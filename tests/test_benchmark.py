@@ -0,0 +1,146 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sovereign_rag.benchmark import (
+    STAGES,
+    baseline_mismatches,
+    compare_to_baseline,
+    generate_corpus,
+    main,
+    run_benchmark,
+)
+from tests.nlp_stubs import blank_tagged_nlp
+
+
+def _results(config=None, **seconds):
+    return {
+        "config": {
+            "model": "all-MiniLM-L6-v2",
+            "nlp_profile": "full",
+            "chunk_size_chars": 1800,
+            "overlap_sents": 2,
+            "embed_batch_size": 32,
+            "repeat": 3,
+            **(config or {}),
+        },
+        "corpus": {"pdf_files": 4, "pdf_pages": 200, "markdown_files": 20, "bytes": 1_000_000},
+        "stages": {name: {"seconds": value, "items": 1, "items_per_second": None} for name, value in seconds.items()},
+    }
+
+
+class TestGenerateCorpus(unittest.TestCase):
+    """Test the synthetic corpus generator."""
+
+    def test_generates_requested_files_deterministically(self):
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            paths = generate_corpus(first, pdf_files=2, pages_per_pdf=3, markdown_files=2, seed=7)
+            generate_corpus(second, pdf_files=2, pages_per_pdf=3, markdown_files=2, seed=7)
+
+            self.assertEqual(sorted(os.path.basename(p) for p in paths), sorted(os.listdir(first)))
+            self.assertEqual(sum(p.endswith(".pdf") for p in paths), 2)
+            for name in ("synthetic_000.md", "synthetic_001.md"):
+                with open(os.path.join(first, name), encoding="utf-8") as a, open(os.path.join(second, name)) as b:
+                    self.assertEqual(a.read(), b.read())
+
+
+class TestRunBenchmark(unittest.TestCase):
+    """Test per-stage timing over a small corpus."""
+
+    @patch("sovereign_rag.benchmark.SentenceTransformer")
+    @patch("sovereign_rag.benchmark.load_nlp", side_effect=blank_tagged_nlp)
+    def test_reports_every_stage(self, mock_load_nlp, mock_sentence_transformer):
+        mock_sentence_transformer.return_value.encode.side_effect = lambda chunks, **kwargs: [
+            [0.1, 0.2] for _ in chunks
+        ]
+
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            paths = generate_corpus(corpus_dir, pdf_files=1, pages_per_pdf=2, markdown_files=2)
+            results = run_benchmark(paths, chunk_size_chars=600, repeat=1)
+
+        self.assertEqual(list(results["stages"]), list(STAGES))
+        self.assertEqual(results["stages"]["pdf_extract"]["items"], 2)
+        self.assertEqual(results["corpus"]["pdf_pages"], 2)
+        self.assertEqual(results["stages"]["strip_markdown"]["items"], 2)
+        chunks = results["stages"]["build_chunks"]["items"]
+        self.assertGreater(chunks, 0)
+        self.assertEqual(results["stages"]["encode"]["items"], chunks)
+        self.assertEqual(results["stages"]["chroma_write"]["items"], chunks)
+        # Results are meant to be stored and diffed.
+        json.dumps(results)
+
+
+class TestCompareToBaseline(unittest.TestCase):
+    """Test regression detection against a stored baseline."""
+
+    def test_flags_only_stages_over_threshold(self):
+        baseline = _results(clean_text=1.0, encode=2.0, chroma_write=1.0)
+        current = _results(clean_text=1.2, encode=3.0, chroma_write=0.5)
+
+        regressions = compare_to_baseline(current, baseline, threshold=0.25)
+
+        self.assertEqual([r["stage"] for r in regressions], ["encode"])
+        self.assertEqual(regressions[0]["ratio"], 1.5)
+
+    def test_ignores_tiny_absolute_slowdowns(self):
+        baseline = _results(clean_text=0.001)
+        current = _results(clean_text=0.004)
+
+        self.assertEqual(compare_to_baseline(current, baseline, threshold=0.25), [])
+
+    def test_baselines_recorded_with_other_settings_are_refused(self):
+        baseline = _results(encode=1.0)
+        current = _results(config={"chunk_size_chars": 900, "repeat": 1}, encode=3.0)
+
+        self.assertEqual(
+            baseline_mismatches(current, baseline), ["config.chunk_size_chars: 1800 in the baseline, 900 now"]
+        )
+        with self.assertRaisesRegex(ValueError, "chunk_size_chars"):
+            compare_to_baseline(current, baseline)
+        del baseline["corpus"]["pdf_pages"]
+        self.assertIn("corpus.pdf_pages: not recorded in the baseline, 200 now", baseline_mismatches(current, baseline))
+
+    @patch("sovereign_rag.benchmark.print_results")
+    @patch("sovereign_rag.benchmark.run_benchmark")
+    @patch("sovereign_rag.benchmark.find_source_files", return_value=["docs/a.md"])
+    def test_main_exits_nonzero_on_regression(self, mock_find, mock_run, mock_print_results):
+        mock_run.return_value = _results(encode=3.0)
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline_path = os.path.join(tmp, "baseline.json")
+            with open(baseline_path, "w", encoding="utf-8") as f:
+                json.dump(_results(encode=1.0), f)
+
+            argv = ["benchmark", "--corpus-dir", tmp, "--baseline", baseline_path]
+            with patch("sys.argv", argv), patch("builtins.print") as mock_print:
+                with self.assertRaises(SystemExit) as ctx:
+                    main()
+
+        self.assertEqual(ctx.exception.code, 1)
+        mock_run.assert_called_once()
+        self.assertIn("Regression in encode", " ".join(str(c.args[0]) for c in mock_print.call_args_list))
+
+    @patch("sovereign_rag.benchmark.print_results")
+    @patch("sovereign_rag.benchmark.run_benchmark")
+    @patch("sovereign_rag.benchmark.find_source_files", return_value=["docs/a.md"])
+    def test_main_refuses_a_mismatched_baseline(self, mock_find, mock_run, mock_print_results):
+        mock_run.return_value = _results(config={"nlp_profile": "trimmed"}, encode=1.0)
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline_path = os.path.join(tmp, "baseline.json")
+            with open(baseline_path, "w", encoding="utf-8") as f:
+                json.dump(_results(encode=3.0), f)
+
+            argv = ["benchmark", "--corpus-dir", tmp, "--baseline", baseline_path]
+            with patch("sys.argv", argv), patch("builtins.print") as mock_print:
+                with self.assertRaises(SystemExit) as ctx:
+                    main()
+
+        self.assertEqual(ctx.exception.code, 2)
+        # No speedup against the baseline is shown either.
+        mock_print_results.assert_called_once_with(mock_run.return_value, None)
+        self.assertIn("config.nlp_profile: full in the baseline, trimmed now", str(mock_print.call_args.args[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import textwrap
+import unittest
+
+from sovereign_rag.code_segments import changed_segments, segment_code
+
+
+def _function(name, lines=8):
+    body = "".join(f"    value_{i} = compute('{name}', {i})\n" for i in range(lines))
+    return f"def {name}(request):\n{body}    return value_0\n"
+
+
+class TestSegmentCode(unittest.TestCase):
+    """Test function/class-sized segmentation of source files."""
+
+    def assertCovers(self, segments, code):
+        self.assertEqual("".join(segment.text for segment in segments), code)
+        for previous, segment in zip(segments, segments[1:], strict=False):
+            self.assertEqual(segment.start_line, previous.end_line + 1)
+
+    def test_small_files_stay_whole(self):
+        code = _function("login")
+
+        segments = segment_code(code, "app.py", max_chars=len(code))
+
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(segments[0].text, code)
+        self.assertEqual(segments[0].label, f"file file (lines 1-{code.count(chr(10))})")
+
+    def test_python_splits_on_functions(self):
+        code = "import os\n\n\n" + "\n\n".join(_function(name) for name in ("login", "logout", "reset"))
+
+        segments = segment_code(code, "app.py", max_chars=400)
+
+        self.assertCovers(segments, code)
+        self.assertEqual([segment.name for segment in segments], ["module code, login", "logout", "reset"])
+        self.assertTrue(all(len(segment.text) <= 400 for segment in segments))
+        self.assertEqual(segments[1].kind, "function")
+        self.assertTrue(segments[1].text.startswith("\n\ndef logout("))
+
+    def test_large_python_classes_split_into_methods(self):
+        methods = textwrap.indent("\n".join(_function(name) for name in ("get", "post", "delete")), "    ")
+        code = f"class UserView(View):\n    '''Users.'''\n\n{methods}"
+
+        segments = segment_code(code, "views.py", max_chars=450)
+
+        self.assertCovers(segments, code)
+        self.assertEqual(
+            [segment.name for segment in segments],
+            ["UserView body, UserView.get", "UserView.post", "UserView.delete"],
+        )
+        self.assertTrue(segments[0].text.startswith("class UserView(View):"))
+
+    def test_invalid_python_falls_back_to_the_indent_heuristic(self):
+        code = "".join(_function(name).replace("):", ")") for name in ("login", "logout", "reset"))
+
+        segments = segment_code(code, "broken.py", max_chars=400)
+
+        self.assertCovers(segments, code)
+        self.assertEqual(len(segments), 3)
+        self.assertEqual(segments[1].name, "def logout(request)")
+
+    def test_brace_languages_split_on_blocks(self):
+        block = "  const query = `SELECT * FROM users WHERE id = ${id}`; // {\n" * 5
+        code = "import db from 'db';\n\n" + "".join(
+            f"function {name}(id) {{\n{block}  return db.run(query);\n}}\n\n" for name in ("load", "save", "drop")
+        )
+
+        segments = segment_code(code, "users.js", max_chars=450)
+
+        self.assertCovers(segments, code)
+        self.assertEqual(
+            [segment.name for segment in segments], ["function load(id)", "function save(id)", "function drop(id)"]
+        )
+
+    def test_large_brace_blocks_split_on_inner_blocks(self):
+        methods = "".join(
+            f"    public void {name}() {{\n" + '        run("{name}");\n' * 8 + "    }\n" for name in ("a", "b", "c")
+        )
+        code = f"public class Service {{\n{methods}}}\n"
+
+        segments = segment_code(code, "Service.java", max_chars=300)
+
+        self.assertCovers(segments, code)
+        self.assertEqual(len(segments), 3)
+        self.assertTrue(segments[0].text.startswith("public class Service {"))
+        self.assertTrue(segments[-1].text.endswith("    }\n}\n"))
+
+    def test_oversized_units_are_split_into_line_windows(self):
+        code = _function("huge", lines=40)
+
+        segments = segment_code(code, "app.py", max_chars=500)
+
+        self.assertCovers(segments, code)
+        self.assertGreater(len(segments), 1)
+        self.assertTrue(all(len(segment.text) <= 500 for segment in segments))
+        self.assertEqual(segments[0].name, f"huge (part 1/{len(segments)})")
+
+
+class TestChangedSegments(unittest.TestCase):
+    """Test cutting files down to the code around changed lines."""
+
+    # Lines: import 1, login 4-13, logout 16-25, reset 28-37; each unit starts after the previous one.
+    code = "import os\n\n\n" + "\n\n".join(_function(name) for name in ("login", "logout", "reset"))
+
+    def test_changes_widen_to_their_enclosing_function(self):
+        segments = changed_segments(self.code, "app.py", [(20, 20)])
+
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(segments[0].label, "function logout (lines 14-25, changed 20)")
+        self.assertTrue(segments[0].text.lstrip().startswith("def logout("))
+
+    def test_separate_changes_stay_separate_and_adjacent_ones_merge(self):
+        segments = changed_segments(self.code, "app.py", [(1, 1), (20, 21), (30, 30)])
+
+        self.assertEqual(
+            [segment.label for segment in segments],
+            ["module module code (lines 1-1, changed 1)", "function logout, reset (lines 14-37, changed 20-21, 30)"],
+        )
+
+    def test_context_lines_reach_into_neighbouring_units(self):
+        self.assertEqual(len(changed_segments(self.code, "app.py", [(24, 24)])), 1)
+        segments = changed_segments(self.code, "app.py", [(24, 24)], context=3)
+
+        self.assertEqual(segments[0].label, "function logout, reset (lines 14-37, changed 24)")
+
+    def test_changes_covering_the_whole_file_keep_it_whole(self):
+        segments = changed_segments(self.code, "app.py", [(1, 40)])
+
+        self.assertEqual([segment.kind for segment in segments], ["file"])
+        self.assertEqual(segments[0].text, self.code)
+
+
+if __name__ == "__main__":
+    unittest.main()
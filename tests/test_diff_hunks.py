@@ -0,0 +1,58 @@
+import unittest
+
+from sovereign_rag.diff_hunks import parse_unified_diff
+
+# git diff -U0 output as _run_git returns it: stripped, without blank lines.
+DIFF = """diff --git a/app/views.py b/app/views.py
+index 3b18e51..a9c2f4d 100644
+--- a/app/views.py
++++ b/app/views.py
+@@ -12 +12 @@ def login(request):
+-    user = find(request.GET["name"])
++    user = find(request.POST["name"])
+@@ -40,3 +40,0 @@ def logout(request):
+-    log(request)
+-    audit(request)
+-    flush()
+@@ -60,0 +58,2 @@ def reset(request):
++++ b/not/a/header.py
++    token = new_token()
+\\ No newline at end of file
+diff --git a/app/new.py b/app/new.py
+new file mode 100644
+--- /dev/null
++++ b/app/new.py
+@@ -0,0 +1,3 @@
++import os
++
++print(os.getcwd())
+diff --git a/old.py b/old.py
+deleted file mode 100644
+--- a/old.py
++++ /dev/null
+@@ -1 +0,0 @@
+-x = 1
+"""
+
+
+class TestParseUnifiedDiff(unittest.TestCase):
+    """Test reading changed line ranges from git diff -U0 output."""
+
+    def test_changed_line_ranges_per_file(self):
+        hunks = parse_unified_diff(line.strip() for line in DIFF.splitlines() if line.strip())
+
+        self.assertEqual(
+            hunks,
+            {
+                # A deletion maps to the lines around it; an added line that looks like a header is not one.
+                "app/views.py": [(12, 12), (40, 41), (58, 59)],
+                "app/new.py": [(1, 3)],
+            },
+        )
+
+    def test_empty_diff(self):
+        self.assertEqual(parse_unified_diff([]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
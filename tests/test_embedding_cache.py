@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from sovereign_rag.embedding_cache import EmbeddingCache, chunk_key, normalize_chunk
+
+
+class TestChunkKey(unittest.TestCase):
+    """Test cache key normalization."""
+
+    def test_whitespace_differences_share_a_key(self):
+        self.assertEqual(normalize_chunk("  Broken \n Access\tControl "), "Broken Access Control")
+        self.assertEqual(chunk_key("Broken  Access Control"), chunk_key("Broken Access\nControl"))
+
+    def test_different_text_has_different_key(self):
+        self.assertNotEqual(chunk_key("SQL injection"), chunk_key("XSS"))
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    """Test the persistent embedding cache."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_persists_across_instances(self):
+        cache = EmbeddingCache(self.cache_dir, "all-MiniLM-L6-v2")
+        cache.put_many(["alpha", "beta"], np.array([[1.0, 2.0], [3.0, 4.0]], dtype=np.float32))
+        cache.flush()
+
+        reopened = EmbeddingCache(self.cache_dir, "all-MiniLM-L6-v2")
+        alpha, missing, beta = reopened.get_many(["alpha", "gamma", "beta"])
+
+        np.testing.assert_array_equal(alpha, [1.0, 2.0])
+        np.testing.assert_array_equal(beta, [3.0, 4.0])
+        self.assertIsNone(missing)
+        self.assertEqual((reopened.hits, reopened.misses), (2, 1))
+
+    def test_models_do_not_share_entries(self):
+        EmbeddingCache(self.cache_dir, "model-a").put_many(["alpha"], [[1.0]])
+
+        self.assertEqual(EmbeddingCache(self.cache_dir, "model-b").get_many(["alpha"]), [None])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = EmbeddingCache(self.cache_dir, "m", max_entries=2)
+        cache.put_many(["a", "b"], [[1.0], [2.0]])
+        cache.get_many(["a"])  # "b" is now the least recently used entry
+        cache.put_many(["c"], [[3.0]])
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+        a, b, c = cache.get_many(["a", "b", "c"])
+        self.assertIsNone(b)
+        np.testing.assert_array_equal(a, [1.0])
+        np.testing.assert_array_equal(c, [3.0])
+
+    def test_lowering_max_entries_shrinks_existing_cache(self):
+        cache = EmbeddingCache(self.cache_dir, "m")
+        cache.put_many([f"chunk {i}" for i in range(10)], [[float(i)] for i in range(10)])
+        cache.flush()
+
+        shrunk = EmbeddingCache(self.cache_dir, "m", max_entries=3)
+
+        self.assertEqual(len(shrunk), 3)
+        vectors_path = os.path.join(shrunk.path, "vectors.f32")
+        self.assertEqual(os.path.getsize(vectors_path), 3 * 4)
+        np.testing.assert_array_equal(shrunk.get_many(["chunk 9"])[0], [9.0])
+
+    def test_corrupt_metadata_starts_empty(self):
+        cache = EmbeddingCache(self.cache_dir, "m")
+        cache.put_many(["alpha"], [[1.0]])
+        with open(os.path.join(cache.path, "meta.json"), "w", encoding="utf-8") as f:
+            f.write("{not json")
+
+        self.assertEqual(len(EmbeddingCache(self.cache_dir, "m")), 0)
+
+    def test_summary_reports_hit_rate(self):
+        cache = EmbeddingCache(self.cache_dir, "m")
+        cache.put_many(["alpha"], [[1.0]])
+        cache.get_many(["alpha", "beta"])
+
+        self.assertIn("1 hits, 1 misses (50.0% hit rate)", cache.summary())
+
+
+if __name__ == "__main__":
+    unittest.main()
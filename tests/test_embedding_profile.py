@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import MagicMock
+
+from sovereign_rag.embedding_profile import EmbeddingMismatchError, EmbeddingProfile
+
+
+class TestEmbeddingProfile(unittest.TestCase):
+    """Test the embedding profile stored in collection metadata."""
+
+    def test_round_trip_through_collection_metadata(self):
+        profile = EmbeddingProfile("all-MiniLM-L6-v2", 384, True, chunking="tokens", max_tokens=254)
+
+        collection = MagicMock(metadata={"hnsw:space": "l2", **profile.to_metadata()})
+
+        self.assertEqual(EmbeddingProfile.from_collection(collection), profile)
+
+    def test_unset_max_tokens_is_not_stored(self):
+        metadata = EmbeddingProfile("all-MiniLM-L6-v2", 384, True).to_metadata()
+
+        self.assertNotIn("chunk_max_tokens", metadata)
+        self.assertNotIn(None, metadata.values())
+
+    def test_collection_without_profile(self):
+        self.assertIsNone(EmbeddingProfile.from_collection(MagicMock(metadata=None)))
+        self.assertIsNone(EmbeddingProfile.from_collection(MagicMock(metadata={"hnsw:space": "l2"})))
+
+    def test_from_model_reads_dimension_and_normalization(self):
+        class Normalize:
+            pass
+
+        st_model = MagicMock()
+        st_model.get_sentence_embedding_dimension.return_value = 768
+        st_model.__iter__.return_value = [MagicMock(), Normalize()]
+
+        profile = EmbeddingProfile.from_model(st_model, "all-mpnet-base-v2", chunk_size_chars=1200)
+
+        self.assertEqual(profile, EmbeddingProfile("all-mpnet-base-v2", 768, True, chunk_size_chars=1200))
+
+    def test_check_only_accepts_the_same_vectors(self):
+        profile = EmbeddingProfile("all-MiniLM-L6-v2", 384, True)
+        profile.check("all-MiniLM-L6-v2", 384, True)
+
+        for args in (
+            ("all-mpnet-base-v2", 384, True),
+            ("all-MiniLM-L6-v2", 768, True),
+            ("all-MiniLM-L6-v2", 384, False),
+        ):
+            with self.subTest(args=args), self.assertRaises(EmbeddingMismatchError):
+                profile.check(*args)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from sovereign_rag.file_packing import answer_format, format_packed_code, is_small, pack_files, split_packed_analysis
+
+
+class TestPackFiles(unittest.TestCase):
+    """Test grouping small files into shared prompts."""
+
+    def test_packs_fill_the_budget_within_each_directory(self):
+        file_tokens = [
+            ("app/a.py", 300),
+            ("app/b.py", 300),
+            ("lib/c.py", 200),
+            ("app/c.py", 300),
+            ("app/d.py", 900),
+            ("lib/d.py", 200),
+            ("lib/big.py", 2000),
+            None,
+        ]
+
+        packs = pack_files(file_tokens, max_tokens=1000)
+
+        # app/d.py and lib/big.py fit no pack with another file; the None entry is never packed.
+        self.assertEqual(packs, [[0, 1, 3], [2, 5]])
+
+    def test_single_files_are_not_packs(self):
+        self.assertEqual(pack_files([("a.py", 10), ("b/c.py", 10)], max_tokens=100), [])
+
+    def test_is_small(self):
+        self.assertTrue(is_small("x = 1\n" * 50))
+        self.assertFalse(is_small("x = 1\n" * 51))
+
+
+class TestPackedAnswers(unittest.TestCase):
+    """Test the packed prompt format and splitting its answers per file."""
+
+    def test_prompt_labels_each_file(self):
+        code = format_packed_code(["a.py", "b.py"], ["import os", "x = 1"])
+
+        self.assertEqual(code, "[File 1: a.py]\nimport os\n\n[File 2: b.py]\nx = 1")
+        self.assertIn("### File 2: b.py", answer_format(["a.py", "b.py"]))
+
+    def test_split_answer_per_file(self):
+        answer = (
+            "Here is the analysis.\n"
+            "### File 1: a.py\nSQL injection in query().\nFile 2 is analyzed below.\n\n"
+            "**File 2: b.py**\nNo vulnerabilities detected.\n"
+        )
+
+        self.assertEqual(
+            split_packed_analysis(answer, 2),
+            ["SQL injection in query().\nFile 2 is analyzed below.", "No vulnerabilities detected."],
+        )
+
+    def test_answers_without_every_section_cannot_be_split(self):
+        self.assertIsNone(split_packed_analysis("### File 1: a.py\nNo vulnerabilities detected.", 2))
+        self.assertIsNone(split_packed_analysis("### File 2: b.py\nx\n### File 1: a.py\ny", 2))
+        self.assertIsNone(split_packed_analysis("### File 1: a.py\n\n### File 2: b.py\nx", 2))
+        self.assertIsNone(split_packed_analysis("No vulnerabilities detected.", 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
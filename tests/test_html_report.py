@@ -1,12 +1,19 @@
+import json
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 
 from sovereign_rag.html_report import (
+    ReportWriter,
+    add_cascade_to_html,
     add_file_to_html,
+    add_triage_to_html,
     generate_html_footer,
     generate_html_header,
     generate_html_report,
 )
+from sovereign_rag.triage import TriageResult
 
 
 class TestGenerateHtmlHeader(unittest.TestCase):
@@ -94,5 +101,83 @@ class TestGenerateHtmlReport(unittest.TestCase):
         )
 
 
+class TestAddTriageToHtml(unittest.TestCase):
+    """Test the add_triage_to_html function."""
+
+    def test_lists_every_decision(self):
+        results = [
+            TriageResult("app.py", 5, ["process", "http"], 0.002),
+            TriageResult("constants.py", 0, [], 0.001),
+            TriageResult("missing.py", None),
+        ]
+
+        result = add_triage_to_html(results, 1, 0.25)
+
+        self.assertIn("Triage: 1 of 3 files skipped (score below 1, 0.25s)", result)
+        self.assertIn("analyzed    5  app.py  (process, http; 2.0 ms)", result)
+        self.assertIn("skipped     0  constants.py  (no security-relevant surface; 1.0 ms)", result)
+        self.assertIn("analyzed    -  missing.py  (unreadable; 0.0 ms)", result)
+        self.assertIn('<div class="file-header">', result)
+
+
+class TestAddCascadeToHtml(unittest.TestCase):
+    """Test the model cascade parts of the report."""
+
+    def test_file_entries_name_the_tier_of_their_verdict(self):
+        self.assertNotIn("Verdict by", add_file_to_html("a.py", "Result"))
+        self.assertIn("Verdict by:</strong> screening model", add_file_to_html("a.py", "Result", tier="screen"))
+        self.assertIn("Verdict by:</strong> full analysis model", add_file_to_html("a.py", "Result", tier="full"))
+
+    def test_summary_lists_files_and_latency_per_tier(self):
+        stats = {"requests": 4, "mean": 0.5, "p50": 0.4, "p95": 1.0, "max": 1.25}
+        summary = {
+            "screen_model": "qwen2.5:0.5b",
+            "model": "mistral:7b-instruct",
+            "files": {"screen": 3, "full": 1},
+            "latency": {"screen": stats, "full": {**stats, "requests": 1}},
+        }
+
+        result = add_cascade_to_html(summary)
+
+        self.assertIn("Model cascade: 3 of 4 files cleared by qwen2.5:0.5b", result)
+        self.assertIn("screen     4 requests  mean 0.50s  p50 0.40s  p95 1.00s  max 1.25s", result)
+        self.assertIn("full       1 requests", result)
+
+
+class TestReportWriter(unittest.TestCase):
+    """Test the ReportWriter class."""
+
+    @patch("sovereign_rag.html_report.generate_html_header", return_value="<header>")
+    @patch("sovereign_rag.html_report.generate_html_footer", return_value="<footer>")
+    def test_files_are_on_disk_as_soon_as_they_are_added(self, mock_footer, mock_header):
+        with tempfile.TemporaryDirectory() as tmp:
+            report = ReportWriter(tmp, "Test Report")
+            report.add("a.py", "No vulnerabilities detected.", ["owasp.md"])
+
+            # Readable before the report is closed, e.g. after a crash.
+            with open(os.path.join(tmp, "report.html"), encoding="utf-8") as f:
+                self.assertEqual(
+                    f.read(), "<header>" + add_file_to_html("a.py", "No vulnerabilities detected.", ["owasp.md"])
+                )
+            with open(os.path.join(tmp, "report.jsonl"), encoding="utf-8") as f:
+                self.assertEqual(
+                    [json.loads(line) for line in f],
+                    [{"file": "a.py", "analysis": "No vulnerabilities detected.", "sources": ["owasp.md"]}],
+                )
+
+            report.add("b.py", "SQL injection")
+            report.close()
+            report.close()
+
+            with open(report.html_path, encoding="utf-8") as f:
+                html = f.read()
+            self.assertTrue(html.endswith("<footer>"))
+            self.assertEqual(html.count("<footer>"), 1)
+            self.assertEqual(report.count, 2)
+            with open(report.jsonl_path, encoding="utf-8") as f:
+                self.assertEqual(json.loads(f.readlines()[1])["sources"], [])
+        mock_header.assert_called_once_with("Test Report")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,16 +1,39 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import MagicMock, patch
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import ANY, MagicMock, patch
 
+import fitz
+import spacy
+
+from sovereign_rag.embedding_cache import EmbeddingCache
+from sovereign_rag.embedding_profile import EmbeddingMismatchError, EmbeddingProfile
 from sovereign_rag.ingest import (
+    StageStats,
+    TokenBudget,
+    build_chunks_from_sentences,
     clean_text,
     find_source_files,
     index_documents,
     is_relevant_sentence,
+    iter_chunks,
+    iter_pdf_chunks,
+    load_manifest,
+    load_nlp,
+    parse_documents,
     preprocess_markdown,
     preprocess_pdf,
+    record_embedding_profile,
+    report_chunking_stats,
     run_ingest,
     strip_markdown,
 )
+from tests.nlp_stubs import blank_tagged_nlp
 
 
 class TestCleanText(unittest.TestCase):
@@ -137,7 +160,7 @@ class TestPreprocessPDF(unittest.TestCase):
         mock_sent.__iter__.return_value = [mock_token1, mock_token2]
 
         mock_spacy_doc.sents = [mock_sent]
-        mock_nlp.return_value = mock_spacy_doc
+        mock_nlp.pipe.side_effect = lambda texts, **kwargs: [mock_spacy_doc for _ in texts]
 
         # Set up mock spacy
         mock_spacy.load.return_value = mock_nlp
@@ -169,6 +192,78 @@ class TestPreprocessPDF(unittest.TestCase):
         mock_fitz_open.assert_called_once_with("test.pdf")
 
 
+class _WhitespaceTokenizer:
+    """Minimal tokenizer stand-in: one token per whitespace-separated word."""
+
+    def __call__(self, texts, **kwargs):
+        return {"input_ids": [text.split() for text in texts]}
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+
+class TestBuildChunks(unittest.TestCase):
+    """Test sentence packing in character and token mode."""
+
+    def test_char_mode_packs_with_overlap(self):
+        sentences = ["aaaa", "bbbb", "cccc", "dddd"]
+        self.assertEqual(
+            build_chunks_from_sentences(sentences, chunk_size_chars=9, overlap_sents=1),
+            ["aaaa bbbb", "bbbb cccc", "cccc dddd"],
+        )
+
+    def test_iter_chunks_streams_before_input_is_exhausted(self):
+        consumed = []
+
+        def batches():
+            for page in range(100):
+                consumed.append(page)
+                yield [f"Sentence {page} a", f"Sentence {page} b"]
+
+        chunks = iter_chunks(batches(), chunk_size_chars=30, overlap_sents=0)
+
+        self.assertEqual(next(chunks), "Sentence 0 a Sentence 0 b")
+        self.assertLess(len(consumed), 5)
+        self.assertEqual(len(list(chunks)), 99)
+
+    def test_token_mode_packs_to_model_budget(self):
+        budget = TokenBudget(_WhitespaceTokenizer(), max_tokens=4)
+        sentences = ["one two", "three four", "five six", "seven"]
+
+        result = build_chunks_from_sentences(sentences, chunk_size_chars=5, overlap_sents=1, token_budget=budget)
+
+        # Each chunk holds at most four words and shares one sentence with its neighbour.
+        self.assertEqual(result, ["one two three four", "three four five six", "five six seven"])
+
+    def test_token_mode_reports_char_scheme_truncation(self):
+        budget = TokenBudget(_WhitespaceTokenizer(), max_tokens=4)
+        sentences = ["w1 w2 w3", "w4 w5 w6", "w7 w8 w9"]
+        stats = {}
+
+        build_chunks_from_sentences(sentences, chunk_size_chars=1000, overlap_sents=0, token_budget=budget, stats=stats)
+
+        self.assertEqual(stats, {"chunks": 3, "over_budget": 0, "char_chunks": 1, "char_over_budget": 1})
+
+    def test_chunks_pushed_over_budget_by_overlap_are_counted(self):
+        budget = TokenBudget(_WhitespaceTokenizer(), max_tokens=4)
+        stats = {}
+
+        result = build_chunks_from_sentences(
+            ["w1 w2", "w3 w4 w5", "w6"], chunk_size_chars=1000, overlap_sents=1, token_budget=budget, stats=stats
+        )
+        with patch("builtins.print") as mock_print:
+            report_chunking_stats(stats, budget.max_tokens, 1000)
+
+        # No sentence is over budget on its own; the carried-over "w1 w2" pushes the second chunk past it.
+        self.assertEqual(result, ["w1 w2", "w1 w2 w3 w4 w5", "w3 w4 w5 w6"])
+        self.assertEqual(stats["over_budget"], 1)
+        self.assertIn("1 chunks over the token budget", mock_print.call_args_list[0].args[0])
+
+    def test_token_budget_reserves_special_tokens(self):
+        st_model = MagicMock(tokenizer=_WhitespaceTokenizer(), max_seq_length=256)
+        self.assertEqual(TokenBudget.from_model(st_model).max_tokens, 254)
+
+
 class TestStripMarkdown(unittest.TestCase):
     """Test the strip_markdown function."""
 
@@ -257,7 +352,7 @@ class TestIndexDocuments(unittest.TestCase):
     @patch("sovereign_rag.ingest.os.path.exists")
     @patch("sovereign_rag.ingest.find_source_files")
     @patch("sovereign_rag.ingest.os.path.relpath")
-    @patch("sovereign_rag.ingest.preprocess_pdf")
+    @patch("sovereign_rag.ingest.iter_pdf_chunks")
     def test_index_documents_with_pdf_files(self, mock_preprocess, mock_relpath, mock_find_source_files, mock_exists):
         """Test index_documents with PDF files."""
         # Set up mocks
@@ -268,7 +363,7 @@ class TestIndexDocuments(unittest.TestCase):
 
         # Mock model and collection
         mock_model = MagicMock()
-        mock_model.encode.return_value = [0.1, 0.2, 0.3]
+        mock_model.encode.side_effect = lambda batch, **kwargs: [[0.1, 0.2, 0.3] for _ in batch]
 
         mock_collection = MagicMock()
 
@@ -282,8 +377,472 @@ class TestIndexDocuments(unittest.TestCase):
             mock_find_source_files.assert_called_once_with("test_dir")
             self.assertEqual(mock_relpath.call_count, 2)
             self.assertEqual(mock_preprocess.call_count, 2)
-            self.assertEqual(mock_model.encode.call_count, 4)  # 2 files * 2 chunks
-            self.assertEqual(mock_collection.add.call_count, 4)  # 2 files * 2 chunks
+            self.assertEqual(mock_model.encode.call_count, 2)  # one batch per file
+            mock_collection.add.assert_called_once()  # one bulk write for both files
+            kwargs = mock_collection.add.call_args.kwargs
+            self.assertEqual(kwargs["ids"], ["file1.pdf_0", "file1.pdf_1", "subdir/file2.pdf_0", "subdir/file2.pdf_1"])
+            self.assertEqual(kwargs["documents"], ["Chunk 1", "Chunk 2", "Chunk 1", "Chunk 2"])
+
+    @patch("sovereign_rag.ingest.os.path.exists", return_value=True)
+    @patch("sovereign_rag.ingest.find_source_files", return_value=["test_dir/file1.pdf"])
+    @patch("sovereign_rag.ingest.iter_pdf_chunks", return_value=["Chunk 1", "Chunk 2", "Chunk 3"])
+    def test_index_documents_batches_by_embed_batch_size(self, mock_preprocess, mock_find_source_files, mock_exists):
+        """Chunks are encoded embed_batch_size at a time and writes respect Chroma's limit."""
+        mock_model = MagicMock()
+        mock_model.encode.side_effect = lambda batch, **kwargs: [[0.1] for _ in batch]
+        mock_collection = MagicMock()
+        mock_client = MagicMock()
+        mock_client.get_max_batch_size.return_value = 2
+
+        with patch.dict(
+            "sovereign_rag.ingest.__dict__",
+            {"model": mock_model, "collection": mock_collection, "chroma_client": mock_client},
+        ):
+            index_documents("test_dir", embed_batch_size=2)
+
+        self.assertEqual([c.args[0] for c in mock_model.encode.call_args_list], [["Chunk 1", "Chunk 2"], ["Chunk 3"]])
+        self.assertEqual(
+            [c.kwargs["ids"] for c in mock_collection.add.call_args_list],
+            [["file1.pdf_0", "file1.pdf_1"], ["file1.pdf_2"]],
+        )
+
+    @patch("sovereign_rag.ingest.os.path.exists", return_value=True)
+    @patch("sovereign_rag.ingest.find_source_files", return_value=["test_dir/file1.pdf"])
+    @patch("sovereign_rag.ingest.iter_pdf_chunks", return_value=["Chunk 1", "Bad chunk", "Chunk 3"])
+    def test_index_documents_reports_failing_chunk_in_batch(self, mock_preprocess, mock_find_source_files, mock_exists):
+        """A failing batch falls back to per-chunk handling so only the bad chunk is dropped."""
+
+        def encode(batch, **kwargs):
+            if "Bad chunk" in batch:
+                raise ValueError("cannot encode")
+            return [0.1] if isinstance(batch, str) else [[0.1] for _ in batch]
+
+        mock_model = MagicMock()
+        mock_model.encode.side_effect = encode
+        mock_collection = MagicMock()
+
+        def add(**kwargs):
+            if "file1.pdf_2" in kwargs["ids"]:
+                raise ValueError("write rejected")
+
+        mock_collection.add.side_effect = add
+
+        with patch.dict("sovereign_rag.ingest.__dict__", {"model": mock_model, "collection": mock_collection}):
+            with patch("builtins.print") as mock_print:
+                index_documents("test_dir")
+
+        messages = " ".join(str(c.args[0]) for c in mock_print.call_args_list)
+        self.assertIn("Error encoding chunk 1 from test_dir/file1.pdf", messages)
+        self.assertIn("Error adding chunk 2 from test_dir/file1.pdf", messages)
+        written = [c.kwargs["ids"] for c in mock_collection.add.call_args_list]
+        self.assertIn(["file1.pdf_0"], written)
+
+
+class TestIngestPipeline(unittest.TestCase):
+    """Test the concurrent parse -> embed -> write pipeline."""
+
+    def setUp(self):
+        self.model = MagicMock()
+        self.model.encode.side_effect = lambda batch, **kwargs: [[0.1] for _ in batch]
+        self.collection = MagicMock()
+        self.client = MagicMock()
+        self.client.get_max_batch_size.return_value = 1
+
+    def _globals(self):
+        return {"model": self.model, "collection": self.collection, "chroma_client": self.client}
+
+    @patch("sovereign_rag.ingest.os.path.exists", return_value=True)
+    @patch("sovereign_rag.ingest.find_source_files", return_value=[f"d/f{i}.md" for i in range(20)])
+    def test_bounded_queues_apply_backpressure(self, mock_find_source_files, mock_exists):
+        """A slow writer must hold the parser back instead of letting work pile up."""
+        lock = threading.Lock()
+        progress = {"parsed": 0, "written": 0, "max_lag": 0}
+
+        def parsed(file_paths, **kwargs):
+            for path in file_paths:
+                with lock:
+                    progress["parsed"] += 1
+                    progress["max_lag"] = max(progress["max_lag"], progress["parsed"] - progress["written"])
+                yield path, ["Chunk"]
+
+        def slow_add(**kwargs):
+            time.sleep(0.005)
+            with lock:
+                progress["written"] += 1
+
+        self.collection.add.side_effect = slow_add
+        with patch.dict("sovereign_rag.ingest.__dict__", self._globals()):
+            with patch("sovereign_rag.ingest.parse_documents", side_effect=parsed):
+                index_documents("d", queue_size=1)
+
+        self.assertEqual(progress["written"], 20)
+        # One item in each queue (with its end-of-file marker) plus one in flight per stage.
+        self.assertLessEqual(progress["max_lag"], 6)
+
+    @patch("sovereign_rag.ingest.os.path.exists", return_value=True)
+    @patch("sovereign_rag.ingest.find_source_files", return_value=["d/a.md", "d/b.md"])
+    def test_stage_failure_is_raised(self, mock_find_source_files, mock_exists):
+        def parsed(file_paths, **kwargs):
+            yield file_paths[0], ["Chunk"]
+            raise RuntimeError("parser crashed")
+
+        with patch.dict("sovereign_rag.ingest.__dict__", self._globals()):
+            with patch("sovereign_rag.ingest.parse_documents", side_effect=parsed):
+                with self.assertRaisesRegex(RuntimeError, "parser crashed"):
+                    index_documents("d")
+
+    @patch("sovereign_rag.ingest.os.path.exists", return_value=True)
+    @patch("sovereign_rag.ingest.find_source_files", return_value=["d/a.md"])
+    @patch("sovereign_rag.ingest._markdown_chunks", return_value=["Chunk 1", "Chunk 2"])
+    def test_stage_throughput_is_reported(self, mock_preprocess, mock_find_source_files, mock_exists):
+        with patch.dict("sovereign_rag.ingest.__dict__", self._globals()):
+            with patch("builtins.print") as mock_print:
+                index_documents("d")
+
+        messages = [str(c.args[0]) for c in mock_print.call_args_list]
+        for stage in ("parse", "embed", "write"):
+            self.assertTrue(any(f"{stage}: 1 items, 2 chunks" in m for m in messages), stage)
+        self.assertTrue(any("Bottleneck stage" in m for m in messages))
+
+    @patch("sovereign_rag.ingest.os.path.exists", return_value=True)
+    @patch("sovereign_rag.ingest.find_source_files", return_value=["d/a.md"])
+    @patch("sovereign_rag.ingest._markdown_chunks", return_value=["Cached chunk", "New chunk"])
+    def test_embedding_cache_skips_known_chunks(self, mock_preprocess, mock_find_source_files, mock_exists):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = EmbeddingCache(cache_dir, "m")
+            cache.put_many(["Cached  chunk"], [[0.5]])
+
+            with patch.dict("sovereign_rag.ingest.__dict__", self._globals()):
+                index_documents("d", embedding_cache=cache)
+
+        self.model.encode.assert_called_once_with(["New chunk"], batch_size=32, show_progress_bar=False)
+        embeddings = [list(map(float, e)) for e in self.collection.add.call_args_list[0].kwargs["embeddings"]]
+        self.assertEqual(embeddings, [[0.5]])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_stage_stats_summary(self):
+        stats = StageStats("embed")
+        stats.record(2.0, chunks=100)
+        self.assertEqual(stats.summary(), "embed: 1 items, 100 chunks, 2.00s busy (50.0 chunks/s)")
+
+
+class TestIncrementalIndexing(unittest.TestCase):
+    """Test manifest-driven incremental indexing."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.docs_dir = os.path.join(self.tmp.name, "docs")
+        os.makedirs(self.docs_dir)
+        self.manifest_path = os.path.join(self.tmp.name, "chroma_db", "ingest_manifest.json")
+        self.model = MagicMock()
+        self.model.encode.side_effect = lambda batch, **kwargs: [[0.1] for _ in batch]
+        self.collection = MagicMock()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, name, text):
+        with open(os.path.join(self.docs_dir, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def _index(self, **kwargs):
+        with patch.dict("sovereign_rag.ingest.__dict__", {"model": self.model, "collection": self.collection}):
+            with patch("sovereign_rag.ingest._markdown_chunks", side_effect=lambda path, **kw: ["Chunk"]) as pre:
+                index_documents(self.docs_dir, model_name="m", manifest_path=self.manifest_path, **kwargs)
+        return pre
+
+    def test_unchanged_files_are_skipped(self):
+        self._write("a.md", "alpha")
+        self._write("b.md", "beta")
+        self._index()
+        self.collection.reset_mock()
+
+        preprocess = self._index()
+
+        preprocess.assert_not_called()
+        self.collection.add.assert_not_called()
+        self.collection.delete.assert_not_called()
+        self.assertEqual(sorted(load_manifest(self.manifest_path)["files"]), ["a.md", "b.md"])
+
+    def test_changed_file_chunks_are_replaced(self):
+        self._write("a.md", "alpha")
+        self._write("b.md", "beta")
+        self._index()
+        self.collection.reset_mock()
+        self._write("b.md", "beta v2")
+
+        preprocess = self._index()
+
+        self.assertEqual([c.args[0] for c in preprocess.call_args_list], [os.path.join(self.docs_dir, "b.md")])
+        self.collection.delete.assert_called_once_with(where={"source": "b.md"})
+        self.assertEqual(self.collection.add.call_args.kwargs["ids"], ["b.md_0"])
+
+    def test_changed_chunking_parameters_reindex(self):
+        self._write("a.md", "alpha")
+        self._index()
+
+        preprocess = self._index(chunk_size_chars=900)
+
+        preprocess.assert_called_once()
+        with open(self.manifest_path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["files"]["a.md"]["chunk_size_chars"], 900)
+
+    def test_deleted_file_chunks_are_removed(self):
+        self._write("a.md", "alpha")
+        self._write("b.md", "beta")
+        self._index()
+        self.collection.reset_mock()
+        os.remove(os.path.join(self.docs_dir, "a.md"))
+
+        self._index()
+
+        self.collection.delete.assert_called_once_with(where={"source": "a.md"})
+        self.assertEqual(list(load_manifest(self.manifest_path)["files"]), ["b.md"])
+
+    def test_file_failing_mid_stream_is_retried_next_run(self):
+        self._write("a.pdf", "alpha")
+
+        def pages(path, **kwargs):
+            yield "Chunk"
+            raise RuntimeError("corrupt page")
+
+        with patch.dict("sovereign_rag.ingest.__dict__", {"model": self.model, "collection": self.collection}):
+            with patch("sovereign_rag.ingest.iter_pdf_chunks", side_effect=pages):
+                with patch("builtins.print") as mock_print:
+                    index_documents(self.docs_dir, model_name="m", manifest_path=self.manifest_path)
+
+        messages = " ".join(str(c.args[0]) for c in mock_print.call_args_list)
+        self.assertIn("corrupt page", messages)
+        self.assertEqual(self.collection.add.call_args.kwargs["ids"], ["a.pdf_0"])
+        self.assertEqual(load_manifest(self.manifest_path)["files"], {})
+
+    def test_failed_write_is_retried_next_run(self):
+        self._write("a.md", "alpha")
+        self.collection.add.side_effect = ValueError("write rejected")
+        with patch("builtins.print"):
+            self._index()
+        self.assertEqual(load_manifest(self.manifest_path)["files"], {})
+
+        self.collection.add.side_effect = None
+        preprocess = self._index()
+
+        preprocess.assert_called_once()
+        self.assertIn("a.md", load_manifest(self.manifest_path)["files"])
+
+    def test_failed_write_in_an_earlier_flush_keeps_the_file_out_of_the_manifest(self):
+        self._write("a.md", "alpha")
+        self._write("b.md", "beta")
+
+        def add(ids, **kwargs):
+            if "a.md_1" in ids:
+                raise ValueError("write rejected")
+
+        self.collection.add.side_effect = add
+        chunks = {"a.md": ["A0", "A1", "A2"], "b.md": ["B0"]}
+        with patch.dict("sovereign_rag.ingest.__dict__", {"model": self.model, "collection": self.collection}):
+            with patch("sovereign_rag.ingest._max_write_batch_size", return_value=2):
+                with patch(
+                    "sovereign_rag.ingest._markdown_chunks",
+                    side_effect=lambda path, **kw: chunks[os.path.basename(path)],
+                ):
+                    with patch("builtins.print"):
+                        index_documents(self.docs_dir, model_name="m", manifest_path=self.manifest_path)
+
+        calls = [c.kwargs["ids"] for c in self.collection.add.call_args_list]
+        # The second flush, carrying a.md's last chunk, succeeds; the first lost a.md_1.
+        self.assertEqual(calls, [["a.md_0", "a.md_1"], ["a.md_0"], ["a.md_1"], ["a.md_2", "b.md_0"]])
+        self.assertEqual(list(load_manifest(self.manifest_path)["files"]), ["b.md"])
+
+    def test_files_without_chunks_are_recorded_and_skipped_next_run(self):
+        self._write("empty.md", "")
+        with patch.dict("sovereign_rag.ingest.__dict__", {"model": self.model, "collection": self.collection}):
+            with patch("sovereign_rag.ingest._markdown_chunks", return_value=[]) as preprocess:
+                with patch("builtins.print"):
+                    index_documents(self.docs_dir, model_name="m", manifest_path=self.manifest_path)
+                    index_documents(self.docs_dir, model_name="m", manifest_path=self.manifest_path)
+
+        preprocess.assert_called_once()
+        self.assertEqual(load_manifest(self.manifest_path)["files"]["empty.md"]["chunks"], 0)
+        self.collection.add.assert_not_called()
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "worker patching relies on fork")
+    @patch("sovereign_rag.ingest.spacy.load", side_effect=blank_tagged_nlp)
+    def test_files_that_fail_to_parse_in_workers_are_retried_next_run(self, mock_load):
+        self._write("ok.md", "# Guide\n\nAlways validate the input that users submit to the server.\n")
+        with open(os.path.join(self.docs_dir, "broken.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4 garbage")
+        nlp = blank_tagged_nlp()
+
+        for _ in range(2):
+            with patch.dict(
+                "sovereign_rag.ingest.__dict__", {"model": self.model, "collection": self.collection, "nlp": nlp}
+            ):
+                with patch("builtins.print"):
+                    index_documents(self.docs_dir, model_name="m", manifest_path=self.manifest_path, workers=2)
+            # Only the file that parsed is recorded, so the broken one is parsed, and its old chunks removed, again.
+            self.assertEqual(list(load_manifest(self.manifest_path)["files"]), ["ok.md"])
+
+        self.collection.delete.assert_called_with(where={"source": "broken.pdf"})
+
+
+class TestLoadNlp(unittest.TestCase):
+    """Test spaCy pipeline profiles."""
+
+    @patch("sovereign_rag.ingest.spacy.load")
+    def test_full_profile_loads_complete_pipeline(self, mock_load):
+        load_nlp("full")
+        mock_load.assert_called_once_with("en_core_web_sm")
+
+    @patch("sovereign_rag.ingest.spacy.load")
+    def test_trimmed_profile_excludes_unused_components_and_enables_senter(self, mock_load):
+        mock_nlp = MagicMock(component_names=["tok2vec", "tagger", "senter", "attribute_ruler"], disabled=["senter"])
+        mock_load.return_value = mock_nlp
+
+        self.assertIs(load_nlp("trimmed"), mock_nlp)
+
+        mock_load.assert_called_once_with("en_core_web_sm", exclude=["parser", "ner", "lemmatizer"])
+        mock_nlp.enable_pipe.assert_called_once_with("senter")
+
+    def test_unknown_profile_is_rejected(self):
+        with self.assertRaises(ValueError):
+            load_nlp("tiny")
+
+    @unittest.skipUnless(spacy.util.is_package("en_core_web_sm"), "en_core_web_sm is not installed")
+    def test_trimmed_profile_sentences_and_decisions_match_full(self):
+        """The senter must split passages like the parser does, and relevance must not change with it."""
+        passages = [
+            "Broken Access Control. Attackers can bypass authorization checks by modifying the URL. Page 12",
+            "Insecure Direct Object References\nValidate all input on a trusted server. 5 - • "
+            "Use parameterized queries to prevent SQL injection.",
+            "Cryptographic Failures and Sensitive Data Exposure. Do not store passwords in plain text; "
+            "hash them with a slow, salted algorithm such as Argon2. Rotate keys regularly.",
+        ]
+        full = load_nlp("full")
+        trimmed = load_nlp("trimmed")
+        self.assertNotIn("parser", trimmed.pipe_names)
+
+        for text in passages:
+            with self.subTest(text=text):
+                self.assertEqual(
+                    [(s.text, is_relevant_sentence(s)) for s in trimmed(text).sents],
+                    [(s.text, is_relevant_sentence(s)) for s in full(text).sents],
+                )
+
+
+class TestParseDocuments(unittest.TestCase):
+    """Test the (optionally parallel) parse stage."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.files = []
+        for i in range(4):
+            path = os.path.join(self.tmp.name, f"doc{i}.md")
+            sentences = " ".join(f"Sentence number {n} of document {i} explains access control." for n in range(40))
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"# Document {i}\n\n{sentences}\n")
+            self.files.append(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch("sovereign_rag.ingest.spacy.load", side_effect=blank_tagged_nlp)
+    def test_serial_parse_preserves_order(self, mock_load):
+        with patch.dict("sovereign_rag.ingest.__dict__", {"nlp": blank_tagged_nlp()}):
+            result = [(path, list(chunks)) for path, chunks in parse_documents(self.files, chunk_size_chars=400)]
+
+        self.assertEqual([path for path, _ in result], self.files)
+        self.assertTrue(all(chunks for _, chunks in result))
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "worker patching relies on fork")
+    @patch("sovereign_rag.ingest.spacy.load", side_effect=blank_tagged_nlp)
+    def test_parallel_parse_matches_serial(self, mock_load):
+        with patch.dict("sovereign_rag.ingest.__dict__", {"nlp": blank_tagged_nlp()}):
+            serial = [(path, list(chunks)) for path, chunks in parse_documents(self.files, 400, overlap_sents=2)]
+            parallel = list(parse_documents(self.files, chunk_size_chars=400, overlap_sents=2, workers=3))
+
+        self.assertEqual(parallel, serial)
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "worker patching relies on fork")
+    @patch("sovereign_rag.ingest.spacy.load", side_effect=blank_tagged_nlp)
+    def test_parse_errors_propagate_with_and_without_workers(self, mock_load):
+        broken = []
+        for name, data in (("broken.pdf", b"%PDF-1.4 garbage"), ("broken.md", b"\xff\xfe not utf-8")):
+            broken.append(os.path.join(self.tmp.name, name))
+            with open(broken[-1], "wb") as f:
+                f.write(data)
+        files = [self.files[0], *broken, self.files[1]]
+
+        def outcomes(workers):
+            results = []
+            for path, chunks in parse_documents(files, chunk_size_chars=400, workers=workers):
+                try:
+                    results.append((path, len(list(chunks))))
+                except Exception:
+                    results.append((path, "error"))
+            return results
+
+        with patch.dict("sovereign_rag.ingest.__dict__", {"nlp": blank_tagged_nlp()}):
+            serial, parallel = outcomes(1), outcomes(2)
+
+        self.assertEqual([outcome for _, outcome in serial][1:3], ["error", "error"])
+        self.assertEqual(parallel, serial)
+
+    def test_parallel_parse_bounds_files_in_flight(self):
+        files = [f"doc{i}.md" for i in range(10)]
+        submitted = []
+        executor = MagicMock()
+
+        def submit(fn, file_path, *args):
+            submitted.append(file_path)
+            future = MagicMock()
+            future.result.return_value = ([f"chunk of {file_path}"], {})
+            return future
+
+        executor.submit.side_effect = submit
+        with patch("sovereign_rag.ingest.ProcessPoolExecutor", return_value=executor):
+            ahead = [len(submitted) - position for position, _ in enumerate(parse_documents(files, workers=2))]
+
+        self.assertEqual(submitted, files)
+        self.assertLessEqual(max(ahead), 4)
+        executor.shutdown.assert_called_once_with(cancel_futures=True)
+
+
+class TestPageRangeParsing(unittest.TestCase):
+    """Test splitting one large PDF into page ranges."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pdf_path = os.path.join(self.tmp.name, "big.pdf")
+        doc = fitz.open()
+        for page in range(30):
+            text = " ".join(f"Page {page} sentence {n} explains access control." for n in range(6))
+            doc.new_page().insert_textbox(fitz.Rect(36, 36, 560, 800), text, fontsize=9)
+        doc.save(self.pdf_path)
+        doc.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch("sovereign_rag.ingest.PAGE_RANGE_SIZE", 4)
+    def test_page_ranges_match_serial_chunks(self):
+        with patch.dict("sovereign_rag.ingest.__dict__", {"nlp": blank_tagged_nlp()}):
+            serial = list(iter_pdf_chunks(self.pdf_path, chunk_size_chars=500, overlap_sents=2))
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                ranged = list(iter_pdf_chunks(self.pdf_path, chunk_size_chars=500, overlap_sents=2, executor=executor))
+
+        self.assertGreater(len(serial), 10)
+        self.assertEqual(ranged, serial)
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "worker patching relies on fork")
+    @patch("sovereign_rag.ingest.PAGE_RANGE_MIN_PAGES", 10)
+    @patch("sovereign_rag.ingest.PAGE_RANGE_SIZE", 7)
+    @patch("sovereign_rag.ingest.spacy.load", side_effect=blank_tagged_nlp)
+    def test_single_large_pdf_is_split_across_workers(self, mock_load):
+        with patch.dict("sovereign_rag.ingest.__dict__", {"nlp": blank_tagged_nlp()}):
+            serial = [list(chunks) for _, chunks in parse_documents([self.pdf_path], 500, overlap_sents=2)]
+            parallel = [list(chunks) for _, chunks in parse_documents([self.pdf_path], 500, overlap_sents=2, workers=2)]
+
+        self.assertEqual(parallel, serial)
 
 
 class TestFindSourceFiles(unittest.TestCase):
@@ -314,10 +873,11 @@ class TestRunIngest(unittest.TestCase):
     ):
         """Test successful run_ingest."""
         # Set up mocks
-        mock_collection = MagicMock()
+        mock_collection = MagicMock(metadata=None)
         mock_client = MagicMock()
         mock_client.get_or_create_collection.return_value = mock_collection
         mock_chroma_client.return_value = mock_client
+        mock_sentence_transformer.return_value.get_sentence_embedding_dimension.return_value = 384
 
         # Call the function
         result = run_ingest("test_dir", "test_model")
@@ -328,7 +888,22 @@ class TestRunIngest(unittest.TestCase):
         mock_sentence_transformer.assert_called_once_with("test_model")
         mock_chroma_client.assert_called_once_with(path="./chroma_db")
         mock_client.get_or_create_collection.assert_called_once_with("security_docs")
-        mock_index_documents.assert_called_once_with("test_dir")
+        mock_index_documents.assert_called_once_with(
+            "test_dir",
+            chunk_size_chars=1800,
+            overlap_sents=2,
+            embed_batch_size=32,
+            model_name="test_model",
+            manifest_path="./chroma_db/ingest_manifest.json",
+            workers=1,
+            nlp_profile="full",
+            embedding_cache=ANY,
+            token_budget=None,
+        )
+        # The embedding model and chunking parameters are recorded for query.
+        mock_collection.modify.assert_called_once_with(
+            metadata=EmbeddingProfile("test_model", 384, False).to_metadata()
+        )
 
     @patch("sovereign_rag.ingest.spacy.load")
     def test_run_ingest_error(self, mock_spacy_load):
@@ -344,5 +919,39 @@ class TestRunIngest(unittest.TestCase):
         mock_spacy_load.assert_called_once_with("en_core_web_sm")
 
 
+class TestRecordEmbeddingProfile(unittest.TestCase):
+    """Test how ingest records the embedding model on the collection."""
+
+    def setUp(self):
+        self.profile = EmbeddingProfile("all-MiniLM-L6-v2", 384, True)
+        self.collection = MagicMock(metadata={"hnsw:space": "l2", **self.profile.to_metadata()})
+        patcher = patch("sovereign_rag.ingest.collection", self.collection, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_new_chunking_parameters_update_the_profile(self):
+        self.collection.count.return_value = 10
+        profile = EmbeddingProfile("all-MiniLM-L6-v2", 384, True, chunk_size_chars=1200)
+
+        record_embedding_profile(profile)
+
+        self.collection.modify.assert_called_once_with(metadata={"hnsw:space": "l2", **profile.to_metadata()})
+
+    def test_another_model_is_refused_while_the_collection_has_chunks(self):
+        self.collection.count.return_value = 10
+
+        with self.assertRaisesRegex(EmbeddingMismatchError, "Delete ./chroma_db to re-index with all-mpnet-base-v2"):
+            record_embedding_profile(EmbeddingProfile("all-mpnet-base-v2", 768, True))
+        self.collection.modify.assert_not_called()
+
+    def test_another_model_may_fill_an_empty_collection(self):
+        self.collection.count.return_value = 0
+        profile = EmbeddingProfile("all-mpnet-base-v2", 768, True)
+
+        record_embedding_profile(profile)
+
+        self.collection.modify.assert_called_once_with(metadata={"hnsw:space": "l2", **profile.to_metadata()})
+
+
 if __name__ == "__main__":
     unittest.main()
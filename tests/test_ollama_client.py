@@ -0,0 +1,286 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sovereign_rag.ollama_client import (
+    EvalTimings,
+    OllamaClient,
+    OllamaError,
+    OllamaPool,
+    StreamInterrupted,
+    avoiding,
+    parse_endpoints,
+)
+
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Answers /api/generate like Ollama does, streamed or not."""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.path, payload))
+        time.sleep(getattr(self.server, "delay", 0))
+        if getattr(self.server, "failing", False):
+            self._send({"error": "out of memory"}, 500)
+            return
+        if payload["stream"] and payload["model"] != "missing":
+            self._stream(payload)
+            return
+        if payload["model"] == "missing":
+            body, status = {"error": "model 'missing' not found"}, 404
+        else:
+            body, status = (
+                {
+                    "model": payload["model"],
+                    "response": f"analysis of {payload['prompt']}",
+                    "done": True,
+                    "prompt_eval_count": 12,
+                    "prompt_eval_duration": 250_000_000,
+                    "eval_count": 40,
+                    "eval_duration": 2_000_000_000,
+                },
+                200,
+            )
+        self._send(body, status)
+
+    def _send(self, body, status):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, payload):
+        chunks = [{"response": "analysis "}, {"response": f"of {payload['prompt']}"}]
+        if payload["model"] == "crashing":
+            chunks.append({"error": "model runner has unexpectedly stopped"})
+        else:
+            chunks.append({"response": "", "done": True, "prompt_eval_count": 12, "prompt_eval_duration": 250_000_000})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(json.dumps({"model": payload["model"], **chunk}).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeOllamaHandler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class TestOllamaClient(unittest.TestCase):
+    """Test the thin Ollama client against a local fake server."""
+
+    def setUp(self):
+        self.server, url = _start_server()
+        self.url = f"{url}/"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_complete_sends_model_prompt_and_options(self):
+        client = OllamaClient(self.url, "mistral:7b-instruct", options={"num_ctx": 8192})
+
+        completion = client.complete("code")
+
+        self.assertEqual(completion.text, "analysis of code")
+        self.assertTrue(completion.raw["done"])
+        self.assertEqual(
+            self.server.requests,
+            [
+                (
+                    "/api/generate",
+                    {"model": "mistral:7b-instruct", "prompt": "code", "stream": False, "options": {"num_ctx": 8192}},
+                )
+            ],
+        )
+
+    def test_system_message_keep_alive_and_timings(self):
+        client = OllamaClient(self.url, "mistral:7b-instruct", keep_alive="30m")
+
+        completion = client.complete("code", system="You are a security analyst.")
+
+        self.assertEqual(
+            self.server.requests[0][1],
+            {
+                "model": "mistral:7b-instruct",
+                "prompt": "code",
+                "stream": False,
+                "system": "You are a security analyst.",
+                "keep_alive": "30m",
+            },
+        )
+        timings = EvalTimings.from_response(completion.raw)
+        self.assertEqual(timings, EvalTimings(12, 0.25, 40, 2.0, 0.0))
+        self.assertEqual((timings + timings).prompt_tokens, 24)
+        self.assertIsNone(EvalTimings.from_response({"response": "cached elsewhere"}))
+
+    def test_stream_complete_yields_each_chunk(self):
+        client = OllamaClient(self.url, "mistral:7b-instruct")
+
+        chunks = list(client.stream_complete("code", system="instructions"))
+
+        self.assertEqual([c.delta for c in chunks], ["analysis ", "of code", ""])
+        self.assertEqual(chunks[-1].text, "analysis of code")
+        self.assertEqual(EvalTimings.from_response(chunks[-1].raw).prompt_tokens, 12)
+        self.assertTrue(self.server.requests[0][1]["stream"])
+        self.assertEqual(self.server.requests[0][1]["system"], "instructions")
+
+    def test_stream_errors_raise_ollama_error(self):
+        with self.assertRaisesRegex(OllamaError, "unexpectedly stopped"):
+            list(OllamaClient(self.url, "crashing").stream_complete("code"))
+        with self.assertRaisesRegex(OllamaError, "HTTP 404"):
+            list(OllamaClient(self.url, "missing").stream_complete("code"))
+
+    def test_http_errors_raise_ollama_error(self):
+        client = OllamaClient(self.url, "missing")
+
+        with self.assertRaisesRegex(OllamaError, "HTTP 404.*not found"):
+            client.complete("code")
+
+    def test_unreachable_server_raises_ollama_error(self):
+        self.server.shutdown()
+        self.server.server_close()
+        client = OllamaClient(self.url, "mistral:7b-instruct", request_timeout=2)
+
+        with self.assertRaisesRegex(OllamaError, "Cannot reach Ollama"):
+            client.complete("code")
+
+
+class TestOllamaPool(unittest.TestCase):
+    """Test load balancing and failover over several local fake servers."""
+
+    def setUp(self):
+        self.servers, self.urls = zip(*(_start_server() for _ in range(2)), strict=True)
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def _pool(self, model="mistral:7b-instruct", **kwargs):
+        return OllamaPool([OllamaClient(url, model) for url in self.urls], **kwargs)
+
+    def test_parse_endpoints(self):
+        self.assertEqual(parse_endpoints("http://a:11434, http://b:11434,"), ["http://a:11434", "http://b:11434"])
+        self.assertEqual(parse_endpoints(["http://a:11434"]), ["http://a:11434"])
+
+    def test_requests_go_to_the_least_busy_endpoint(self):
+        for server in self.servers:
+            server.delay = 0.3
+        pool = self._pool()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pool.complete("code").text)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["analysis of code"] * 4)
+        self.assertEqual([len(server.requests) for server in self.servers], [2, 2])
+        self.assertEqual([e.outstanding for e in pool.endpoints], [0, 0])
+
+    def test_failed_requests_move_to_another_endpoint_until_it_is_unhealthy(self):
+        self.servers[0].failing = True
+        pool = self._pool(max_failures=2)
+
+        texts = [pool.complete("code").text for _ in range(3)]
+        # With the second endpoint busy, the first is tried again and fails a second time.
+        pool.endpoints[1].outstanding = 1
+        texts.append(pool.complete("code").text)
+        pool.endpoints[1].outstanding = 0
+        streamed = list(pool.stream_complete("code"))
+
+        self.assertEqual(texts, ["analysis of code"] * 4)
+        self.assertEqual(streamed[-1].text, "analysis of code")
+        # Endpoints that just failed are avoided while another is free; two failures mark one unhealthy.
+        self.assertEqual(len(self.servers[0].requests), 2)
+        self.assertEqual(len(self.servers[1].requests), 5)
+        self.assertEqual(pool.healthy_count(), 1)
+        pool.endpoints[1].outstanding = 1
+        pool.complete("code")
+        self.assertEqual(len(self.servers[0].requests), 2)
+        self.assertEqual(
+            pool.summary(),
+            [f"{self.urls[0]}: 2 requests, 2 failed, unhealthy", f"{self.urls[1]}: 6 requests, 0 failed, healthy"],
+        )
+
+    def test_unhealthy_endpoints_get_another_chance_after_the_cooldown(self):
+        self.servers[0].failing = True
+        pool = self._pool(max_failures=1, cooldown=0.2)
+        pool.complete("code")
+        self.servers[0].failing = False
+
+        time.sleep(0.3)
+        pool.endpoints[1].outstanding = 1
+        pool.complete("code")
+
+        self.assertEqual(len(self.servers[0].requests), 2)
+        self.assertEqual(pool.healthy_count(), 2)
+
+    def test_errors_when_every_endpoint_fails(self):
+        for server in self.servers:
+            server.failing = True
+        pool = self._pool(max_failures=1)
+
+        with self.assertRaisesRegex(OllamaError, "No Ollama endpoint.*HTTP 500"):
+            pool.complete("code")
+        with self.assertRaisesRegex(OllamaError, "marked unhealthy"):
+            list(pool.stream_complete("code"))
+
+    def test_rejected_requests_are_neither_retried_nor_held_against_the_endpoint(self):
+        pool = self._pool(model="missing", max_failures=1)
+
+        for _ in range(3):
+            with self.assertRaisesRegex(OllamaError, "HTTP 404") as raised:
+                pool.complete("code")
+            self.assertTrue(raised.exception.rejected)
+        with self.assertRaisesRegex(OllamaError, "HTTP 404"):
+            list(pool.stream_complete("code"))
+
+        self.assertEqual(sum(len(server.requests) for server in self.servers), 4)
+        self.assertEqual([e.failures for e in pool.endpoints], [0, 0])
+        self.assertEqual(pool.healthy_count(), 2)
+        self.assertFalse(OllamaError("Ollama returned HTTP 429", status=429).rejected)
+        self.assertFalse(OllamaError("Cannot reach Ollama").rejected)
+
+    def test_stream_failing_midway_is_not_retried(self):
+        pool = self._pool(model="crashing")
+
+        with self.assertRaisesRegex(StreamInterrupted, "unexpectedly stopped"):
+            list(pool.stream_complete("code"))
+
+        self.assertEqual(sum(len(server.requests) for server in self.servers), 1)
+        self.assertEqual(sum(e.failures for e in pool.endpoints), 1)
+
+    def test_a_broken_off_answer_is_started_over_on_another_endpoint(self):
+        pool = OllamaPool([OllamaClient(self.urls[0], "crashing"), OllamaClient(self.urls[1], "mistral:7b-instruct")])
+
+        with self.assertRaises(StreamInterrupted) as raised:
+            list(pool.stream_complete("code"))
+        self.assertEqual(raised.exception.endpoint, self.urls[0])
+        # The other endpoint is busy, so it would not be picked on load alone.
+        pool.endpoints[1].outstanding = 1
+        with avoiding([raised.exception.endpoint]):
+            streamed = list(pool.stream_complete("code"))
+            # With no other healthy endpoint left, an avoided one is still used.
+            pool.endpoints[1].unhealthy_until = time.monotonic() + 60
+            with self.assertRaises(StreamInterrupted):
+                list(pool.stream_complete("code"))
+
+        self.assertEqual(streamed[-1].text, "analysis of code")
+        self.assertEqual([len(server.requests) for server in self.servers], [2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import argparse
+import unittest
+
+from sovereign_rag.prompt_budget import PromptBudget, parse_num_ctx, smallest_num_ctx
+
+
+class TestNumCtx(unittest.TestCase):
+    """Test --num-ctx parsing and automatic sizing."""
+
+    def test_parse_num_ctx(self):
+        self.assertEqual(parse_num_ctx("8192"), 8192)
+        self.assertEqual(parse_num_ctx("auto"), "auto")
+        for value in ("0", "big"):
+            with self.subTest(value=value), self.assertRaises(argparse.ArgumentTypeError):
+                parse_num_ctx(value)
+
+    def test_smallest_num_ctx_reserves_room_for_the_answer(self):
+        self.assertEqual(smallest_num_ctx(1100), 4096)
+        self.assertEqual(smallest_num_ctx(1000, output_tokens=512), 2048)
+        self.assertEqual(smallest_num_ctx(7168), 8192)
+        self.assertEqual(smallest_num_ctx(100_000), 32768)
+
+
+class TestPromptBudget(unittest.TestCase):
+    """Test fitting code and reference context into a context window."""
+
+    def test_without_a_window_prompts_are_only_measured(self):
+        blocks = ["a" * 300, "b" * 300]
+
+        kept, usage = PromptBudget(chars_per_token=3).fit("i" * 30, "c" * 3000, blocks)
+
+        self.assertEqual(kept, blocks)
+        self.assertEqual((usage.instructions, usage.code, usage.context), (10, 1000, 201))
+        self.assertFalse(usage.trimmed)
+
+    def test_lowest_ranked_context_is_dropped_first(self):
+        budget = PromptBudget(num_ctx=700, output_tokens=200, chars_per_token=1)
+        blocks = ["a" * 150, "b" * 150, "c" * 150]
+
+        kept, usage = budget.fit("i" * 50, "c" * 150, blocks, separator="")
+
+        self.assertEqual(kept, ["a" * 150, "b" * 150])
+        self.assertEqual(usage.total, 500)
+        self.assertEqual((usage.dropped_chunks, usage.truncated_chunks), (1, 0))
+
+    def test_the_last_chunk_that_partly_fits_is_truncated(self):
+        budget = PromptBudget(num_ctx=700, output_tokens=200, chars_per_token=1)
+
+        kept, usage = budget.fit("i" * 50, "c" * 100, ["a" * 250, "b" * 250], separator="")
+
+        self.assertEqual(kept, ["a" * 250, "b" * 100])
+        self.assertEqual(usage.total, 500)
+        self.assertEqual((usage.dropped_chunks, usage.truncated_chunks), (0, 1))
+
+    def test_max_code_chars_leaves_room_for_instructions_context_and_answer(self):
+        self.assertIsNone(PromptBudget().max_code_chars(100))
+        self.assertEqual(PromptBudget(4096, output_tokens=1024, chars_per_token=3).max_code_chars(400), 7248)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,19 +1,57 @@
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import MagicMock, mock_open, patch
-
+from unittest.mock import ANY, MagicMock, mock_open, patch
+
+from sovereign_rag.analysis_cache import AnalysisCache
+from sovereign_rag.code_segments import changed_segments, whole_file_segment
+from sovereign_rag.embedding_profile import DEFAULT_EMBEDDING_MODEL, EmbeddingMismatchError, EmbeddingProfile
+from sovereign_rag.ollama_client import (
+    Completion,
+    EvalTimings,
+    OllamaClient,
+    OllamaError,
+    OllamaPool,
+    StreamInterrupted,
+)
+from sovereign_rag.prompt_budget import PromptBudget, smallest_num_ctx
 from sovereign_rag.query import (
+    SCREEN_OUTPUT_TOKENS,
+    SCREEN_SYSTEM_PROMPT,
+    SYSTEM_PROMPT,
+    RetrievedChunk,
+    _init_lean_backend,
+    _init_llama_index_backend,
+    _LlamaIndexLLM,
     _run_git,
     add_file_to_html,
+    analyze_files,
+    build_pack_prompts,
+    create_llm,
     create_output_directory,
     filter_to_changed_files,
+    find_changed_hunks,
     find_files_with_extension,
     generate_html_footer,
     generate_html_header,
+    is_suspicious,
+    latency_stats,
+    load_embedding_profile,
+    plan_packs,
     process_file,
+    retrieve_for_files,
+    retrieve_for_segments,
     run_query,
 )
 
 
+class Normalize:
+    """Stands in for the Normalize module at the end of a SentenceTransformer pipeline."""
+
+
 class TestCreateOutputDirectory(unittest.TestCase):
     """Test the create_output_directory function."""
 
@@ -158,6 +196,21 @@ class TestChangedFileFiltering(unittest.TestCase):
         self.assertEqual(result, ["/repo/src/file1.py"])
         mock_find_changed_files.assert_called_once_with("/repo/src", changed_base="HEAD", staged=True)
 
+    @patch("sovereign_rag.query._run_git")
+    @patch("sovereign_rag.query.find_git_root", return_value="/repo")
+    def test_find_changed_hunks_reads_the_diff_of_the_same_versions(self, mock_find_git_root, mock_run_git):
+        mock_run_git.return_value = ["+++ b/src/app.py", "@@ -12,2 +12,3 @@", "-a", "-b", "+a", "+b", "+c"]
+
+        hunks = find_changed_hunks("/repo/src", changed_base="origin/main")
+        find_changed_hunks("/repo/src", staged=True)
+
+        self.assertEqual(hunks, {"/repo/src/app.py": [(12, 14)]})
+        args = mock_run_git.call_args_list[0].args[0]
+        self.assertEqual(args[args.index("diff") + 1], "-U0")
+        self.assertEqual(args[-3:], ["origin/main", "--", "src"])
+        self.assertEqual(mock_run_git.call_args_list[1].args[0][-3:], ["--cached", "--", "src"])
+        self.assertEqual(mock_run_git.call_args.args[1], "/repo")
+
     @patch("sovereign_rag.query.os.walk")
     def test_find_files_with_extension_with_dot(self, mock_walk):
         """Test finding files with a specific extension that includes a dot."""
@@ -179,8 +232,8 @@ class TestProcessFile(unittest.TestCase):
     """Test the process_file function."""
 
     @patch("sovereign_rag.query.open", new_callable=mock_open, read_data="Test code")
-    @patch("sovereign_rag.query.Settings")
-    def test_process_file_success(self, mock_settings, mock_file_open):
+    @patch("sovereign_rag.query.llm")
+    def test_process_file_success(self, mock_llm, mock_file_open):
         """Test successful processing of a file."""
         # Set up mocks
         mock_index = MagicMock()
@@ -193,7 +246,7 @@ class TestProcessFile(unittest.TestCase):
 
         mock_response = MagicMock()
         mock_response.text = "Test analysis result"
-        mock_settings.llm.complete.return_value = mock_response
+        mock_llm.complete.return_value = mock_response
 
         html_content = []
 
@@ -207,13 +260,35 @@ class TestProcessFile(unittest.TestCase):
         mock_file_open.assert_called_once_with("test_file.py", encoding="utf-8", errors="replace")
         mock_index.as_retriever.assert_called_once_with(similarity_top_k=3)
         mock_retriever.retrieve.assert_called_once()
-        mock_settings.llm.complete.assert_called_once()
+        mock_llm.complete.assert_called_once()
         self.assertEqual(len(html_content), 1)
         self.assertIn("test_file.py", html_content[0])
         self.assertIn("Test analysis result", html_content[0])
         # The retrieved source document should be cited in the report.
         self.assertIn("owasp_top_10.md", html_content[0])
 
+    @patch("sovereign_rag.query.open", new_callable=mock_open, read_data="Test code")
+    @patch("sovereign_rag.query.llm")
+    def test_process_file_reuses_cached_analysis(self, mock_llm, mock_file_open):
+        """A second run over the same file, model and retrieved chunks skips the LLM."""
+        mock_node = MagicMock(node_id="owasp_top_10.md_0", metadata={"source": "owasp_top_10.md"})
+        mock_node.get_content.return_value = "Test context"
+        mock_index = MagicMock()
+        mock_index.as_retriever.return_value.retrieve.return_value = [mock_node]
+        mock_llm.complete.return_value = MagicMock(text="Cached analysis result")
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = AnalysisCache(cache_dir)
+            first, second = [], []
+            process_file("test_file.py", mock_index, "m", "url", "/out", first, num_ctx=4096, cache=cache)
+            process_file("test_file.py", mock_index, "m", "url", "/out", second, num_ctx=4096, cache=cache)
+            process_file("test_file.py", mock_index, "m", "url", "/out", [], num_ctx=8192, cache=cache)
+
+        self.assertEqual(mock_llm.complete.call_count, 2)
+        self.assertEqual(second, first)
+        self.assertIn("owasp_top_10.md", second[0])
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
     @patch("sovereign_rag.query.open", new_callable=mock_open)
     def test_process_file_error(self, mock_file_open):
         """Test error handling in process_file."""
@@ -233,37 +308,488 @@ class TestProcessFile(unittest.TestCase):
         self.assertEqual(len(html_content), 0)
 
 
+class TestRetrieveForFiles(unittest.TestCase):
+    """Test batched retrieval for all files at once."""
+
+    def test_one_encode_and_one_search_for_all_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for name in ("a.py", "b.py"):
+                paths.append(os.path.join(tmp, name))
+                with open(paths[-1], "w", encoding="utf-8") as f:
+                    f.write(f"print('{name}')")
+            missing = os.path.join(tmp, "missing.py")
+
+            embed_batch = MagicMock(side_effect=lambda texts: [[0.1, 0.2] for _ in texts])
+            collection = MagicMock()
+            collection.query.return_value = {
+                "ids": [["owasp.md_0", "owasp.md_1"], ["asvs.md_4"]],
+                "documents": [["Use parameterized queries.", "Escape output."], ["Validate input."]],
+                "metadatas": [[{"source": "owasp.md"}, {"source": "owasp.md"}], [{"source": "asvs.md"}]],
+                "distances": [[0.1, 0.2], [0.3]],
+            }
+
+            retrieved = retrieve_for_files([paths[0], missing, paths[1]], collection, embed_batch)
+
+        embed_batch.assert_called_once()
+        queries = embed_batch.call_args.args[0]
+        self.assertEqual(len(queries), 2)
+        self.assertIn("print('a.py')", queries[0])
+        collection.query.assert_called_once_with(
+            query_embeddings=[[0.1, 0.2], [0.1, 0.2]], n_results=3, include=["documents", "metadatas", "distances"]
+        )
+        self.assertIsNone(retrieved[1])
+        self.assertEqual([n.node_id for n in retrieved[0]], ["owasp.md_0", "owasp.md_1"])
+        self.assertEqual(retrieved[2][0].get_content(), "Validate input.")
+        self.assertEqual(retrieved[2][0].metadata, {"source": "asvs.md"})
+
+    @patch("sovereign_rag.query.open", new_callable=mock_open, read_data="Test code")
+    @patch("sovereign_rag.query.llm")
+    def test_process_file_uses_prefetched_nodes(self, mock_llm, mock_file_open):
+        mock_index = MagicMock()
+        mock_llm.complete.return_value = MagicMock(text="Analysis")
+        nodes = retrieve_for_files(
+            ["test_file.py"],
+            MagicMock(
+                query=MagicMock(
+                    return_value={"ids": [["owasp.md_0"]], "documents": [["Use TLS."]], "metadatas": [[None]]}
+                )
+            ),
+            lambda texts: [[0.0] for _ in texts],
+        )[0]
+        html_content = []
+
+        self.assertTrue(process_file("test_file.py", mock_index, "m", "url", "/out", html_content, nodes=nodes))
+
+        mock_index.as_retriever.assert_not_called()
+        self.assertIn("[Source: unknown source]\nUse TLS.", mock_llm.complete.call_args.args[0])
+
+    @patch("sovereign_rag.query.open", new_callable=mock_open, read_data="def a():\n    pass\n\n\ndef b():\n    pass\n")
+    @patch("sovereign_rag.query.llm")
+    def test_process_file_without_index_shares_nodes_across_segments(self, mock_llm, mock_file_open):
+        mock_llm.complete.return_value = MagicMock(text="Analysis")
+        nodes = retrieve_for_files(
+            ["app.py"],
+            MagicMock(
+                query=MagicMock(
+                    return_value={"ids": [["owasp.md_0"]], "documents": [["Use TLS."]], "metadatas": [[None]]}
+                )
+            ),
+            lambda texts: [[0.0] for _ in texts],
+        )[0]
+
+        self.assertTrue(process_file("app.py", None, "m", "url", "/out", [], nodes=nodes, max_segment_chars=20))
+
+        self.assertEqual(mock_llm.complete.call_count, 2)
+        for call in mock_llm.complete.call_args_list:
+            self.assertIn("Use TLS.", call.args[0])
+
+    def test_process_file_without_index_or_chunks_fails_the_file(self):
+        with patch("builtins.print") as mock_print:
+            self.assertFalse(process_file("app.py", None, "m", "url", "/out", []))
+
+        self.assertIn("Error processing app.py: no reference chunks", mock_print.call_args.args[0])
+
+    @patch("sovereign_rag.query.screen_llm")
+    @patch("sovereign_rag.query.llm")
+    def test_screening_model_clears_clean_segments_before_the_full_analysis(self, mock_llm, mock_screen_llm):
+        mock_screen_llm.complete.side_effect = lambda prompt, **kwargs: MagicMock(
+            text="SUSPICIOUS" if "os.system" in prompt else "Clean."
+        )
+        mock_llm.complete.return_value = MagicMock(text="Command injection", raw={})
+        safe, risky = whole_file_segment("x = 1\n"), whole_file_segment("os.system(cmd)\n")
+        safe.name, risky.name = "safe", "risky"
+        chunk = RetrievedChunk(node_id="owasp.md_0", text="Use TLS.", metadata={"source": "owasp.md"})
+        results, latencies = [], {"screen": [], "full": []}
+
+        with patch("builtins.print"):
+            for segments in ([(safe, [chunk])], [(safe, [chunk]), (risky, [chunk])]):
+                self.assertTrue(
+                    process_file(
+                        "app.py",
+                        None,
+                        "big",
+                        "url",
+                        "/out",
+                        None,
+                        segments=segments,
+                        results=results,
+                        screen_model="small",
+                        latencies=latencies,
+                    )
+                )
+
+        (_, clean, clean_sources, clean_tier), (_, mixed, _, mixed_tier) = results
+        self.assertEqual((clean_tier, clean_sources), ("screen", []))
+        self.assertEqual(clean, "No vulnerabilities detected. (Screened as clean by small.)")
+        self.assertEqual(mixed_tier, "full")
+        self.assertIn("[file safe (lines 1-1)]\nNo vulnerabilities detected. (Screened as clean by small.)", mixed)
+        self.assertIn("[file risky (lines 1-1)]\nCommand injection", mixed)
+        # The screening model sees only the code; the full model only the flagged segment, with its context.
+        screen_prompt = mock_screen_llm.complete.call_args_list[0]
+        self.assertEqual(screen_prompt.kwargs["system"], SCREEN_SYSTEM_PROMPT)
+        self.assertNotIn("Use TLS.", screen_prompt.args[0])
+        self.assertEqual(mock_llm.complete.call_count, 1)
+        self.assertIn("os.system(cmd)", mock_llm.complete.call_args.args[0])
+        self.assertEqual((len(latencies["screen"]), len(latencies["full"])), (3, 1))
+
+    def test_unclear_screening_answers_count_as_suspicious(self):
+        self.assertFalse(is_suspicious("CLEAN"))
+        self.assertFalse(is_suspicious(" clean.\n"))
+        self.assertTrue(is_suspicious("SUSPICIOUS"))
+        self.assertTrue(is_suspicious("Not clean: suspicious use of eval"))
+        self.assertTrue(is_suspicious("I cannot tell."))
+
+    def test_latency_stats(self):
+        self.assertEqual(latency_stats([]), {"requests": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0})
+        stats = latency_stats([float(s) for s in range(20, 0, -1)])
+        self.assertEqual(stats, {"requests": 20, "mean": 10.5, "p50": 11.0, "p95": 20.0, "max": 20.0})
+
+    @patch("sovereign_rag.query.llm")
+    def test_system_layout_keeps_a_stable_prefix_and_reports_timings(self, mock_llm):
+        raw = {"prompt_eval_count": 300, "prompt_eval_duration": 2 * 10**9, "eval_count": 50, "eval_duration": 10**9}
+        mock_llm.complete.return_value = MagicMock(text="Analysis", raw=raw)
+        chunk = RetrievedChunk(node_id="owasp.md_0", text="Use TLS.", metadata={"source": "owasp.md"})
+        timings = []
+
+        with tempfile.TemporaryDirectory() as tmp, patch("builtins.print") as mock_print:
+            for name in ("a.py", "b.py"):
+                path = os.path.join(tmp, name)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(f"print('{name}')\n")
+                segments = [(whole_file_segment(f"print('{name}')\n"), [chunk])]
+                process_file(path, None, "m", "url", "/out", [], segments=segments, timings=timings)
+            process_file(path, None, "m", "url", "/out", [], segments=segments, layout="inline")
+
+        system_messages = [c.kwargs.get("system") for c in mock_llm.complete.call_args_list]
+        self.assertEqual(system_messages[:2], [SYSTEM_PROMPT, SYSTEM_PROMPT])
+        self.assertNotIn("print(", SYSTEM_PROMPT)
+        # The per-file prompt carries the reference context first and the code last.
+        first_prompt = mock_llm.complete.call_args_list[0].args[0]
+        self.assertLess(first_prompt.index("[Source: owasp.md]\nUse TLS."), first_prompt.index("print('a.py')"))
+        # The inline layout is the original single prompt, without a system message.
+        self.assertIsNone(system_messages[2])
+        self.assertTrue(mock_llm.complete.call_args_list[2].args[0].lstrip().startswith("You are a software"))
+        self.assertEqual([t.prompt_seconds for _, t in timings], [2.0, 2.0])
+        self.assertTrue(any("prompt eval 300 tokens in 2.00s" in str(c.args[0]) for c in mock_print.call_args_list))
+
+    @patch("sovereign_rag.query.llm")
+    def test_large_files_are_retrieved_and_analyzed_per_segment(self, mock_llm):
+        functions = [f"def {name}(q):\n" + "    q = q.strip()\n" * 10 + "    return q\n\n\n" for name in ("a", "b")]
+        collection = MagicMock()
+        collection.query.side_effect = lambda query_embeddings, **kwargs: {
+            "ids": [[f"owasp.md_{i}"] for i in range(len(query_embeddings))],
+            "documents": [["Use TLS."]] * len(query_embeddings),
+            "metadatas": [[{"source": "owasp.md"}]] * len(query_embeddings),
+        }
+        mock_llm.complete.side_effect = lambda prompt, **kwargs: MagicMock(
+            text=f"analysis {mock_llm.complete.call_count}"
+        )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, "small.py"), os.path.join(tmp, "large.py")]
+            for path, code in zip(paths, ["print('hi')\n", "".join(functions)], strict=True):
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(code)
+            embed_batch = MagicMock(side_effect=lambda texts: [[0.0] for _ in texts])
+
+            retrieved = retrieve_for_segments(paths, collection, embed_batch, max_segment_chars=300)
+
+            cache = AnalysisCache(os.path.join(tmp, "cache"))
+            html_content = []
+            process_file(paths[1], None, "m", "url", "/out", html_content, cache=cache, segments=retrieved[1])
+            process_file(paths[1], None, "m", "url", "/out", [], cache=cache, segments=retrieved[1])
+
+        # One encode and one search cover the small file and both segments of the large one.
+        self.assertEqual(len(embed_batch.call_args.args[0]), 3)
+        collection.query.assert_called_once()
+        self.assertEqual([segment.name for segment, _ in retrieved[0]], ["file"])
+        self.assertEqual([segment.name for segment, _ in retrieved[1]], ["a", "b"])
+        self.assertEqual([chunks[0].node_id for _, chunks in retrieved[1]], ["owasp.md_1", "owasp.md_2"])
+        # Each segment gets its own prompt naming its lines; the analyses merge into one report entry.
+        self.assertEqual(mock_llm.complete.call_count, 2)
+        self.assertIn("function a (lines 1-12) of", mock_llm.complete.call_args_list[0].args[0])
+        self.assertEqual(len(html_content), 1)
+        self.assertIn(
+            "[function a (lines 1-12)]\nanalysis 1\n\n[function b (lines 13-28)]\nanalysis 2", html_content[0]
+        )
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    @patch("sovereign_rag.query.llm")
+    def test_hunk_scoped_segments_name_their_lines_in_prompt_and_report(self, mock_llm):
+        code = "".join(f"def {name}(q):\n    return q\n\n\n" for name in ("a", "b", "c"))
+        mock_llm.complete.return_value = Completion("Missing input validation on line 6.")
+        chunk = RetrievedChunk(node_id="owasp.md_0", text="Validate input.", metadata={"source": "owasp.md"})
+        segments = [(segment, [chunk]) for segment in changed_segments(code, "app.py", [(6, 6)])]
+        results = []
+
+        with patch("builtins.print"):
+            process_file("app.py", None, "m", "url", "/out", None, segments=segments, results=results)
+
+        self.assertEqual([segment.text for segment, _ in segments], ["\n\ndef b(q):\n    return q\n"])
+        self.assertIn("function b (lines 3-6, changed 6) of app.py", mock_llm.complete.call_args.args[0])
+        self.assertNotIn("def a(", mock_llm.complete.call_args.args[0])
+        self.assertEqual(results[0][1], "[function b (lines 3-6, changed 6)]\nMissing input validation on line 6.")
+
+
+class TestAnalyzeFiles(unittest.TestCase):
+    """Test concurrent per-file analysis."""
+
+    @patch("sovereign_rag.query.process_file")
+    def test_concurrent_results_keep_input_order(self, mock_process_file):
+        files = [f"file{i}.py" for i in range(6)]
+        lock = threading.Lock()
+        running = {"now": 0, "max": 0}
+
+        def process(file_path, index, model_name, ollama_url, output_dir, html_content, **kwargs):
+            with lock:
+                running["now"] += 1
+                running["max"] = max(running["max"], running["now"])
+            # Later files finish first.
+            time.sleep(0.01 * (len(files) - files.index(file_path)))
+            with lock:
+                running["now"] -= 1
+            html_content.append(f"<{file_path}>")
+            return True
+
+        mock_process_file.side_effect = process
+
+        html_content, failed = analyze_files(files, MagicMock(), "m", "url", "/out", concurrency=3)
+
+        self.assertEqual(html_content, [f"<{f}>" for f in files])
+        self.assertEqual(failed, [])
+        self.assertEqual(running["max"], 3)
+
+    @patch("sovereign_rag.query.process_file")
+    def test_failing_file_does_not_affect_others(self, mock_process_file):
+        def process(file_path, index, model_name, ollama_url, output_dir, html_content, **kwargs):
+            if file_path == "bad.py":
+                raise RuntimeError("connection reset")
+            if file_path == "timeout.py":
+                return False
+            html_content.append(f"<{file_path}>")
+            return True
+
+        mock_process_file.side_effect = process
+
+        with patch("builtins.print"):
+            html_content, failed = analyze_files(
+                ["a.py", "bad.py", "timeout.py", "b.py"], MagicMock(), "m", "url", "/out", concurrency=2
+            )
+
+        self.assertEqual(html_content, ["<a.py>", "<b.py>"])
+        self.assertEqual(failed, ["bad.py", "timeout.py"])
+
+    @patch("sovereign_rag.query.process_file")
+    def test_report_receives_each_file_in_order_once_its_predecessors_finish(self, mock_process_file):
+        files = ["a.py", "bad.py", "c.py", "d.py"]
+        report = MagicMock()
+        written_when_finished = {}
+
+        def process(file_path, index, model_name, ollama_url, output_dir, html_content, results=None, **kwargs):
+            # Later files finish first.
+            time.sleep(0.01 * (len(files) - files.index(file_path)))
+            written_when_finished[file_path] = [c.args[0] for c in report.add.call_args_list]
+            if file_path == "bad.py":
+                return False
+            results.append((file_path, f"analysis of {file_path}", ["owasp.md"]))
+            return True
+
+        mock_process_file.side_effect = process
+
+        with patch("builtins.print"):
+            html_content, failed = analyze_files(files, MagicMock(), "m", "url", "/out", concurrency=4, report=report)
+
+        self.assertEqual(html_content, [])
+        self.assertEqual(failed, ["bad.py"])
+        self.assertEqual([c.args[0] for c in report.add.call_args_list], ["a.py", "c.py", "d.py"])
+        report.add.assert_any_call("a.py", "analysis of a.py", ["owasp.md"])
+        # Nothing is written while an earlier file is still running.
+        self.assertEqual(written_when_finished["a.py"], [])
+        # Nothing is kept in memory for the report.
+        self.assertIsNone(mock_process_file.call_args.args[5])
+
+    @patch("sovereign_rag.query.process_file")
+    def test_only_answers_broken_off_midway_are_retried(self, mock_process_file):
+        attempts = []
+
+        def process(file_path, index, model_name, ollama_url, output_dir, html_content, **kwargs):
+            attempts.append(file_path)
+            # a.py breaks off once, broken.py every time; bad.py fails in a way the pool already retried.
+            if file_path == "broken.py" or (file_path == "a.py" and attempts.count(file_path) == 1):
+                raise StreamInterrupted("The answer from http://gpu1:11434 broke off")
+            if file_path == "bad.py":
+                return False
+            html_content.append(f"<{file_path}>")
+            return True
+
+        mock_process_file.side_effect = process
+
+        with patch("builtins.print"):
+            html_content, failed = analyze_files(
+                ["a.py", "bad.py", "broken.py"], MagicMock(), "m", "url", "/out", retries=2
+            )
+
+        self.assertEqual(attempts, ["a.py", "a.py", "bad.py", "broken.py", "broken.py", "broken.py"])
+        self.assertEqual(html_content, ["<a.py>"])
+        self.assertEqual(failed, ["bad.py", "broken.py"])
+
+    def test_a_file_broken_off_midway_is_retried_on_another_endpoint(self):
+        def breaking(prompt, **kwargs):
+            yield Completion("", delta="Possible SQL")
+            raise OllamaError("Ollama sent nothing for 300s during /api/generate")
+
+        clients = [MagicMock(), MagicMock()]
+        clients[0].stream_complete.side_effect = breaking
+        clients[1].stream_complete.side_effect = lambda prompt, **kwargs: iter([Completion("", delta="SQL injection")])
+        pool = OllamaPool(clients, names=["gpu1", "gpu2"])
+        # gpu2 is busy with another file, so only the exclusion keeps the retry off gpu1.
+        pool.endpoints[1].outstanding = 1
+        segments = [[(whole_file_segment("query(name)\n"), [])]]
+
+        with patch("sovereign_rag.query.llm", pool), patch("builtins.print"):
+            html_content, failed = analyze_files(
+                ["app.py"], None, "m", "url", "/out", segments=segments, stream=True, retries=1
+            )
+
+        self.assertEqual(failed, [])
+        self.assertIn("SQL injection", html_content[0])
+        self.assertEqual([client.stream_complete.call_count for client in clients], [1, 1])
+
+    def test_a_rejected_file_does_not_take_the_pool_down_for_the_files_after_it(self):
+        clients = [MagicMock(), MagicMock()]
+        for client in clients:
+
+            def stream_complete(prompt, **kwargs):
+                if "poison" in prompt:
+                    raise OllamaError("Ollama returned HTTP 400 for /api/generate: invalid input", status=400)
+                return iter([Completion("", delta="No vulnerabilities detected.")])
+
+            client.stream_complete.side_effect = stream_complete
+        pool = OllamaPool(clients, names=["gpu1", "gpu2"], max_failures=1)
+        files = ["poison.py", "a.py", "b.py", "c.py"]
+        segments = [[(whole_file_segment(f"{name}\n"), [])] for name in ("poison()", "a()", "b()", "c()")]
+
+        with patch("sovereign_rag.query.llm", pool), patch("builtins.print"):
+            html_content, failed = analyze_files(
+                files, None, "m", "url", "/out", segments=segments, stream=True, retries=1
+            )
+
+        self.assertEqual(failed, ["poison.py"])
+        self.assertEqual(len(html_content), 3)
+        # The rejected request was sent once, and neither endpoint holds it against itself.
+        self.assertEqual(sum(client.stream_complete.call_count for client in clients), 4)
+        self.assertEqual(pool.healthy_count(), 2)
+        self.assertEqual([e.failures for e in pool.endpoints], [0, 0])
+
+    @patch("sovereign_rag.query.llm")
+    def test_packed_files_share_one_request_and_are_split_per_file(self, mock_llm):
+        owasp = RetrievedChunk(node_id="owasp.md_0", text="Use TLS.", metadata={"source": "owasp.md"})
+        cwe = RetrievedChunk(node_id="cwe.md_0", text="Escape SQL.", metadata={"source": "cwe.md"})
+        files = ["app/a.py", "app/b.py", "app/c.py"]
+        segments = [
+            [(whole_file_segment("query(sql)\n"), [cwe, owasp])],
+            [(whole_file_segment("x = 1\n"), [owasp])],
+            [(whole_file_segment("y = 2\n"), [owasp])],
+        ]
+        mock_llm.complete.side_effect = [
+            Completion("### File 1: app/a.py\nSQL injection.\n\n### File 2: app/b.py\nNo vulnerabilities detected."),
+            Completion("Nothing to report."),
+        ]
+        report = MagicMock()
+        timings = []
+
+        with patch("builtins.print"):
+            _, failed = analyze_files(
+                files, None, "m", "url", "/out", segments=segments, packs=[[0, 1]], report=report, timings=timings
+            )
+
+        self.assertEqual(failed, [])
+        self.assertEqual(mock_llm.complete.call_count, 2)
+        prompt = mock_llm.complete.call_args_list[0].args[0]
+        self.assertEqual(mock_llm.complete.call_args_list[0].kwargs["system"], SYSTEM_PROMPT)
+        self.assertIn("[File 1: app/a.py]\nquery(sql)", prompt)
+        self.assertIn("### File 2: app/b.py", prompt)
+        # A chunk retrieved for both files is sent once.
+        self.assertEqual(prompt.count("Use TLS."), 1)
+        self.assertEqual(
+            [c.args for c in report.add.call_args_list],
+            [
+                ("app/a.py", "SQL injection.", ["cwe.md", "owasp.md"], None),
+                ("app/b.py", "No vulnerabilities detected.", ["owasp.md"], None),
+                ("app/c.py", "Nothing to report.", ["owasp.md"], None),
+            ],
+        )
+
+    @patch("sovereign_rag.query.llm")
+    def test_packs_whose_answer_cannot_be_split_are_analyzed_per_file(self, mock_llm):
+        chunk = RetrievedChunk(node_id="owasp.md_0", text="Use TLS.", metadata={"source": "owasp.md"})
+        segments = [[(whole_file_segment(f"x = {i}\n"), [chunk])] for i in range(2)]
+        mock_llm.complete.side_effect = [Completion("Both files look fine."), Completion("A"), Completion("B")]
+        report = MagicMock()
+
+        with patch("builtins.print"):
+            _, failed = analyze_files(
+                ["a.py", "b.py"], None, "m", "url", "/out", segments=segments, packs=[[0, 1]], report=report
+            )
+
+        self.assertEqual(failed, [])
+        self.assertEqual(mock_llm.complete.call_count, 3)
+        self.assertEqual([c.args[:2] for c in report.add.call_args_list], [("a.py", "A"), ("b.py", "B")])
+
+    def test_plan_packs_only_packs_small_whole_files(self):
+        chunk = RetrievedChunk(node_id="owasp.md_0", text="Use TLS." * 10, metadata={"source": "owasp.md"})
+        small = [(whole_file_segment("x = 1\n"), [chunk])]
+        segments = [small, small, [(whole_file_segment("x = 1\n" * 60), [chunk])], None, small * 2, small]
+        files = ["app/a.py", "app/b.py", "app/big.py", "app/done.py", "app/split.py", "app/c.py"]
+
+        self.assertEqual(plan_packs(files, segments, PromptBudget(), 1000), [[0, 1, 5]])
+        # Each file is about 50 tokens; a window with room for two of them bounds packs below pack_tokens.
+        instructions = PromptBudget().count("".join(part or "" for part in build_pack_prompts([], [], "")))
+        budget = PromptBudget(instructions + 100 + 100, output_tokens=100)
+        self.assertEqual(plan_packs(files, segments, budget, 1000), [[0, 1]])
+
+    def test_several_ollama_urls_create_a_pool(self):
+        llm = create_llm("lean", "test_model", "http://gpu1:11434, http://gpu2:11434", 8192)
+
+        self.assertIsInstance(llm, OllamaPool)
+        self.assertEqual([e.name for e in llm.endpoints], ["http://gpu1:11434", "http://gpu2:11434"])
+        self.assertEqual([e.client.base_url for e in llm.endpoints], ["http://gpu1:11434", "http://gpu2:11434"])
+        self.assertEqual(llm.endpoints[1].client.options, {"num_ctx": 8192})
+        self.assertIsInstance(create_llm("lean", "test_model", ["http://gpu1:11434"], None), OllamaClient)
+
+
 class TestRunQuery(unittest.TestCase):
     """Test the run_query function."""
 
+    @patch("sovereign_rag.query.retrieve_for_segments")
+    @patch("sovereign_rag.query.AnalysisCache")
     @patch("sovereign_rag.query.os.path.exists")
     @patch("sovereign_rag.query.os.path.isfile")
     @patch("sovereign_rag.query.os.path.isdir")
     @patch("sovereign_rag.query.find_files_with_extension")
     @patch("sovereign_rag.query.create_output_directory")
-    @patch("sovereign_rag.query.Settings")
-    @patch("sovereign_rag.query.Ollama")
-    @patch("sovereign_rag.query.HuggingFaceEmbedding")
+    @patch("sovereign_rag.query.OllamaClient")
+    @patch("sovereign_rag.query.SentenceTransformer")
     @patch("sovereign_rag.query.chromadb.PersistentClient")
-    @patch("sovereign_rag.query.ChromaVectorStore")
-    @patch("sovereign_rag.query.VectorStoreIndex")
     @patch("sovereign_rag.query.process_file")
-    @patch("sovereign_rag.query.open", new_callable=mock_open)
+    @patch("sovereign_rag.query.RunCheckpoints")
+    @patch("sovereign_rag.query.ReportWriter")
     def test_run_query_directory(
         self,
-        mock_file_open,
+        mock_report_writer,
+        mock_run_checkpoints,
         mock_process_file,
-        mock_vector_store_index,
-        mock_chroma_vector_store,
         mock_chroma_client,
-        mock_huggingface,
-        mock_ollama,
-        mock_settings,
+        mock_sentence_transformer,
+        mock_ollama_client,
         mock_create_output_directory,
         mock_find_files,
         mock_isdir,
         mock_isfile,
         mock_exists,
+        mock_analysis_cache,
+        mock_retrieve_for_segments,
     ):
         """Test run_query with a directory path."""
         # Set up mocks
@@ -274,17 +800,16 @@ class TestRunQuery(unittest.TestCase):
         mock_create_output_directory.return_value = "/test/output/2023-01-01_12-00-00"
 
         mock_collection = MagicMock()
+        mock_collection.metadata = EmbeddingProfile("all-MiniLM-L12-v2", 384, True).to_metadata()
         mock_client = MagicMock()
         mock_client.get_collection.return_value = mock_collection
         mock_chroma_client.return_value = mock_client
-
-        mock_vector_store = MagicMock()
-        mock_chroma_vector_store.return_value = mock_vector_store
-
-        mock_index = MagicMock()
-        mock_vector_store_index.return_value = mock_index
+        mock_sentence_transformer.return_value.get_sentence_embedding_dimension.return_value = 384
+        mock_sentence_transformer.return_value.__iter__.return_value = [Normalize()]
 
         mock_process_file.return_value = True
+        mock_retrieve_for_segments.return_value = [[(MagicMock(), [])], [(MagicMock(), [])]]
+        mock_run_checkpoints.return_value.completed = {}
 
         # Call the function
         result = run_query("test_dir", "py", "test_model", "http://localhost:11434")
@@ -296,13 +821,379 @@ class TestRunQuery(unittest.TestCase):
         mock_isdir.assert_called_once_with("test_dir")
         mock_find_files.assert_called_once_with("test_dir", "py")
         mock_create_output_directory.assert_called_once()
-        mock_ollama.assert_called_once_with(model="test_model", base_url="http://localhost:11434", request_timeout=300)
-        mock_huggingface.assert_called_once_with(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        mock_ollama_client.assert_called_once_with(
+            "http://localhost:11434", "test_model", request_timeout=300, options=None, keep_alive="30m"
+        )
+        # The embedding model is the one ingest recorded on the collection.
+        mock_sentence_transformer.assert_called_once_with("all-MiniLM-L12-v2")
         mock_chroma_client.assert_called_once_with(path="./chroma_db")
         mock_client.get_collection.assert_called_once_with("security_docs")
-        mock_chroma_vector_store.assert_called_once_with(chroma_collection=mock_collection)
-        mock_vector_store_index.assert_called_once_with([], vector_store=mock_vector_store)
         self.assertEqual(mock_process_file.call_count, 2)
+        # Each file goes to the report as it finishes, and the report is completed at the end.
+        mock_report_writer.assert_called_once_with(
+            "/test/output/2023-01-01_12-00-00", "SovereignRag - Security Analysis Report - test_dir"
+        )
+        self.assertEqual(mock_process_file.call_args.kwargs["results"], [])
+        self.assertIsNone(mock_process_file.call_args.args[5])
+        self.assertTrue(mock_process_file.call_args.kwargs["stream"])
+        mock_report_writer.return_value.__exit__.assert_called_once()
+        # Every run records checkpoints in its output directory, so it can be resumed.
+        mock_run_checkpoints.assert_called_once_with("/test/output/2023-01-01_12-00-00")
+        mock_run_checkpoints.return_value.resume.assert_not_called()
+        mock_analysis_cache.assert_called_once_with("./analysis_cache", max_entries=10_000, max_age_days=30)
+        self.assertIs(mock_process_file.call_args.kwargs["cache"], mock_analysis_cache.return_value)
+        mock_analysis_cache.return_value.prune.assert_called_once()
+        # Retrieval for both files happens in one batch against the collection.
+        mock_retrieve_for_segments.assert_called_once_with(
+            ["test_dir/file1.py", "test_dir/file2.py"],
+            mock_collection,
+            ANY,
+            max_segment_chars=6000,
+            changed_lines=None,
+            hunk_context=3,
+        )
+        self.assertIs(mock_process_file.call_args.kwargs["segments"], mock_retrieve_for_segments.return_value[1])
+        # The lean backend embeds with the same SentenceTransformer engine ingest uses.
+        embed_batch = mock_retrieve_for_segments.call_args.args[2]
+        embed_batch(["query"])
+        mock_sentence_transformer.return_value.encode.assert_called_once_with(
+            ["query"], batch_size=32, show_progress_bar=False
+        )
+
+    @patch("llama_index.core.Settings")
+    @patch("llama_index.core.VectorStoreIndex")
+    @patch("llama_index.vector_stores.chroma.ChromaVectorStore")
+    @patch("llama_index.embeddings.huggingface.HuggingFaceEmbedding")
+    @patch("llama_index.llms.ollama.Ollama")
+    def test_llama_index_backend_is_still_available(
+        self, mock_ollama, mock_huggingface, mock_chroma_vector_store, mock_vector_store_index, mock_settings
+    ):
+        mock_collection = MagicMock()
+        mock_huggingface.return_value.get_text_embedding.return_value = [0.0] * 768
+        profile = EmbeddingProfile("all-mpnet-base-v2", 768, False)
+
+        with patch("builtins.print"):
+            embed_batch, index = _init_llama_index_backend(mock_collection, profile)
+            llm = create_llm("llama_index", "test_model", "http://localhost:11434", 8192)
+
+        mock_ollama.assert_called_once_with(
+            model="test_model",
+            base_url="http://localhost:11434",
+            request_timeout=300,
+            keep_alive="30m",
+            additional_kwargs={"num_ctx": 8192},
+        )
+        mock_huggingface.assert_called_once_with(model_name="all-mpnet-base-v2", normalize=False)
+        mock_chroma_vector_store.assert_called_once_with(chroma_collection=mock_collection)
+        mock_vector_store_index.assert_called_once_with([], vector_store=mock_chroma_vector_store.return_value)
+        self.assertIs(llm.llm, mock_settings.llm)
+        self.assertIs(index, mock_vector_store_index.return_value)
+        embed_batch(["query"])
+        mock_settings.embed_model.get_text_embedding_batch.assert_called_once_with(["query"], show_progress=False)
+
+    def test_llama_index_llm_raises_http_errors_as_ollama_errors(self):
+        # Shaped like ollama.ResponseError and httpx.HTTPStatusError.
+        class ResponseError(Exception):
+            def __init__(self, error, status_code):
+                super().__init__(error)
+                self.status_code = status_code
+
+        class HTTPStatusError(Exception):
+            def __init__(self, message, response):
+                super().__init__(message)
+                self.response = response
+
+        backend_llm = MagicMock()
+        backend_llm.chat.side_effect = ResponseError("model 'missing' not found", 404)
+        backend_llm.stream_complete.side_effect = HTTPStatusError("Server error", MagicMock(status_code=503))
+        backend_llm.complete.side_effect = ConnectionError("Connection refused")
+        llm = _LlamaIndexLLM(backend_llm)
+
+        with self.assertRaisesRegex(OllamaError, "HTTP 404.*not found") as raised:
+            llm.complete("code", system="instructions")
+        self.assertTrue(raised.exception.rejected)
+        with self.assertRaisesRegex(OllamaError, "HTTP 503") as raised:
+            list(llm.stream_complete("code"))
+        self.assertFalse(raised.exception.rejected)
+        with self.assertRaises(ConnectionError):
+            llm.complete("code")
+
+    def test_llama_index_llm_sends_the_system_message_as_chat(self):
+        backend_llm = MagicMock()
+        backend_llm.chat.return_value.message.content = "Analysis"
+        backend_llm.chat.return_value.raw = {"prompt_eval_count": 5, "prompt_eval_duration": 10**9}
+
+        completion = _LlamaIndexLLM(backend_llm).complete("code", system="instructions")
+
+        messages = backend_llm.chat.call_args.args[0]
+        self.assertEqual([(m.role.value, m.content) for m in messages], [("system", "instructions"), ("user", "code")])
+        self.assertEqual(completion.text, "Analysis")
+        self.assertEqual(EvalTimings.from_response(completion.raw).prompt_seconds, 1.0)
+
+    @patch("sovereign_rag.query.SentenceTransformer")
+    def test_lean_backend_rejects_a_model_that_does_not_match_the_collection(self, mock_sentence_transformer):
+        mock_sentence_transformer.return_value.get_sentence_embedding_dimension.return_value = 768
+        profile = EmbeddingProfile("all-MiniLM-L6-v2", 384, False)
+
+        with self.assertRaisesRegex(EmbeddingMismatchError, "768 dimensions.*indexed with all-MiniLM-L6-v2"):
+            _init_lean_backend(MagicMock(), profile)
+
+    @patch("sovereign_rag.query.SentenceTransformer")
+    def test_collection_without_profile_uses_default_embedding_model(self, mock_sentence_transformer):
+        collection = MagicMock(metadata=None)
+
+        with patch("builtins.print"):
+            profile = load_embedding_profile(collection)
+            _init_lean_backend(collection, profile)
+
+        self.assertIsNone(profile)
+        mock_sentence_transformer.assert_called_once_with(DEFAULT_EMBEDDING_MODEL)
+
+    def _run_budgeted_query(self, num_ctx):
+        """Analyze one 20k-character Python file against a fake collection; return the prompts and client."""
+        collection = MagicMock(metadata=None)
+        collection.query.side_effect = lambda query_embeddings, **kwargs: {
+            "ids": [[f"owasp.md_{i}" for i in range(3)] for _ in query_embeddings],
+            "documents": [["Validate all input. " * 40] * 3 for _ in query_embeddings],
+            "metadatas": [[{"source": "owasp.md"}] * 3 for _ in query_embeddings],
+        }
+        code = "".join(f"def handler_{i}(q):\n" + "    q = q.strip()\n" * 20 + "    return q\n\n\n" for i in range(50))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "app.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(code)
+            with (
+                patch("sovereign_rag.query.chromadb.PersistentClient") as mock_chroma_client,
+                patch("sovereign_rag.query.SentenceTransformer") as mock_sentence_transformer,
+                patch("sovereign_rag.query.OllamaClient") as mock_ollama_client,
+                patch("sovereign_rag.query.create_output_directory", return_value=tmp),
+                patch("builtins.print"),
+            ):
+                mock_chroma_client.return_value.get_collection.return_value = collection
+                mock_sentence_transformer.return_value.encode.side_effect = lambda texts, **kwargs: [[0.0]] * len(texts)
+                mock_ollama_client.return_value.stream_complete.side_effect = lambda prompt, **kwargs: iter(
+                    [Completion("No vulnerabilities", delta="No vulnerabilities"), Completion("", delta=" detected.")]
+                )
+
+                self.assertTrue(run_query(path, num_ctx=num_ctx, analysis_cache_dir=None, triage_threshold=0))
+
+            # The report and its JSONL sidecar were written to the run directory.
+            with open(os.path.join(tmp, "report.jsonl"), encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual([r["file"] for r in records], [path])
+            self.assertIn("No vulnerabilities detected.", records[0]["analysis"])
+            with open(os.path.join(tmp, "report.html"), encoding="utf-8") as f:
+                self.assertTrue(f.read().rstrip().endswith("</html>"))
+
+        # Everything sent per request: the system message and the prompt.
+        calls = mock_ollama_client.return_value.stream_complete.call_args_list
+        prompts = [c.kwargs["system"] + c.args[0] for c in calls]
+        return prompts, mock_ollama_client
+
+    def test_prompts_are_split_and_trimmed_to_num_ctx(self):
+        prompts, mock_ollama_client = self._run_budgeted_query(2048)
+
+        mock_ollama_client.assert_called_once_with(
+            ANY, ANY, request_timeout=300, options={"num_ctx": 2048}, keep_alive="30m"
+        )
+        self.assertGreater(len(prompts), 10)
+        budget = PromptBudget(2048)
+        self.assertTrue(all(budget.count(prompt) <= budget.prompt_tokens for prompt in prompts))
+
+    def test_auto_num_ctx_picks_the_smallest_window_that_fits(self):
+        prompts, mock_ollama_client = self._run_budgeted_query("auto")
+
+        largest = max(PromptBudget().count(prompt) for prompt in prompts)
+        self.assertEqual(mock_ollama_client.call_args.kwargs["options"], {"num_ctx": smallest_num_ctx(largest)})
+        # Nothing was trimmed: every prompt still carries all three reference chunks.
+        self.assertTrue(all(prompt.count("[Source: owasp.md]") == 3 for prompt in prompts))
+
+    def test_resumed_run_skips_completed_files_and_rebuilds_the_report(self):
+        collection = MagicMock(metadata=None)
+        collection.query.side_effect = lambda query_embeddings, **kwargs: {
+            "ids": [["owasp.md_0"] for _ in query_embeddings],
+            "documents": [["Validate all input."] for _ in query_embeddings],
+            "metadatas": [[{"source": "owasp.md"}] for _ in query_embeddings],
+        }
+        crash_on = {"b.py"}
+
+        def stream_complete(prompt, **kwargs):
+            name = next(n for n in ("a.py", "b.py", "c.py") if f"print('{n}')" in prompt)
+            if name in crash_on:
+                raise OllamaError("Cannot reach Ollama")
+            return iter([Completion(f"analysis of {name}", delta=f"analysis of {name}")])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            src, run_dir = os.path.join(tmp, "src"), os.path.join(tmp, "run")
+            os.makedirs(src)
+            os.makedirs(run_dir)
+            for name in ("a.py", "b.py", "c.py"):
+                with open(os.path.join(src, name), "w", encoding="utf-8") as f:
+                    f.write(f"print('{name}')\n")
+            with (
+                patch("sovereign_rag.query.chromadb.PersistentClient") as mock_chroma_client,
+                patch("sovereign_rag.query.SentenceTransformer") as mock_sentence_transformer,
+                patch("sovereign_rag.query.OllamaClient") as mock_ollama_client,
+                patch("sovereign_rag.query.create_output_directory", return_value=run_dir),
+                patch("builtins.print"),
+            ):
+                mock_chroma_client.return_value.get_collection.return_value = collection
+                mock_sentence_transformer.return_value.encode.side_effect = lambda texts, **kwargs: [[0.0]] * len(texts)
+                mock_ollama_client.return_value.stream_complete.side_effect = stream_complete
+
+                self.assertFalse(run_query(src, "py", analysis_cache_dir=None, triage_threshold=0))
+                # c.py changed after the interrupted run, so it is analyzed again.
+                with open(os.path.join(src, "c.py"), "a", encoding="utf-8") as f:
+                    f.write("print('changed')\n")
+                crash_on.clear()
+                mock_ollama_client.return_value.stream_complete.reset_mock()
+
+                self.assertTrue(run_query(src, "py", analysis_cache_dir=None, triage_threshold=0, resume_dir=run_dir))
+
+            prompts = [c.args[0] for c in mock_ollama_client.return_value.stream_complete.call_args_list]
+            self.assertEqual(len(prompts), 2)
+            self.assertFalse(any("print('a.py')" in prompt for prompt in prompts))
+            # The rebuilt report lists every file, a.py from its checkpoint.
+            with open(os.path.join(run_dir, "report.jsonl"), encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual(
+                sorted((os.path.basename(r["file"]), r["analysis"]) for r in records),
+                [("a.py", "analysis of a.py"), ("b.py", "analysis of b.py"), ("c.py", "analysis of c.py")],
+            )
+
+    def test_triage_skips_files_without_surface_and_lists_them_in_the_report(self):
+        collection = MagicMock(metadata=None)
+        collection.query.side_effect = lambda query_embeddings, **kwargs: {
+            "ids": [["owasp.md_0"] for _ in query_embeddings],
+            "documents": [["Validate all input."] for _ in query_embeddings],
+            "metadatas": [[{"source": "owasp.md"}] for _ in query_embeddings],
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "src")
+            os.makedirs(src)
+            files = {"shell.py": "import subprocess\nsubprocess.run(cmd, shell=True)\n", "constants.py": "LIMIT = 3\n"}
+            for name, code in files.items():
+                with open(os.path.join(src, name), "w", encoding="utf-8") as f:
+                    f.write(code)
+            with (
+                patch("sovereign_rag.query.chromadb.PersistentClient") as mock_chroma_client,
+                patch("sovereign_rag.query.SentenceTransformer") as mock_sentence_transformer,
+                patch("sovereign_rag.query.OllamaClient") as mock_ollama_client,
+                patch("sovereign_rag.query.create_output_directory", return_value=tmp),
+                patch("builtins.print") as mock_print,
+            ):
+                mock_chroma_client.return_value.get_collection.return_value = collection
+                mock_sentence_transformer.return_value.encode.side_effect = lambda texts, **kwargs: [[0.0]] * len(texts)
+                mock_ollama_client.return_value.stream_complete.side_effect = lambda prompt, **kwargs: iter(
+                    [Completion("Command injection", delta="Command injection")]
+                )
+
+                self.assertTrue(run_query(src, "py", analysis_cache_dir=None))
+
+            printed = "\n".join(str(c.args[0]) for c in mock_print.call_args_list if c.args)
+            self.assertIn("Triage skipped 1 of 2 files", printed)
+            self.assertIn(f"skipped: {os.path.join(src, 'constants.py')}", printed)
+            prompts = [c.args[0] for c in mock_ollama_client.return_value.stream_complete.call_args_list]
+            self.assertEqual(len(prompts), 1)
+            self.assertIn("subprocess.run", prompts[0])
+            # Only the analyzed file is retrieved for.
+            self.assertEqual(len(collection.query.call_args.kwargs["query_embeddings"]), 1)
+            with open(os.path.join(tmp, "report.jsonl"), encoding="utf-8") as f:
+                triage, analysis = [json.loads(line) for line in f]
+            decisions = {os.path.basename(d["file"]): (d["score"], d["skipped"]) for d in triage["triage"]["files"]}
+            self.assertEqual(decisions, {"shell.py": (3, False), "constants.py": (0, True)})
+            self.assertEqual(os.path.basename(analysis["file"]), "shell.py")
+            with open(os.path.join(tmp, "report.html"), encoding="utf-8") as f:
+                self.assertIn("Triage: 1 of 2 files skipped (score below 1", f.read())
+
+    def test_a_file_named_by_path_is_never_triaged_away(self):
+        collection = MagicMock(metadata=None)
+        collection.query.side_effect = lambda query_embeddings, **kwargs: {
+            "ids": [["owasp.md_0"] for _ in query_embeddings],
+            "documents": [["Validate all input."] for _ in query_embeddings],
+            "metadatas": [[{"source": "owasp.md"}] for _ in query_embeddings],
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "constants.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("LIMIT = 3\n")
+            with (
+                patch("sovereign_rag.query.chromadb.PersistentClient") as mock_chroma_client,
+                patch("sovereign_rag.query.SentenceTransformer") as mock_sentence_transformer,
+                patch("sovereign_rag.query.OllamaClient") as mock_ollama_client,
+                patch("sovereign_rag.query.create_output_directory", return_value=tmp),
+                patch("builtins.print"),
+            ):
+                mock_chroma_client.return_value.get_collection.return_value = collection
+                mock_sentence_transformer.return_value.encode.side_effect = lambda texts, **kwargs: [[0.0]] * len(texts)
+                mock_ollama_client.return_value.stream_complete.side_effect = lambda prompt, **kwargs: iter(
+                    [Completion("No vulnerabilities detected.", delta="No vulnerabilities detected.")]
+                )
+
+                self.assertTrue(run_query(path, analysis_cache_dir=None, triage_threshold=5))
+
+            mock_ollama_client.return_value.stream_complete.assert_called_once()
+            with open(os.path.join(tmp, "report.jsonl"), encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual([os.path.basename(r.get("file", "")) for r in records], ["constants.py"])
+
+    def test_cascade_run_records_the_tier_of_each_verdict(self):
+        collection = MagicMock(metadata=None)
+        collection.query.side_effect = lambda query_embeddings, **kwargs: {
+            "ids": [["owasp.md_0"] for _ in query_embeddings],
+            "documents": [["Validate all input."] for _ in query_embeddings],
+            "metadatas": [[{"source": "owasp.md"}] for _ in query_embeddings],
+        }
+        clients = {"small": MagicMock(), "big": MagicMock()}
+        clients["small"].stream_complete.side_effect = lambda prompt, **kwargs: iter(
+            [Completion("", delta="SUSPICIOUS" if "shell=True" in prompt else "CLEAN")]
+        )
+        clients["big"].stream_complete.side_effect = lambda prompt, **kwargs: iter(
+            [Completion("", delta="Command injection")]
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "src")
+            os.makedirs(src)
+            files = {
+                "shell.py": "import subprocess\nsubprocess.run(cmd, shell=True)\n",
+                "hashing.py": "import hashlib\nhashlib.sha256(data)\n",
+            }
+            for name, code in files.items():
+                with open(os.path.join(src, name), "w", encoding="utf-8") as f:
+                    f.write(code)
+            with (
+                patch("sovereign_rag.query.chromadb.PersistentClient") as mock_chroma_client,
+                patch("sovereign_rag.query.SentenceTransformer") as mock_sentence_transformer,
+                patch("sovereign_rag.query.OllamaClient") as mock_ollama_client,
+                patch("sovereign_rag.query.create_output_directory", return_value=tmp),
+                patch("builtins.print"),
+            ):
+                mock_chroma_client.return_value.get_collection.return_value = collection
+                mock_sentence_transformer.return_value.encode.side_effect = lambda texts, **kwargs: [[0.0]] * len(texts)
+                mock_ollama_client.side_effect = lambda url, model, **kwargs: clients[model]
+
+                self.assertTrue(run_query(src, "py", "big", analysis_cache_dir=None, screen_model="small"))
+
+            # The screening model's answers are capped to a few tokens.
+            self.assertEqual(
+                mock_ollama_client.call_args_list[1].kwargs["options"], {"num_predict": SCREEN_OUTPUT_TOKENS}
+            )
+            self.assertEqual(clients["small"].stream_complete.call_count, 2)
+            self.assertEqual(clients["big"].stream_complete.call_count, 1)
+            with open(os.path.join(tmp, "report.jsonl"), encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            tiers = {os.path.basename(r["file"]): r["tier"] for r in records if "file" in r}
+            self.assertEqual(tiers, {"shell.py": "full", "hashing.py": "screen"})
+            cascade = records[-1]["cascade"]
+            self.assertEqual((cascade["screen_model"], cascade["model"]), ("small", "big"))
+            self.assertEqual(cascade["files"], {"full": 1, "screen": 1})
+            self.assertEqual(cascade["latency"]["screen"]["requests"], 2)
+            self.assertEqual(cascade["latency"]["full"]["requests"], 1)
+
+    @patch("sovereign_rag.query.os.path.exists", return_value=True)
+    def test_run_query_rejects_unknown_backend(self, mock_exists):
+        with patch("builtins.print"):
+            self.assertFalse(run_query("file.py", backend="langchain"))
 
     @patch("sovereign_rag.query.os.path.exists")
     @patch("sovereign_rag.query.os.path.isfile")
@@ -310,7 +1201,7 @@ class TestRunQuery(unittest.TestCase):
     @patch("sovereign_rag.query.find_files_with_extension")
     @patch("sovereign_rag.query.filter_to_changed_files")
     @patch("sovereign_rag.query.create_output_directory")
-    @patch("sovereign_rag.query.Ollama")
+    @patch("sovereign_rag.query.OllamaClient")
     def test_run_query_changed_only_no_matches_skips_model_initialization(
         self,
         mock_ollama,
@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import unittest
+
+from sovereign_rag.run_checkpoints import CHECKPOINT_FILE, RunCheckpoints, content_hash
+
+
+class TestRunCheckpoints(unittest.TestCase):
+    """Test the per-file checkpoints of a query run."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.run_dir = self.tmp.name
+        self.files = []
+        for name in ("a.py", "b.py", "c.py"):
+            path = os.path.join(self.run_dir, name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"print('{name}')\n")
+            self.files.append(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_completed_files_are_found_again_by_a_resumed_run(self):
+        a, b, c = self.files
+        with RunCheckpoints(self.run_dir) as checkpoints:
+            checkpoints.record(a, "analysis of a", ["owasp.md"])
+            checkpoints.record(b, "analysis of b", [])
+            checkpoints.record(b, "second analysis of b", [])
+
+        with RunCheckpoints(self.run_dir) as checkpoints:
+            self.assertEqual(checkpoints.resume([c, b, a]), [b, a])
+            self.assertEqual(checkpoints.completed[a]["analysis"], "analysis of a")
+            self.assertEqual(checkpoints.completed[a]["sources"], ["owasp.md"])
+            self.assertEqual(checkpoints.completed[a]["sha256"], content_hash(a))
+            self.assertEqual(checkpoints.completed[b]["analysis"], "second analysis of b")
+
+    def test_changed_deleted_and_torn_records_are_not_completed(self):
+        a, b, c = self.files
+        with RunCheckpoints(self.run_dir) as checkpoints:
+            for path in self.files:
+                checkpoints.record(path, f"analysis of {path}", [])
+        with open(os.path.join(self.run_dir, CHECKPOINT_FILE), encoding="utf-8") as f:
+            lines = f.readlines()
+        # The run was killed while writing c's line.
+        with open(os.path.join(self.run_dir, CHECKPOINT_FILE), "w", encoding="utf-8") as f:
+            f.writelines([*lines[:2], lines[2][:20]])
+        with open(a, "a", encoding="utf-8") as f:
+            f.write("print('changed')\n")
+        os.remove(b)
+
+        with RunCheckpoints(self.run_dir) as checkpoints:
+            self.assertEqual(checkpoints.resume(self.files), [])
+            self.assertEqual(sorted(checkpoints.records), [a, b])
+            checkpoints.record(c, "analysis of c", [])
+
+        # New records are appended after the torn line and still read back.
+        with open(os.path.join(self.run_dir, CHECKPOINT_FILE), encoding="utf-8") as f:
+            self.assertEqual(json.loads(f.readlines()[-1])["file"], c)
+        with RunCheckpoints(self.run_dir) as checkpoints:
+            self.assertEqual(checkpoints.resume(self.files), [c])
+
+
+if __name__ == "__main__":
+    unittest.main()
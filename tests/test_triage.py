@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+
+from sovereign_rag.triage import TriageResult, triage_code, triage_files
+
+
+class TestTriageCode(unittest.TestCase):
+    """Test the static pre-triage scoring."""
+
+    def test_files_without_surface_score_zero(self):
+        for code in (
+            "",
+            "from .query import run_query\n\n__all__ = ['run_query']\n",
+            'MAX_RETRIES = 3\nCOLORS = {"red": "#f00"}\n\n\ndef clamp(x, lo, hi):\n    return max(lo, min(x, hi))\n',
+        ):
+            with self.subTest(code=code):
+                result = triage_code(code, "module.py")
+                self.assertEqual((result.score, result.signals), (0, []))
+                self.assertTrue(result.skipped(1))
+                self.assertFalse(result.skipped(0))
+
+    def test_python_signals_come_from_code_not_comments_or_docstrings(self):
+        code = '''"""Never call subprocess or pickle here."""
+import re
+# eval(user_input) would be unsafe
+
+PATTERN = re.compile(r"\\d+")
+'''
+        self.assertEqual(triage_code(code, "safe.py").signals, [])
+
+    def test_python_signals(self):
+        cases = {
+            "import subprocess\nsubprocess.run(cmd, shell=True)\n": ["process"],
+            "import pickle\n\ndef load(blob):\n    return pickle.loads(blob)\n": ["deserialization"],
+            'def find(db, name):\n    return db.query("SELECT * FROM users WHERE name = \'" + name + "\'")\n': ["sql"],
+            "from flask import Flask\napp = Flask(__name__)\n\n@app.route('/')\ndef index():\n    pass\n": ["http"],
+            "def run(expr):\n    return eval(expr)\n": ["eval"],
+            "import os\nTOKEN = os.environ['TOKEN']\n": ["env"],
+            "def login(user, password):\n    pass\n": ["secrets"],
+        }
+        for code, signals in cases.items():
+            with self.subTest(code=code):
+                self.assertEqual(triage_code(code, "module.py").signals, signals)
+
+    def test_scores_add_up_category_weights(self):
+        code = "import subprocess\nimport hashlib\n\nwith open(path) as f:\n    subprocess.run(f.read())\n"
+        result = triage_code(code, "tool.py")
+        self.assertEqual(result.signals, ["process", "crypto", "file_io"])
+        self.assertEqual(result.score, 3 + 2 + 1)
+
+    def test_other_languages_are_matched_as_text(self):
+        js = "app.get('/user', (req, res) => {\n  db.query(`SELECT * FROM users WHERE id = ${req.query.id}`);\n});\n"
+        self.assertEqual(triage_code(js, "routes.js").signals, ["sql", "http"])
+        self.assertEqual(triage_code("export const PAGE_SIZE = 20;\n", "constants.ts").score, 0)
+        # Python that does not parse falls back to the text patterns.
+        self.assertEqual(triage_code("import subprocess\ndef broken(:\n", "broken.py").signals, ["process"])
+
+    def test_request_input_of_other_languages(self):
+        cases = {
+            "index.php": "<?php\n$name = $_GET['name'];\necho htmlspecialchars($name);\n",
+            "form.php": "<?php\n$comment = $_POST['comment'];\n",
+            "routes.js": "router.put('/user/:id', (req, res) => {\n  res.json(update(req.params.id, req.body));\n});\n",
+            "users_controller.rb": "def show\n  @user = User.find(params[:id])\nend\n",
+            "search.go": 'func search(w Writer, r *Request) {\n\tq := r.URL.Query().Get("q")\n\tshow(w, q)\n}\n',
+            "form.go": 'func save(w Writer, r *Request) {\n\tstore(r.FormValue("name"))\n}\n',
+        }
+        for file_path, code in cases.items():
+            with self.subTest(file_path=file_path):
+                self.assertEqual(triage_code(code, file_path).signals, ["http"])
+
+    def test_vulnerable_snippets_without_other_surface_are_kept(self):
+        cases = {
+            "copy.c": ("#include <string.h>\nvoid f(char *in) { char buf[8]; strcpy(buf, in); }\n", ["memory"]),
+            "echo.c": ("int main(void) { char buf[64]; gets(buf); printf(buf); return 0; }\n", ["memory"]),
+            "Parse.java": (
+                "class Parse {\n  Document parse(InputStream in) throws Exception {\n"
+                "    return DocumentBuilderFactory.newInstance().newDocumentBuilder().parse(in);\n  }\n}\n",
+                ["xml"],
+            ),
+            "fetch.go": (
+                'package main\n\nimport "net/http"\n\nfunc fetch(userURL string) (*http.Response, error) {\n'
+                "\treturn http.Get(userURL)\n}\n",
+                ["network"],
+            ),
+            "views.py": ("def back(req):\n    return redirect(req.GET['next'])\n", ["redirect"]),
+            "next.py": (
+                "from flask import redirect, request\n\ndef back():\n    return redirect(request.args['next'])\n",
+                ["http", "redirect"],
+            ),
+        }
+        for file_path, (code, signals) in cases.items():
+            with self.subTest(file_path=file_path):
+                result = triage_code(code, file_path)
+                self.assertEqual(result.signals, signals)
+                self.assertFalse(result.skipped(1))
+
+
+class TestTriageFiles(unittest.TestCase):
+    def test_unreadable_files_are_never_skipped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "shell.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("import os\nos.system(cmd)\n")
+
+            results = triage_files([path, os.path.join(tmp, "missing.py")])
+
+        self.assertEqual([r.file_path for r in results], [path, os.path.join(tmp, "missing.py")])
+        self.assertEqual(results[0].signals, ["process"])
+        self.assertEqual(results[1], TriageResult(file_path=os.path.join(tmp, "missing.py"), score=None))
+        self.assertFalse(results[1].skipped(100))
+
+
+if __name__ == "__main__":
+    unittest.main()